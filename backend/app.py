@@ -1,109 +1,283 @@
-from flask import Flask, render_template, session, redirect, url_for
-from flask_mysqldb import MySQL
-from flask_login import LoginManager
+from flask import Flask, render_template, session, redirect, url_for, request, Response
+from jinja2 import FileSystemBytecodeCache
 from config import config
+import click
+import hmac
 import os
 
-# Initialize Flask app
-app = Flask(__name__, 
-            template_folder='../frontend/templates',
-            static_folder='../frontend/static')
-
-# Load configuration
-app.config.from_object(config['development'])
-
-# Initialize MySQL
-mysql = MySQL(app)
-
-# Make mysql available globally
-app.mysql = mysql
-
-# Initialize Login Manager
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-login_manager.login_message = 'Please log in to access this page.'
-
-# Import models
-from models import User
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.get_by_id(mysql, int(user_id))
-
-# Import and register blueprints
-from routes.auth import auth_bp
-from routes.tickets import tickets_bp
-from routes.admin import admin_bp
-
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(tickets_bp, url_prefix='/tickets')
-app.register_blueprint(admin_bp, url_prefix='/admin')
-
-# Home route
-@app.route('/')
-def index():
-    if 'user_id' in session:
-        user = User.get_by_id(mysql, session['user_id'])
-        if user and user.is_agent():
-            return redirect(url_for('admin.dashboard'))
-        else:
-            return redirect(url_for('tickets.user_dashboard'))
-    return render_template('index.html')
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return render_template('404.html'), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return render_template('500.html'), 500
-
-# Template filters
-@app.template_filter('datetime')
-def format_datetime(value, format='%Y-%m-%d %H:%M'):
-    if value is None:
-        return ""
-    return value.strftime(format)
-
-@app.template_filter('date')
-def format_date(value):
-    if value is None:
-        return ""
-    return value.strftime('%Y-%m-%d')
-
-# Context processors
-@app.context_processor
-def utility_processor():
-    def get_priority_class(priority):
-        classes = {
-            'low': 'bg-info',
-            'medium': 'bg-warning',
-            'high': 'bg-danger',
-            'urgent': 'bg-dark'
-        }
-        return classes.get(priority, 'bg-secondary')
-    
-    def get_status_class(status):
-        classes = {
-            'open': 'bg-primary',
-            'in_progress': 'bg-warning',
-            'resolved': 'bg-success',
-            'closed': 'bg-secondary'
-        }
-        return classes.get(status, 'bg-secondary')
-    
-    return dict(
-        get_priority_class=get_priority_class,
-        get_status_class=get_status_class
-    )
+# Template globals: plain module-level functions, so nothing is rebuilt per request
+PRIORITY_CLASSES = {
+    'low': 'bg-info',
+    'medium': 'bg-warning',
+    'high': 'bg-danger',
+    'urgent': 'bg-dark'
+}
+
+STATUS_CLASSES = {
+    'open': 'bg-primary',
+    'in_progress': 'bg-warning',
+    'resolved': 'bg-success',
+    'closed': 'bg-secondary'
+}
+
+def get_priority_class(priority):
+    return PRIORITY_CLASSES.get(priority, 'bg-secondary')
+
+def get_status_class(status):
+    return STATUS_CLASSES.get(status, 'bg-secondary')
+
+def create_app(config_name=None):
+    """Build the application. The config comes from FLASK_CONFIG unless named here.
+
+    Nothing here opens a database connection or starts a thread: the pool is
+    built on first use and background jobs start from the first request, in
+    whichever process serves it. That makes the returned app safe to create
+    once in a prefork master (gunicorn --preload) and share with its workers.
+    """
+    config_name = config_name or os.environ.get('FLASK_CONFIG') or 'default'
+
+    # Initialize Flask app
+    app = Flask(__name__,
+                template_folder='../frontend/templates',
+                static_folder='../frontend/static')
+
+    # Load configuration
+    app.config.from_object(config[config_name])
+    if not app.config.get('SECRET_KEY'):
+        # ProductionConfig only reads it from the environment; fail at boot, not on every request
+        raise RuntimeError(f"SECRET_KEY must be set for the '{config_name}' config")
+
+    from flask_login import LoginManager
+    from db import PooledMySQL
+    from sessions import create_session_interface
+    from storage import AttachmentStore
+    from profiling import profiler
+    from fragments import FragmentCacheExtension, fragment_cache
+    from events import broker
+
+    # Initialize the pooled MySQL layer; connections open on first use
+    mysql = PooledMySQL(app)
+
+    # Make mysql available globally
+    app.mysql = mysql
+
+    # Per-request SQL profiling and Prometheus metrics
+    profiler.init_app(app, mysql)
+
+    # Compiled templates are cached on disk, so a cold worker skips the Jinja compiler
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        cache_dir = app.config['TEMPLATE_CACHE_DIR']
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(cache_dir)}
+
+    # {% cache %} blocks in templates; must be registered before any template compiles
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    fragment_cache.max_bytes = app.config['FRAGMENT_CACHE_MAX_BYTES']
+
+    # Content-addressed attachment files under UPLOAD_FOLDER
+    app.attachment_store = AttachmentStore(app.config['UPLOAD_FOLDER'])
+
+    # Server-side sessions: the cookie only carries a signed session id
+    session_interface = create_session_interface(app)
+    if session_interface is not None:
+        app.session_interface = session_interface
+
+    def revoke_user_sessions(user_id):
+        """Log a user out everywhere. Returns the number of sessions removed."""
+        if session_interface is None:
+            return 0
+        return session_interface.store.revoke_user(user_id)
+
+    app.revoke_user_sessions = revoke_user_sessions
+
+    # Live ticket events, relayed between worker processes when EVENTS_BACKEND is 'redis'
+    broker.init_app(app)
+
+    # Initialize Login Manager
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.login_view = 'auth.login'
+    login_manager.login_message = 'Please log in to access this page.'
+
+    # Import models
+    from models import User, Ticket, Category, TicketCounter, TicketSequence, AnalyticsRollup, TicketResponse
+    from cache import ReferenceCache
+    from jobs import PeriodicJob
+    from security import password_hasher, account_limiter, ip_limiter
+    from assignment import assignment_engine
+    from sla import sla_scheduler
+    from batching import GroupCommitter
+
+    TicketSequence.BLOCK_SIZE = app.config['TICKET_NUMBER_BLOCK_SIZE']
+    User.cache.ttl = app.config['USER_CACHE_TTL']
+    ReferenceCache.shared_versions = app.config['REFERENCE_CACHE_SHARED_VERSIONS']
+    ReferenceCache.check_interval = app.config['REFERENCE_CACHE_CHECK_INTERVAL']
+    password_hasher.configure(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                              app.config['PASSWORD_HASH_MAX_PENDING'], app.config['PASSWORD_HASH_QUEUE_TIMEOUT'])
+    account_limiter.capacity, account_limiter.refill_rate = app.config['LOGIN_ACCOUNT_RATE_LIMIT']
+    ip_limiter.capacity, ip_limiter.refill_rate = app.config['LOGIN_IP_RATE_LIMIT']
+    assignment_engine.enabled = app.config['AUTO_ASSIGN_ENABLED']
+    assignment_engine.max_load = app.config['ASSIGNMENT_MAX_LOAD']
+    assignment_engine.weights = dict(app.config['ASSIGNMENT_PRIORITY_WEIGHTS'])
+    sla_scheduler.enabled = app.config['SLA_ENABLED']
+    sla_scheduler.init_app(app, mysql)
+
+    def write_reply_batch(rows):
+        with mysql.pool.connection() as conn:
+            return TicketResponse.write_responses(conn, rows)
+
+    TicketResponse.group_commit = GroupCommitter('reply-group-commit', write_reply_batch,
+                                                 app.config['REPLY_GROUP_COMMIT_MS'],
+                                                 app.config['REPLY_GROUP_COMMIT_MAX_BATCH'])
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        profile = session.get('user')
+        if profile and profile['user_id'] == int(user_id):
+            return User.from_session_profile(profile)
+        return User.get_by_id(mysql, int(user_id))
+
+    # Background jobs
+    rollup_job = PeriodicJob(app, 'analytics-rollup', app.config['ANALYTICS_ROLLUP_INTERVAL'],
+                             lambda: AnalyticsRollup.refresh(mysql))
+    assignment_job = PeriodicJob(app, 'assignment-resync',
+                                 app.config['ASSIGNMENT_RESYNC_INTERVAL'] if assignment_engine.enabled else 0,
+                                 lambda: assignment_engine.refresh(mysql))
+
+    @app.before_request
+    def start_background_jobs():
+        if not app.config['BACKGROUND_JOBS_ENABLED']:
+            return
+        rollup_job.ensure_started()
+        assignment_job.ensure_started()
+        sla_scheduler.ensure_started()
+
+    # Import and register blueprints
+    from routes.auth import auth_bp
+    from routes.tickets import tickets_bp
+    from routes.admin import admin_bp
+    from routes.api import api_bp
+
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(tickets_bp, url_prefix='/tickets')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+    # Home route
+    @app.route('/')
+    def index():
+        if 'user_id' in session:
+            user = User.get_by_id(mysql, session['user_id'])
+            if user and user.is_agent():
+                return redirect(url_for('admin.dashboard'))
+            else:
+                return redirect(url_for('tickets.user_dashboard'))
+        return render_template('index.html')
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if not token and app.config['METRICS_REQUIRE_TOKEN']:
+            return Response('Metrics are disabled until METRICS_TOKEN is set\n', status=404, mimetype='text/plain')
+        # Constant-time comparison, so response timing does not reveal how much of a guess matched
+        if token and not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                             f'Bearer {token}'.encode()):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        if not profiler.enabled:
+            return Response('Profiling is disabled\n', status=404, mimetype='text/plain')
+        return profiler.render()
+
+    # Error handlers
+    @app.errorhandler(404)
+    def not_found(error):
+        return render_template('404.html'), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        return render_template('500.html'), 500
+
+    # Template filters
+    @app.template_filter('datetime')
+    def format_datetime(value, format='%Y-%m-%d %H:%M'):
+        if value is None:
+            return ""
+        return value.strftime(format)
+
+    @app.template_filter('date')
+    def format_date(value):
+        if value is None:
+            return ""
+        return value.strftime('%Y-%m-%d')
+
+    reference_caches = {
+        'categories': Category.cache,
+        'agents': User.agents_cache
+    }
+
+    @app.template_global()
+    def reference_stamp(name):
+        """Fragment cache key part for markup built from a cached reference list"""
+        return reference_caches[name].stamp()
+
+    app.add_template_global(get_priority_class)
+    app.add_template_global(get_status_class)
+
+    # Compile every template now rather than on the first request that needs it;
+    # with a preloading server the compiled code is shared by the forked workers
+    if app.config['TEMPLATE_PRELOAD']:
+        for template_name in app.jinja_env.list_templates(extensions=('html',)):
+            app.jinja_env.get_template(template_name)
+
+    # CLI commands
+    @app.cli.command('reconcile-counters')
+    @click.option('--dry-run', is_flag=True, help='Report drift without rewriting the counters.')
+    def reconcile_counters(dry_run):
+        """Rebuild ticket_counters / user_ticket_counters from the tickets table."""
+        drift = TicketCounter.reconcile(mysql, dry_run=dry_run)
+        for table, key, expected, actual in drift:
+            click.echo(f"{table} {key}: expected {expected}, found {actual}")
+        verb = 'Found' if dry_run else 'Fixed'
+        click.echo(f"{verb} {len(drift)} drifted counter(s).")
+
+    @app.cli.command('refresh-rollups')
+    @click.option('--full', is_flag=True, help='Rebuild every day instead of only the changed ones.')
+    def refresh_rollups(full):
+        """Update the daily analytics rollup tables."""
+        rebuilt = AnalyticsRollup.refresh(mysql, full=full)
+        click.echo(f"Rebuilt {rebuilt} day(s) of analytics rollups.")
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Recreate the FULLTEXT indexes used by ticket search."""
+        Ticket.rebuild_search_index(mysql)
+        click.echo('Search indexes rebuilt.')
+
+    @app.cli.command('deactivate-user')
+    @click.argument('user_id', type=int)
+    def deactivate_user(user_id):
+        """Disable an account and revoke all of its sessions."""
+        User.deactivate(mysql, user_id)
+        revoked = revoke_user_sessions(user_id)
+        click.echo(f"User {user_id} deactivated, {revoked} session(s) revoked.")
+        if app.config['SESSION_BACKEND'] == 'lru':
+            click.echo("Note: the lru session store lives inside each server process; "
+                       "use POST /admin/users/<id>/deactivate to revoke live sessions.")
+
+    @app.cli.command('invalidate-reference-cache')
+    def invalidate_reference_cache():
+        """Drop cached categories and agent lists, in every worker when version stamps are on."""
+        Category.invalidate_cache(mysql)
+        User.invalidate_agents(mysql)
+        click.echo('Reference cache invalidated.')
+
+    return app
 
 if __name__ == '__main__':
-    print("Starting Flask app...")
-    print("Server running at http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app = create_app()
     upload_folder = app.config.get('UPLOAD_FOLDER')
     if upload_folder and not os.path.exists(upload_folder):
         os.makedirs(upload_folder)
-    
+    print("Starting Flask app...")
+    print("Server running at http://localhost:5000")
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000)
@@ -0,0 +1,19 @@
+"""ASGI entry point: uvicorn asgi:app --workers 4 (from backend/).
+
+Flask is a WSGI framework, so a2wsgi runs each request on a thread pool of
+ASGI_THREADS threads per worker (default GUNICORN_THREADS, then 4, the same
+as gunicorn.conf.py). asgiref's WsgiToAsgi is not used: it runs every
+request on one shared thread, so a worker would serve one request at a time.
+Async views still get their own event loop on their thread and fan their
+queries out through mysql.gather(). FLASK_CONFIG picks the config class, as
+in wsgi.py.
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import create_app
+
+flask_app = create_app()
+app = WSGIMiddleware(flask_app, workers=int(os.environ.get('ASGI_THREADS')
+                                             or os.environ.get('GUNICORN_THREADS') or 4))
@@ -0,0 +1,182 @@
+import heapq
+import itertools
+import threading
+
+OPEN_STATUSES = ('open', 'in_progress')
+
+
+class AssignmentEngine:
+    """Routes new tickets to the least loaded agent who handles their category.
+
+    An agent's load is the priority-weighted count of their open tickets. It
+    is kept in memory and adjusted on every assignment and status change, and
+    each category has a heap of eligible agents ordered by load, so a routing
+    decision is O(log agents). Heap entries are never updated in place: a
+    load change pushes a fresh entry and stale ones are dropped when they
+    reach the top. Agents without rows in agent_skills take every category.
+
+    Each worker process keeps its own index; `refresh` re-reads the true
+    loads from ticket_counters to pull it back in line with the others.
+    """
+
+    WEIGHTS = {'low': 1, 'medium': 1, 'high': 2, 'urgent': 4}
+    GENERALISTS = None
+
+    def __init__(self, enabled=True, max_load=None, weights=None):
+        self.enabled = enabled
+        self.max_load = max_load
+        self.weights = dict(weights or self.WEIGHTS)
+        self._load = {}
+        self._skills = {}
+        self._stamp = {}
+        self._heaps = {}
+        self._members = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.picks = 0
+        self.unroutable = 0
+
+    def reset(self, agents, skills=None, loads=None):
+        """Replace the whole index. `skills` maps agent -> category ids, `loads` agent -> weight."""
+        skills = skills or {}
+        loads = loads or {}
+        with self._lock:
+            self._load = {agent: loads.get(agent, 0) for agent in agents}
+            self._skills = {agent: frozenset(skills.get(agent, ())) for agent in agents}
+            self._stamp = {}
+            self._heaps = {}
+            self._members = {}
+            for agent in self._load:
+                seq = next(self._seq)
+                self._stamp[agent] = seq
+                for key in self._skills[agent] or (self.GENERALISTS,):
+                    self._heaps.setdefault(key, []).append((self._load[agent], seq, agent))
+                    self._members[key] = self._members.get(key, 0) + 1
+            for heap in self._heaps.values():
+                heapq.heapify(heap)
+            self._loaded = True
+
+    def refresh(self, mysql):
+        """Rebuild from the database: active agents, their skills and current open load"""
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT user_id FROM users WHERE role IN ('agent', 'admin') AND is_active = TRUE")
+        agents = [row['user_id'] for row in cursor.fetchall()]
+
+        cursor.execute("SELECT agent_id, category_id FROM agent_skills")
+        skills = {}
+        for row in cursor.fetchall():
+            skills.setdefault(row['agent_id'], set()).add(row['category_id'])
+
+        cursor.execute("""
+            SELECT assignee_id, priority, SUM(ticket_count) as ticket_count
+            FROM ticket_counters
+            WHERE status IN ('open', 'in_progress') AND assignee_id <> 0
+            GROUP BY assignee_id, priority
+        """)
+        loads = {}
+        for row in cursor.fetchall():
+            loads[row['assignee_id']] = loads.get(row['assignee_id'], 0) + \
+                self.weights.get(row['priority'], 1) * int(row['ticket_count'])
+        cursor.close()
+
+        self.reset(agents, skills, loads)
+
+    def route(self, mysql, category_id, priority):
+        """Pick an agent for a new ticket, loading the index on first use. None leaves it unassigned."""
+        if not self.enabled:
+            return None
+        if not self._loaded:
+            self.refresh(mysql)
+        return self.pick(category_id, priority)
+
+    def pick(self, category_id, priority):
+        with self._lock:
+            best = None
+            for key in (category_id, self.GENERALISTS):
+                top = self._top(key)
+                if top is not None and (best is None or top < best):
+                    best = top
+
+            if best is None or (self.max_load is not None and best[0] >= self.max_load):
+                self.unroutable += 1
+                return None
+
+            agent = best[2]
+            self._add(agent, self.weights.get(priority, 1))
+            self.picks += 1
+            return agent
+
+    def release(self, agent_id, priority):
+        """Undo a pick whose ticket was never saved"""
+        with self._lock:
+            self._add(agent_id, -self.weights.get(priority, 1))
+
+    def track(self, ticket, updates):
+        """Adjust loads for a change to one ticket; `ticket` is the row before `updates`"""
+        before = self._weight(ticket)
+        after = self._weight({**ticket, **updates})
+        if before == after:
+            return
+        with self._lock:
+            if before[0] is not None:
+                self._add(before[0], -before[1])
+            if after[0] is not None:
+                self._add(after[0], after[1])
+
+    def remove_agent(self, agent_id):
+        """Stop routing to an agent, e.g. after deactivation. Their heap entries go stale."""
+        with self._lock:
+            self._load.pop(agent_id, None)
+            self._stamp.pop(agent_id, None)
+            for key in self._skills.pop(agent_id, ()) or (self.GENERALISTS,):
+                if key in self._members:
+                    self._members[key] -= 1
+
+    def stats(self):
+        with self._lock:
+            loads = list(self._load.values())
+            return {
+                'enabled': self.enabled,
+                'agents': len(loads),
+                'picks': self.picks,
+                'unroutable': self.unroutable,
+                'min_load': min(loads) if loads else 0,
+                'max_load': max(loads) if loads else 0,
+                'heap_entries': sum(len(heap) for heap in self._heaps.values())
+            }
+
+    def _weight(self, ticket):
+        assigned = ticket.get('assigned_to')
+        if not assigned or ticket.get('status') not in OPEN_STATUSES:
+            return (None, 0)
+        return (int(assigned), self.weights.get(ticket.get('priority'), 1))
+
+    def _add(self, agent, delta):
+        if agent not in self._load:
+            return
+        self._load[agent] = max(0, self._load[agent] + delta)
+        seq = next(self._seq)
+        self._stamp[agent] = seq
+        for key in self._skills[agent] or (self.GENERALISTS,):
+            heap = self._heaps.setdefault(key, [])
+            heapq.heappush(heap, (self._load[agent], seq, agent))
+            if len(heap) > 4 * self._members.get(key, 0) + 64:
+                self._compact(key)
+
+    def _top(self, key):
+        heap = self._heaps.get(key)
+        while heap:
+            load, seq, agent = heap[0]
+            if self._stamp.get(agent) == seq:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def _compact(self, key):
+        heap = [entry for entry in self._heaps[key] if self._stamp.get(entry[2]) == entry[1]]
+        heapq.heapify(heap)
+        self._heaps[key] = heap
+
+
+assignment_engine = AssignmentEngine()
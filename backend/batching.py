@@ -0,0 +1,132 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitter:
+    """Coalesces small writes from concurrent requests into shared transactions.
+
+    `submit(item)` queues the item and blocks until the transaction holding
+    it has committed, then returns that item's result, so a caller is only
+    told "saved" once the row is durable. A flusher thread waits up to
+    `window_ms` after the first queued item (or until `max_batch` items)
+    and hands the whole batch to `write(items)`, which must write them in
+    one transaction and return one result per item. If a batch fails, its
+    items are retried one by one so a single bad row fails only its own
+    request. With `window_ms` 0 the committer is disabled and callers
+    should write directly.
+    
+    A caller that gives up after `timeout` seconds cancels its item, so it
+    is never written later behind the caller's back; if the item's batch is
+    already being written, the caller waits for that outcome instead.
+    """
+
+    def __init__(self, name, write, window_ms=0, max_batch=100, timeout=10.0):
+        self.name = name
+        self.write = write
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self):
+        return self.window_ms > 0
+
+    def submit(self, item):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise
+            # Already in a transaction: reporting failure now could make the caller
+            # resubmit a row that is about to commit, so wait for the real outcome
+            return future.result()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'window_ms': self.window_ms,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch': round(self.items / self.batches, 2) if self.batches else 0,
+            'fallbacks': self.fallbacks
+        }
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def _collect(self, batch):
+        """Fill `batch` with (item, future) pairs: the next item plus whatever arrives within the window"""
+        batch.append(self._queue.get())
+        deadline = time.monotonic() + self.window_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                self._collect(batch)
+                # Drops items whose callers timed out; the rest can no longer be cancelled
+                batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+                if batch:
+                    self._flush(batch)
+            except Exception as e:
+                # Fail this batch only; a dead flusher would leave every later submit hanging
+                logger.exception("%s: flusher error", self.name)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, batch):
+        try:
+            results = self.write([item for item, _ in batch])
+        except Exception:
+            logger.exception("%s: batch of %d failed, retrying items singly", self.name, len(batch))
+            self.fallbacks += 1
+            for item, future in batch:
+                try:
+                    future.set_result(self.write([item])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        if len(results) != len(batch):
+            # The write committed, so retrying singly would store every item twice
+            error = RuntimeError(f"write returned {len(results)} results for {len(batch)} items")
+            logger.error("%s: %s", self.name, error)
+            for _, future in batch:
+                future.set_exception(error)
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
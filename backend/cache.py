@@ -0,0 +1,181 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered template fragments, bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class ReferenceCache:
+    """Process-wide cache for small tables that almost never change.
+
+    Values stay cached until invalidate() is called. When `shared_versions`
+    is on, a version stamp in the cache_versions table is re-read at most
+    every `check_interval` seconds; invalidate() bumps it, so every worker
+    drops its copy without a restart.
+    """
+
+    shared_versions = False
+    check_interval = 5
+
+    def __init__(self, name):
+        self.name = name
+        self._values = {}
+        self._version = None
+        self._generation = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mysql, key, loader):
+        if ReferenceCache.shared_versions:
+            self._sync_version(mysql)
+
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        with self._lock:
+            # Don't store a value that was loaded across an invalidation
+            if generation == self._generation:
+                self._values[key] = value
+        return value
+
+    def invalidate(self, mysql=None):
+        with self._lock:
+            self._values.clear()
+            self._generation += 1
+
+        if ReferenceCache.shared_versions and mysql is not None:
+            cursor = mysql.connection.cursor()
+            cursor.execute("""
+                INSERT INTO cache_versions (cache_name, version) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1
+            """, (self.name,))
+            mysql.connection.commit()
+            cursor.close()
+            self._checked_at = 0.0
+
+    def stamp(self):
+        """Changes whenever the cached values are dropped; use it to key anything derived from them"""
+        with self._lock:
+            return self._version, self._generation
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._values), 'hits': self.hits, 'misses': self.misses,
+                    'version': self._version}
+
+    def _sync_version(self, mysql):
+        now = time.monotonic()
+        if now - self._checked_at < ReferenceCache.check_interval:
+            return
+
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT version FROM cache_versions WHERE cache_name = %s", (self.name,))
+        row = cursor.fetchone()
+        cursor.close()
+        version = row['version'] if row else 0
+
+        with self._lock:
+            if version != self._version:
+                self._values.clear()
+                self._generation += 1
+                self._version = version
+            self._checked_at = now
@@ -10,18 +10,102 @@ class Config:
     MYSQL_USER = os.environ.get('MYSQL_USER') or 'root'
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD') or '12345'
     MYSQL_DB = os.environ.get('MYSQL_DB') or 'customer_support_db'
+    MYSQL_PORT = int(os.environ.get('MYSQL_PORT') or 3306)
     MYSQL_CURSORCLASS = 'DictCursor'
     
+    MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE') or 5)
+    MYSQL_POOL_MAX_OVERFLOW = int(os.environ.get('MYSQL_POOL_MAX_OVERFLOW') or 10)
+    MYSQL_POOL_TIMEOUT = 30
+    MYSQL_POOL_RECYCLE = 3600
+    MYSQL_POOL_PRE_PING = True
+    # Let async views run independent queries at once, each on its own pooled connection
+    MYSQL_FANOUT_ENABLED = os.environ.get('MYSQL_FANOUT_ENABLED', 'true').lower() in ('1', 'true')
+    
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
+    # 'lru' (in-process), 'redis' (shared, needs the redis package) or 'cookie' (Flask default)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or 'lru'
+    SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL') or 'redis://localhost:6379/0'
+    SESSION_LRU_SIZE = 50000
+    
+    # Changing the method re-hashes each password transparently on its next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    PASSWORD_HASH_MAX_PENDING = 32
+    PASSWORD_HASH_QUEUE_TIMEOUT = 2.0
+    # (burst, tokens regained per second)
+    LOGIN_ACCOUNT_RATE_LIMIT = (5, 1 / 30)
+    LOGIN_IP_RATE_LIMIT = (int(os.environ.get('LOGIN_IP_BURST') or 20), 1 / 3)
     
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx'}
+    ATTACHMENT_THUMBNAIL_SIZE = 256
+    # Let a fronting server that honours X-Sendfile (Apache, lighttpd) stream downloads
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true')
+    
+    # Rendered {% cache %} blocks kept per worker process; 0 turns fragment caching off
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES') or 16 * 1024 * 1024)
+    # Compile every template at startup instead of on first use
+    TEMPLATE_PRELOAD = True
+    # Keep compiled templates on disk so new worker processes skip the compiler;
+    # no directory means a private one under the system temp dir
+    TEMPLATE_BYTECODE_CACHE = True
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
     
     TICKETS_PER_PAGE = 10
+    # Replies rendered with a ticket; older ones load on demand
+    THREAD_PAGE_SIZE = 50
+    MAX_OFFSET_PAGES = 20
+    BULK_MAX_TICKETS = 10000
+    BULK_CHUNK_SIZE = 500
+    TICKET_NUMBER_BLOCK_SIZE = int(os.environ.get('TICKET_NUMBER_BLOCK_SIZE') or 50)
+    USER_CACHE_TTL = 30
+    # Re-check the shared cache_versions stamp so category / agent edits reach every worker
+    REFERENCE_CACHE_SHARED_VERSIONS = os.environ.get('REFERENCE_CACHE_SHARED_VERSIONS', '').lower() in ('1', 'true')
+    REFERENCE_CACHE_CHECK_INTERVAL = 5
+    
+    # Seconds between incremental analytics rollup refreshes (0 disables the job)
+    ANALYTICS_ROLLUP_INTERVAL = int(os.environ.get('ANALYTICS_ROLLUP_INTERVAL') or 60)
+    
+    # Route new tickets to the least loaded skilled agent; the index is re-read
+    # from ticket_counters every ASSIGNMENT_RESYNC_INTERVAL seconds (0 disables)
+    AUTO_ASSIGN_ENABLED = os.environ.get('AUTO_ASSIGN_ENABLED', 'true').lower() in ('1', 'true')
+    ASSIGNMENT_MAX_LOAD = None
+    ASSIGNMENT_PRIORITY_WEIGHTS = {'low': 1, 'medium': 1, 'high': 2, 'urgent': 4}
+    ASSIGNMENT_RESYNC_INTERVAL = 300
+    
+    # Flag missed first-response / resolution deadlines as they pass (targets live in sla_policies)
+    SLA_ENABLED = os.environ.get('SLA_ENABLED', 'true').lower() in ('1', 'true')
+    
+    # Coalesce replies arriving within this many ms into one INSERT + commit (0 = one
+    # transaction per reply). A reply is acknowledged only after its batch commits.
+    REPLY_GROUP_COMMIT_MS = int(os.environ.get('REPLY_GROUP_COMMIT_MS') or 0)
+    REPLY_GROUP_COMMIT_MAX_BATCH = 100
+    
+    # Best matches taken from each FULLTEXT index before filtering and ranking
+    SEARCH_CANDIDATE_LIMIT = 1000
+    
+    # SQL profiling: Server-Timing headers, slow query / N+1 warnings and /metrics
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() in ('1', 'true')
+    PROFILING_SERVER_TIMING = True
+    SLOW_QUERY_MS = 200
+    N_PLUS_ONE_THRESHOLD = 10
+    # When set, /metrics requires "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Without a token /metrics is then disabled rather than public
+    METRICS_REQUIRE_TOKEN = False
+    
+    # Idle Server-Sent Events streams get a comment frame this often
+    SSE_HEARTBEAT_SECONDS = 15
+    # 'local' only reaches streams held by the publishing process; 'redis' reaches every worker
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND') or 'local'
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL') or 'redis://localhost:6379/0'
+    
+    # Rollups, SLA timers and assignment resync; off in the event-stream server
+    BACKGROUND_JOBS_ENABLED = os.environ.get('BACKGROUND_JOBS_ENABLED', 'true').lower() in ('1', 'true')
     
     DEBUG = True
     TESTING = False
@@ -35,6 +119,12 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     SESSION_COOKIE_SECURE = True
+    # The lru store is private to each process, and production runs several workers
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or 'redis'
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND') or 'redis'
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() in ('1', 'true')
+    PROFILING_SERVER_TIMING = False
+    METRICS_REQUIRE_TOKEN = True
     SECRET_KEY = os.environ.get('SECRET_KEY')
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD')
 
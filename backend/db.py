@@ -0,0 +1,345 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import MySQLdb
+from MySQLdb import cursors
+from flask import g
+
+# Connection of a query running inside PooledMySQL.gather(); overrides the request one
+_task_connection = contextvars.ContextVar('mysql_task_connection', default=None)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of MySQLdb connections.
+
+    Keeps up to `pool_size` idle connections and opens up to `max_overflow`
+    extra ones under load. Checked-out connections are pinged first when
+    `pre_ping` is set and replaced once older than `recycle` seconds, so a
+    server-side wait_timeout never surfaces as a failed request.
+    """
+
+    def __init__(self, connect, pool_size=5, max_overflow=10, timeout=30, recycle=3600, pre_ping=True):
+        self._connect = connect
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._born = {}
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._ping_failures = 0
+
+    def acquire(self, wait=True):
+        """Check a connection out. With wait=False, returns None instead of waiting for one."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    # Reserve the slot now, connect outside the lock
+                    self._open += 1
+                    conn = None
+                    break
+                if not wait:
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                elapsed = time.monotonic() - started
+                self._waits += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+
+        try:
+            if conn is None:
+                return self._new_connection()
+            return self._checked(conn)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a connection. Pass discard=True when it may hold an unread
+        result set (e.g. an abandoned server-side cursor) so it is closed instead."""
+        healthy = not discard
+        if healthy:
+            try:
+                # Never hand a half-finished transaction to the next request
+                conn.rollback()
+            except MySQLdb.Error:
+                healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                conn = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if conn is not None:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def dispose(self):
+        """Close every idle connection. Checked-out connections close on release."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            capacity = self.pool_size + self.max_overflow
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'saturation': self._in_use / capacity if capacity else 0.0,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': self._wait_total,
+                'wait_time_max': self._wait_max,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'recycled': self._recycled,
+                'ping_failures': self._ping_failures
+            }
+
+    def _new_connection(self):
+        conn = self._connect()
+        self._born[id(conn)] = time.monotonic()
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _checked(self, conn):
+        if self.recycle and time.monotonic() - self._born.get(id(conn), 0) > self.recycle:
+            with self._cond:
+                self._recycled += 1
+            self._close(conn)
+            return self._new_connection()
+
+        if self.pre_ping:
+            try:
+                conn.ping()
+            except MySQLdb.Error:
+                with self._cond:
+                    self._ping_failures += 1
+                self._close(conn)
+                return self._new_connection()
+        return conn
+
+    def _close(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except MySQLdb.Error:
+            pass
+
+
+class PooledMySQL:
+    """Drop-in replacement for flask_mysqldb.MySQL backed by ConnectionPool.
+
+    `mysql.connection` checks a connection out on first use in an app
+    context and returns it to the pool at teardown, so existing
+    `mysql.connection.cursor()` / `commit()` code keeps working unchanged.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        # Pools inherited across fork; see `pool`
+        self._inherited = []
+        # Optional callable wrapping each request connection (see profiling.py)
+        self.connection_wrapper = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_UNIX_SOCKET', None)
+        app.config.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8mb4')
+        app.config.setdefault('MYSQL_CURSORCLASS', None)
+        app.config.setdefault('MYSQL_AUTOCOMMIT', False)
+        app.config.setdefault('MYSQL_CUSTOM_OPTIONS', None)
+        app.config.setdefault('MYSQL_POOL_SIZE', 5)
+        app.config.setdefault('MYSQL_POOL_MAX_OVERFLOW', 10)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', 30)
+        app.config.setdefault('MYSQL_POOL_RECYCLE', 3600)
+        app.config.setdefault('MYSQL_POOL_PRE_PING', True)
+        app.config.setdefault('MYSQL_FANOUT_ENABLED', True)
+
+        self.app = app
+        app.teardown_appcontext(self.teardown)
+
+    def connect_kwargs(self, config):
+        kwargs = {
+            'host': config['MYSQL_HOST'],
+            'port': int(config['MYSQL_PORT']),
+            'connect_timeout': config['MYSQL_CONNECT_TIMEOUT'],
+            'charset': config['MYSQL_CHARSET'],
+            'autocommit': config['MYSQL_AUTOCOMMIT']
+        }
+        if config['MYSQL_USER']:
+            kwargs['user'] = config['MYSQL_USER']
+        if config['MYSQL_PASSWORD']:
+            kwargs['passwd'] = config['MYSQL_PASSWORD']
+        if config['MYSQL_DB']:
+            kwargs['db'] = config['MYSQL_DB']
+        if config['MYSQL_UNIX_SOCKET']:
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        if config['MYSQL_CURSORCLASS']:
+            kwargs['cursorclass'] = getattr(cursors, config['MYSQL_CURSORCLASS'])
+        if config['MYSQL_CUSTOM_OPTIONS']:
+            kwargs.update(config['MYSQL_CUSTOM_OPTIONS'])
+        return kwargs
+
+    @property
+    def pool(self):
+        # Built on first use, and rebuilt in a forked child so sockets are never shared
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    if self._pool is not None:
+                        # The parent's sockets must not be closed from here (that would send
+                        # COM_QUIT on the parent's sessions), so keep them referenced and unused
+                        self._inherited.append(self._pool)
+                    config = self.app.config
+                    kwargs = self.connect_kwargs(config)
+                    self._pool = ConnectionPool(
+                        lambda: MySQLdb.connect(**kwargs),
+                        pool_size=config['MYSQL_POOL_SIZE'],
+                        max_overflow=config['MYSQL_POOL_MAX_OVERFLOW'],
+                        timeout=config['MYSQL_POOL_TIMEOUT'],
+                        recycle=config['MYSQL_POOL_RECYCLE'],
+                        pre_ping=config['MYSQL_POOL_PRE_PING']
+                    )
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def dispose(self):
+        """Close this process's idle connections, e.g. in a prefork master before workers fork"""
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.dispose()
+
+    @property
+    def connection(self):
+        task_conn = _task_connection.get()
+        if task_conn is not None:
+            return task_conn
+        if 'mysql_conn' not in g:
+            conn = self.pool.acquire()
+            g.mysql_conn = self.connection_wrapper(conn) if self.connection_wrapper else conn
+        return g.mysql_conn
+
+    def teardown(self, exception):
+        conn = g.pop('mysql_conn', None)
+        if conn is not None:
+            self.pool.release(getattr(conn, 'raw', conn))
+
+    async def gather(self, *calls):
+        """Run independent model calls concurrently and return their results in order.
+
+        Each call is a zero-argument callable using `mysql.connection` as usual
+        (e.g. functools.partial(Ticket.get_all_tickets, mysql, limit=5)). It runs
+        in a worker thread on a pooled connection of its own, so only use it for
+        reads that do not need to see each other or the request's transaction.
+        A call that finds the pool with nothing to spare runs on the request
+        connection instead, one at a time, rather than waiting for capacity
+        other requests are using.
+        """
+        if not self.app.config['MYSQL_FANOUT_ENABLED'] or len(calls) < 2:
+            return [call() for call in calls]
+
+        loop = asyncio.get_running_loop()
+        executor = self._fanout_executor()
+        request_conn_lock = threading.Lock()
+        return await asyncio.gather(*(
+            loop.run_in_executor(executor, contextvars.copy_context().run,
+                                 functools.partial(self._run_alone, call, request_conn_lock))
+            for call in calls
+        ))
+
+    def _run_alone(self, call, request_conn_lock):
+        conn = self.pool.acquire(wait=False)
+        if conn is None:
+            with request_conn_lock:
+                return call()
+        token = _task_connection.set(self.connection_wrapper(conn) if self.connection_wrapper else conn)
+        try:
+            return call()
+        finally:
+            _task_connection.reset(token)
+            self.pool.release(conn)
+
+    def _fanout_executor(self):
+        # Shared by every request (Flask gives each async view its own event loop,
+        # whose default executor would start new threads every time) and per process
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._pool_lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    config = self.app.config
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=config['MYSQL_POOL_SIZE'] + config['MYSQL_POOL_MAX_OVERFLOW'],
+                        thread_name_prefix='mysql-fanout')
+                    self._executor_pid = os.getpid()
+        return self._executor
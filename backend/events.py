@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One open event stream. Holds a bounded queue of pending events."""
+
+    def __init__(self, topics, maxsize):
+        self.topics = frozenset(topics)
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class RedisTransport:
+    """Carries published events between processes over one Redis pub/sub channel.
+
+    Every process that has subscribers runs a listener thread, started on
+    the first subscribe (so again in each forked worker), which hands
+    incoming events to the local broker. If the connection drops, local
+    subscribers are told to resync, since they may have missed events.
+    """
+
+    def __init__(self, url, channel='ticket-events'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.channel = channel
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def send(self, topics, event):
+        self.redis.publish(self.channel, json.dumps({'topics': list(topics), 'event': event}, default=_json_default))
+
+    def ensure_listening(self, broker):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._listen, args=(broker,), name='event-listener', daemon=True).start()
+
+    def _listen(self, broker):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    broker.deliver(payload['topics'], payload['event'])
+            except Exception:
+                logger.exception("Event listener lost its Redis connection; retrying")
+                broker.resync_all()
+                time.sleep(1)
+
+
+class EventBroker:
+    """Pub/sub for ticket change events.
+
+    Publishing never blocks: a subscriber that falls `queue_size` events
+    behind is marked overflowed and told to reload instead of stalling the
+    request that published. Without a transport, subscribers only see
+    events published in the same process; with RedisTransport (the
+    EVENTS_BACKEND='redis' setting) they see every worker's. Streams are
+    served by gunicorn.events.conf.py on gevent, so thousands of idle
+    streams cost a greenlet each, not a thread.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.transport = None
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if app.config.get('EVENTS_BACKEND', 'local') == 'redis':
+            self.transport = RedisTransport(app.config['EVENTS_REDIS_URL'])
+
+    def subscribe(self, *topics):
+        if self.transport is not None:
+            self.transport.ensure_listening(self)
+        sub = Subscription(topics, self.queue_size)
+        with self._lock:
+            for topic in sub.topics:
+                self._topics.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._topics[topic]
+
+    def publish(self, topics, event):
+        if self.transport is not None:
+            try:
+                # Comes back through the listener, in this process as in every other
+                self.transport.send(topics, event)
+                return
+            except Exception:
+                logger.exception("Could not publish %s event to other workers", event.get('type'))
+        self.deliver(topics, event)
+
+    def deliver(self, topics, event):
+        """Queue `event` for this process's subscribers to any of `topics`"""
+        with self._lock:
+            targets = set()
+            for topic in topics:
+                targets |= self._topics.get(topic, set())
+
+        for sub in targets:
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                sub.overflowed = True
+
+    def resync_all(self):
+        """Tell every local subscriber to reload, e.g. after events may have been lost"""
+        with self._lock:
+            subs = set().union(*self._topics.values()) if self._topics else set()
+        for sub in subs:
+            sub.overflowed = True
+
+    def publish_ticket(self, ticket_id, kind, **fields):
+        """Send a change to everyone watching this ticket and to the agent queue"""
+        event = {'type': kind, 'ticket_id': ticket_id, 'fields': fields}
+        self.publish((f'ticket:{ticket_id}', 'queue'), event)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._topics.values())) if self._topics else 0
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def format_sse(event, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f"event: {event['type']}")
+    lines.append('data: ' + json.dumps(event, default=_json_default, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(broker, sub, heartbeat=15, visible=None):
+    """Generator of SSE frames for one subscription; unsubscribes when the client goes away"""
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            if sub.overflowed:
+                yield format_sse({'type': 'resync'})
+                return
+            try:
+                event = sub.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if visible is None or visible(event):
+                yield format_sse(event)
+    finally:
+        broker.unsubscribe(sub)
+
+
+broker = EventBroker()
@@ -0,0 +1,48 @@
+import itertools
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from cache import FragmentCache
+
+fragment_cache = FragmentCache()
+
+# Every compilation of a {% cache %} tag gets a fresh number, so a template
+# reloaded after an edit never serves fragments rendered from its old source
+_compilations = itertools.count()
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 'name', key, ... %}...{% endcache %} renders its body once per key.
+
+    The rendered HTML is kept in `fragment_cache` (process-wide, LRU within a
+    byte budget) under the template, the tag's position and the key values.
+    Key values must change whenever anything the body shows changes: a row's
+    updated_at plus the fields that can change within the same second, or
+    ReferenceCache.stamp() for lists built from cached reference data.
+    Nothing request-specific (current_user, csrf tokens, flashes) belongs
+    inside a cached block.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+
+        prefix = nodes.Const(f'{parser.name}:{lineno}:{next(_compilations)}')
+        call = self.call_method('_render', [prefix, nodes.List(key)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, prefix, key, caller):
+        if fragment_cache.max_bytes <= 0:
+            return caller()
+        cache_key = f'{prefix}:{key!r}'
+        html = fragment_cache.get(cache_key)
+        if html is None:
+            html = caller()
+            fragment_cache.set(cache_key, html)
+        return html
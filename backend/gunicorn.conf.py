@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+
+# Load the app once in the master; workers fork with the imports and compiled
+# templates already in memory, so a new worker serves its first request at once
+wsgi_app = 'wsgi:app'
+preload_app = True
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:8000'
+workers = int(os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+timeout = 60
+graceful_timeout = 30
+
+
+def when_ready(server):
+    from wsgi import app
+    if app.config['SESSION_BACKEND'] == 'lru' and server.cfg.workers > 1:
+        # Each worker would keep its own sessions and log users out at random
+        raise RuntimeError("SESSION_BACKEND 'lru' only works with one worker; "
+                           "use 'redis' or 'cookie', or set GUNICORN_WORKERS=1")
+    if app.config['EVENTS_BACKEND'] == 'local':
+        server.log.warning("EVENTS_BACKEND is 'local': live updates only reach streams held by the "
+                           "process that made the change, and none reach gunicorn.events.conf.py")
+    # create_app() opens no connections, but anything that did (a warm-up query, a
+    # CLI hook) must not leave sockets for the workers to inherit
+    app.mysql.dispose()
@@ -0,0 +1,21 @@
+import os
+
+# Server-Sent Events only: gunicorn -c gunicorn.events.conf.py (from backend/), with the
+# proxy sending /tickets/<id>/events and /admin/tickets/events here and everything else
+# to gunicorn.conf.py. An open page holds its stream for as long as it stays open, so
+# these workers use gevent, where an idle stream costs a greenlet instead of a thread.
+# Events published by the other server arrive over Redis (EVENTS_BACKEND=redis).
+wsgi_app = 'wsgi:app'
+worker_class = 'gevent'
+# Not preloaded: gevent has to patch threading and sockets before the app is imported
+preload_app = False
+
+bind = os.environ.get('GUNICORN_EVENTS_BIND') or '0.0.0.0:8001'
+workers = int(os.environ.get('GUNICORN_EVENTS_WORKERS') or 2)
+worker_connections = int(os.environ.get('GUNICORN_EVENTS_CONNECTIONS') or 5000)
+timeout = 60
+graceful_timeout = 10
+
+# MySQLdb calls are not cooperative and would stall every stream in the worker,
+# so the periodic jobs stay in the main server
+raw_env = ['BACKGROUND_JOBS_ENABLED=false']
@@ -0,0 +1,44 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Runs `func` inside an app context every `interval` seconds on a daemon thread.
+
+    The thread is started lazily from a request hook rather than at import,
+    so it is (re)created in every worker process after a prefork server forks.
+    """
+
+    def __init__(self, app, name, interval, func):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.func()
+            except Exception:
+                logger.exception("Periodic job %s failed", self.name)
@@ -1,10 +1,32 @@
+from flask import g, has_app_context
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
+import functools
+import logging
+import os
+import threading
+import MySQLdb.cursors
+from cache import TTLCache, ReferenceCache
+from security import password_hasher, HasherBusy
+
+logger = logging.getLogger(__name__)
+
+
+def identity_map(kind):
+    """Per-request map of already loaded rows, so each one is fetched at most once"""
+    if not has_app_context():
+        return {}
+    maps = g.setdefault('identity_map', {})
+    return maps.setdefault(kind, {})
+
 
 class User(UserMixin):
     """User model"""
     
+    # Short-lived cache of user rows keyed by user_id, shared across requests
+    cache = TTLCache(maxsize=10000, ttl=30)
+    agents_cache = ReferenceCache('agents')
+    
     def __init__(self, user_id, full_name, email, password_hash, phone=None, 
                  role='customer', created_at=None, updated_at=None, is_active=True):
         self.id = user_id
@@ -23,10 +45,13 @@ class User(UserMixin):
         return self._is_active
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
     
     def is_admin(self):
         return self.role == 'admin'
@@ -37,10 +62,26 @@ class User(UserMixin):
     def is_customer(self):
         return self.role == 'customer'
     
+    def session_profile(self):
+        """The fields cached in the server-side session so load_user can skip the DB"""
+        return {
+            'user_id': self.user_id,
+            'full_name': self.full_name,
+            'email': self.email,
+            'phone': self.phone,
+            'role': self.role,
+            'is_active': self.is_active
+        }
+    
+    @staticmethod
+    def from_session_profile(profile):
+        # No password hash in the session; load the user from the DB to check passwords
+        return User(password_hash=None, **profile)
+    
     @staticmethod
     def create_user(mysql, full_name, email, password, phone=None, role='customer'):
+        password_hash = password_hasher.hash(password)
         cursor = mysql.connection.cursor()
-        password_hash = generate_password_hash(password)
         
         query = """
             INSERT INTO users (full_name, email, password_hash, phone, role)
@@ -57,16 +98,52 @@ class User(UserMixin):
             cursor.close()
             raise e
     
+    @staticmethod
+    def upgrade_password_hash(mysql, user_id, password):
+        """Re-hash with the current method off the request path and store the result.
+        
+        Called after a successful login whose stored hash uses outdated
+        parameters. Skipped silently when the hashing pool is busy; the next
+        login will try again.
+        """
+        pool = mysql.pool
+        
+        def store(future):
+            try:
+                new_hash = future.result()
+                with pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("UPDATE users SET password_hash = %s WHERE user_id = %s",
+                                   (new_hash, user_id))
+                    conn.commit()
+                    cursor.close()
+                User.cache.invalidate(user_id)
+            except Exception:
+                logger.exception("Password rehash failed for user %s", user_id)
+        
+        try:
+            password_hasher.hash_async(password).add_done_callback(store)
+        except HasherBusy:
+            pass
+    
     @staticmethod
     def get_by_id(mysql, user_id):
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        cursor.close()
+        users = identity_map('user')
+        if user_id in users:
+            return users[user_id]
         
-        if user_data:
-            return User(**user_data)
-        return None
+        user_data = User.cache.get(user_id)
+        if user_data is None:
+            cursor = mysql.connection.cursor()
+            cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
+            user_data = cursor.fetchone()
+            cursor.close()
+            if user_data:
+                User.cache.set(user_id, user_data)
+        
+        user = User(**user_data) if user_data else None
+        users[user_id] = user
+        return user
     
     @staticmethod
     def get_by_email(mysql, email):
@@ -76,11 +153,37 @@ class User(UserMixin):
         cursor.close()
         
         if user_data:
-            return User(**user_data)
+            user = User(**user_data)
+            identity_map('user')[user.user_id] = user
+            return user
         return None
     
+    @staticmethod
+    def deactivate(mysql, user_id):
+        cursor = mysql.connection.cursor()
+        try:
+            cursor.execute("UPDATE users SET is_active = FALSE WHERE user_id = %s", (user_id,))
+            mysql.connection.commit()
+            cursor.close()
+        except Exception as e:
+            mysql.connection.rollback()
+            cursor.close()
+            raise e
+        User.invalidate(user_id)
+        User.invalidate_agents(mysql)
+    
+    @staticmethod
+    def invalidate(user_id):
+        """Drop a user from the cross-request cache and this request's identity map"""
+        User.cache.invalidate(user_id)
+        identity_map('user').pop(user_id, None)
+    
     @staticmethod
     def get_all_agents(mysql):
+        return User.agents_cache.get(mysql, 'all', lambda: User._load_agents(mysql))
+    
+    @staticmethod
+    def _load_agents(mysql):
         cursor = mysql.connection.cursor()
         cursor.execute("""
             SELECT user_id, full_name, email, role 
@@ -91,7 +194,77 @@ class User(UserMixin):
         agents = cursor.fetchall()
         cursor.close()
         return agents
+    
+    @staticmethod
+    def invalidate_agents(mysql=None):
+        """Call after changing a user's role or active flag"""
+        User.agents_cache.invalidate(mysql)
+
 
+class TicketSequence:
+    """Per-year ticket number allocator.
+    
+    Each process reserves a block of numbers with a single-row UPDATE on
+    ticket_sequences and hands them out from memory, so creating a ticket
+    never scans `tickets` and two workers can never draw the same number.
+    Numbers left in a block when a process exits are simply skipped.
+    """
+    
+    BLOCK_SIZE = 50
+    
+    _lock = threading.Lock()
+    _blocks = {}
+    _pid = None
+    
+    @staticmethod
+    def next_value(mysql, year):
+        with TicketSequence._lock:
+            if TicketSequence._pid != os.getpid():
+                # Forked children must not reuse the parent's reserved block
+                TicketSequence._blocks = {}
+                TicketSequence._pid = os.getpid()
+            
+            block = TicketSequence._blocks.get(year)
+            if not block or block[0] >= block[1]:
+                block = TicketSequence._reserve(mysql, year, TicketSequence.BLOCK_SIZE)
+                TicketSequence._blocks[year] = block
+            
+            value = block[0]
+            block[0] += 1
+            return value
+    
+    @staticmethod
+    def _reserve(mysql, year, size):
+        """Claim [start, end) for this process.
+        
+        Runs on a pooled connection of its own: committing the reservation
+        must not commit whatever the caller's transaction has pending.
+        """
+        with mysql.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    UPDATE ticket_sequences SET next_value = LAST_INSERT_ID(next_value + %s)
+                    WHERE seq_year = %s
+                """, (size, year))
+                if cursor.rowcount == 0:
+                    # First ticket of the year: continue after any number already issued
+                    cursor.execute("""
+                        INSERT IGNORE INTO ticket_sequences (seq_year, next_value)
+                        SELECT %s, IFNULL(MAX(CAST(SUBSTRING(ticket_number, 8) AS UNSIGNED)), 0) + 1
+                        FROM tickets WHERE ticket_number LIKE %s
+                    """, (year, f"TKT{year}%"))
+                    cursor.execute("""
+                        UPDATE ticket_sequences SET next_value = LAST_INSERT_ID(next_value + %s)
+                        WHERE seq_year = %s
+                    """, (size, year))
+                cursor.execute("SELECT LAST_INSERT_ID() as end_value")
+                end = int(cursor.fetchone()['end_value'])
+                conn.commit()
+                return [end - size, end]
+            finally:
+                # The pool rolls back anything uncommitted on release
+                cursor.close()
 
 class Ticket:
     """Ticket model"""
@@ -116,27 +289,25 @@ class Ticket:
     
     @staticmethod
     def generate_ticket_number(mysql):
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT COUNT(*) as count FROM tickets")
-        result = cursor.fetchone()
-        count = result['count'] + 1
-        cursor.close()
-        
         year = datetime.now().year
-        ticket_number = f"TKT{year}{count:06d}"
+        number = TicketSequence.next_value(mysql, year)
+        ticket_number = f"TKT{year}{number:06d}"
         return ticket_number
     
     @staticmethod
-    def create_ticket(mysql, user_id, category_id, subject, description, priority='medium'):
+    def create_ticket(mysql, user_id, category_id, subject, description, priority='medium', assigned_to=None,
+                      first_response_due=None, resolution_due=None):
         cursor = mysql.connection.cursor()
         ticket_number = Ticket.generate_ticket_number(mysql)
         
         query = """
-            INSERT INTO tickets (ticket_number, user_id, category_id, subject, description, priority)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO tickets (ticket_number, user_id, category_id, subject, description, priority, assigned_to,
+                                 first_response_due, resolution_due)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
         try:
-            cursor.execute(query, (ticket_number, user_id, category_id, subject, description, priority))
+            cursor.execute(query, (ticket_number, user_id, category_id, subject, description, priority, assigned_to,
+                                   first_response_due, resolution_due))
             mysql.connection.commit()
             ticket_id = cursor.lastrowid
             cursor.close()
@@ -148,6 +319,10 @@ class Ticket:
     
     @staticmethod
     def get_by_id(mysql, ticket_id):
+        tickets = identity_map('ticket')
+        if ticket_id in tickets:
+            return tickets[ticket_id]
+        
         cursor = mysql.connection.cursor()
         query = """
             SELECT t.*, u.full_name as customer_name, u.email as customer_email,
@@ -161,65 +336,284 @@ class Ticket:
         cursor.execute(query, (ticket_id,))
         ticket = cursor.fetchone()
         cursor.close()
+        tickets[ticket_id] = ticket
         return ticket
     
     @staticmethod
-    def get_user_tickets(mysql, user_id, limit=None):
+    def get_version(mysql, ticket_id):
+        """Primary-key lookup of the columns that change a ticket's representation, for ETags"""
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT ticket_id, user_id, updated_at, status, priority, assigned_to,
+                   response_breached, resolution_breached
+            FROM tickets WHERE ticket_id = %s
+        """, (ticket_id,))
+        version = cursor.fetchone()
+        cursor.close()
+        return version
+    
+    @staticmethod
+    def get_user_tickets(mysql, user_id, filters=None, limit=None, offset=0, after=None, before=None):
+        """A customer's tickets, newest first, filtered and paged in SQL.
+        
+        `after` / `before` are (created_at, ticket_id) keys as in
+        get_tickets_page; prefer them over `offset` for anything past the
+        first few pages. Backed by idx_user_status_created / idx_user_created.
+        """
         cursor = mysql.connection.cursor()
         query = """
             SELECT t.*, c.category_name
             FROM tickets t
             JOIN categories c ON t.category_id = c.category_id
             WHERE t.user_id = %s
-            ORDER BY t.created_at DESC
         """
+        params = [user_id]
+        clause, filter_params = Ticket._filter_clause(filters)
+        query += clause
+        params.extend(filter_params)
+        
+        seek, order, seek_params = Ticket._seek_clause(after, before)
+        query += seek + order
+        params.extend(seek_params)
+        
         if limit:
-            query += f" LIMIT {limit}"
+            query += f" LIMIT {int(limit)}"
+            if offset:
+                query += f" OFFSET {int(offset)}"
         
-        cursor.execute(query, (user_id,))
-        tickets = cursor.fetchall()
+        cursor.execute(query, params)
+        tickets = list(cursor.fetchall())
         cursor.close()
+        if before:
+            tickets.reverse()
         return tickets
     
     @staticmethod
-    def get_all_tickets(mysql, filters=None, limit=None, offset=0):
-        cursor = mysql.connection.cursor()
+    def _seek_clause(after=None, before=None):
+        """Keyset predicate and ORDER BY for paging on (created_at, ticket_id).
         
-        query = """
-            SELECT t.*, u.full_name as customer_name, c.category_name,
-                   a.full_name as assigned_agent_name
-            FROM tickets t
-            JOIN users u ON t.user_id = u.user_id
-            JOIN categories c ON t.category_id = c.category_id
-            LEFT JOIN users a ON t.assigned_to = a.user_id
-            WHERE 1=1
+        Rows come back ascending when seeking `before`, so callers reverse
+        them to restore newest-first order.
         """
+        if before:
+            return (" AND (t.created_at > %s OR (t.created_at = %s AND t.ticket_id > %s))",
+                    " ORDER BY t.created_at ASC, t.ticket_id ASC",
+                    [before[0], before[0], before[1]])
+        if after:
+            return (" AND (t.created_at < %s OR (t.created_at = %s AND t.ticket_id < %s))",
+                    " ORDER BY t.created_at DESC, t.ticket_id DESC",
+                    [after[0], after[0], after[1]])
+        return "", " ORDER BY t.created_at DESC, t.ticket_id DESC", []
+    
+    @staticmethod
+    def _filter_clause(filters, alias='t.'):
+        """Build the WHERE fragment shared by the ticket list, count and page queries"""
+        clause = ""
         params = []
         
         if filters:
             if filters.get('status'):
-                query += " AND t.status = %s"
+                clause += f" AND {alias}status = %s"
                 params.append(filters['status'])
             if filters.get('priority'):
-                query += " AND t.priority = %s"
+                clause += f" AND {alias}priority = %s"
                 params.append(filters['priority'])
-            if filters.get('assigned_to'):
-                query += " AND t.assigned_to = %s"
+            if filters.get('assigned_to') == 'unassigned':
+                clause += f" AND {alias}assigned_to IS NULL"
+            elif filters.get('assigned_to'):
+                clause += f" AND {alias}assigned_to = %s"
                 params.append(filters['assigned_to'])
             if filters.get('category_id'):
-                query += " AND t.category_id = %s"
+                clause += f" AND {alias}category_id = %s"
                 params.append(filters['category_id'])
+            if filters.get('user_id'):
+                clause += f" AND {alias}user_id = %s"
+                params.append(filters['user_id'])
         
-        query += " ORDER BY t.created_at DESC"
+        return clause, params
+    
+    @staticmethod
+    def get_all_tickets(mysql, filters=None, limit=None, offset=0):
+        cursor = mysql.connection.cursor()
+        
+        query = """
+            SELECT t.*, u.full_name as customer_name, c.category_name,
+                   a.full_name as assigned_agent_name
+            FROM tickets t
+            JOIN users u ON t.user_id = u.user_id
+            JOIN categories c ON t.category_id = c.category_id
+            LEFT JOIN users a ON t.assigned_to = a.user_id
+            WHERE 1=1
+        """
+        clause, params = Ticket._filter_clause(filters)
+        query += clause
+        
+        query += " ORDER BY t.created_at DESC, t.ticket_id DESC"
         
         if limit:
-            query += f" LIMIT {limit} OFFSET {offset}"
+            query += f" LIMIT {int(limit)} OFFSET {int(offset)}"
         
         cursor.execute(query, params)
         tickets = cursor.fetchall()
         cursor.close()
         return tickets
     
+    @staticmethod
+    def get_tickets_page(mysql, filters=None, limit=10, after=None, before=None):
+        """Keyset pagination over (created_at, ticket_id), newest first.
+        
+        `after` and `before` are (created_at, ticket_id) keys taken from the
+        last / first row of the neighbouring page. The seek predicate lets
+        MySQL start reading at the key instead of discarding OFFSET rows, so
+        page 1000 costs the same as page 1.
+        
+        Returns (tickets, has_more) where has_more tells whether another page
+        exists in the direction that was requested.
+        """
+        cursor = mysql.connection.cursor()
+        
+        query = """
+            SELECT t.*, u.full_name as customer_name, c.category_name,
+                   a.full_name as assigned_agent_name
+            FROM tickets t
+            JOIN users u ON t.user_id = u.user_id
+            JOIN categories c ON t.category_id = c.category_id
+            LEFT JOIN users a ON t.assigned_to = a.user_id
+            WHERE 1=1
+        """
+        clause, params = Ticket._filter_clause(filters)
+        query += clause
+        
+        seek, order, seek_params = Ticket._seek_clause(after, before)
+        query += seek + order
+        params.extend(seek_params)
+        
+        query += f" LIMIT {int(limit) + 1}"
+        
+        cursor.execute(query, params)
+        tickets = list(cursor.fetchall())
+        cursor.close()
+        
+        has_more = len(tickets) > limit
+        tickets = tickets[:limit]
+        if before:
+            tickets.reverse()
+        return tickets, has_more
+    
+    @staticmethod
+    def search(mysql, text, filters=None, limit=20, candidate_limit=1000):
+        """Ranked full-text search over subjects, descriptions and replies.
+        
+        Each FULLTEXT index returns at most `candidate_limit` best matches
+        (InnoDB can stop early on ORDER BY MATCH ... LIMIT); those are merged
+        per ticket, filtered and ranked. Subject/description hits weigh double.
+        """
+        cursor = mysql.connection.cursor()
+        query = """
+            SELECT t.*, u.full_name as customer_name, c.category_name,
+                   a.full_name as assigned_agent_name, m.score
+            FROM (
+                SELECT hits.ticket_id, SUM(hits.score) as score FROM (
+                    (SELECT ticket_id, MATCH(subject, description) AGAINST (%s) * 2 as score
+                     FROM tickets
+                     WHERE MATCH(subject, description) AGAINST (%s)
+                     ORDER BY score DESC LIMIT %s)
+                    UNION ALL
+                    (SELECT ticket_id, MATCH(response_text) AGAINST (%s) as score
+                     FROM ticket_responses
+                     WHERE MATCH(response_text) AGAINST (%s)
+                     ORDER BY score DESC LIMIT %s)
+                ) hits
+                GROUP BY hits.ticket_id
+            ) m
+            JOIN tickets t ON t.ticket_id = m.ticket_id
+            JOIN users u ON t.user_id = u.user_id
+            JOIN categories c ON t.category_id = c.category_id
+            LEFT JOIN users a ON t.assigned_to = a.user_id
+            WHERE 1=1
+        """
+        params = [text, text, int(candidate_limit), text, text, int(candidate_limit)]
+        clause, filter_params = Ticket._filter_clause(filters)
+        query += clause
+        params.extend(filter_params)
+        query += f" ORDER BY m.score DESC, t.ticket_id DESC LIMIT {int(limit)}"
+        
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+        cursor.close()
+        return results
+    
+    @staticmethod
+    def rebuild_search_index(mysql):
+        """Drop and recreate the FULLTEXT indexes, e.g. after changing ft_min_token_size"""
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            ALTER TABLE tickets DROP INDEX ft_ticket_text,
+                ADD FULLTEXT INDEX ft_ticket_text (subject, description)
+        """)
+        cursor.execute("""
+            ALTER TABLE ticket_responses DROP INDEX ft_response_text,
+                ADD FULLTEXT INDEX ft_response_text (response_text)
+        """)
+        cursor.close()
+    
+    EXPORT_COLUMNS = ('ticket_id', 'ticket_number', 'subject', 'description', 'priority', 'status',
+                      'created_at', 'updated_at', 'resolved_at', 'closed_at', 'customer_name',
+                      'customer_email', 'category_name', 'assigned_agent', 'resolution_time_hours')
+    EXPORT_RESPONSE_COLUMNS = ('response_id', 'responder_name', 'response_text', 'is_internal',
+                               'response_created_at')
+    
+    @staticmethod
+    def iter_export(conn, filters=None, include_responses=False):
+        """Stream ticket_details rows over a server-side cursor on a dedicated connection.
+        
+        Rows are yielded as they arrive from MySQL, so memory stays flat no
+        matter how many tickets match. With include_responses each ticket is
+        repeated once per response (LEFT JOIN), ordered by ticket_id.
+        """
+        query = """
+            SELECT t.ticket_id, t.ticket_number, t.subject, t.description, t.priority, t.status,
+                   t.created_at, t.updated_at, t.resolved_at, t.closed_at,
+                   u.full_name AS customer_name, u.email AS customer_email,
+                   c.category_name, a.full_name AS assigned_agent,
+                   TIMESTAMPDIFF(HOUR, t.created_at, COALESCE(t.resolved_at, NOW())) AS resolution_time_hours
+        """
+        if include_responses:
+            query += """,
+                   tr.response_id, ru.full_name AS responder_name, tr.response_text,
+                   tr.is_internal, tr.created_at AS response_created_at
+            """
+        query += """
+            FROM tickets t
+            JOIN users u ON t.user_id = u.user_id
+            JOIN categories c ON t.category_id = c.category_id
+            LEFT JOIN users a ON t.assigned_to = a.user_id
+        """
+        if include_responses:
+            query += """
+            LEFT JOIN ticket_responses tr ON tr.ticket_id = t.ticket_id
+            LEFT JOIN users ru ON tr.user_id = ru.user_id
+            """
+        query += " WHERE 1=1"
+        clause, params = Ticket._filter_clause(filters)
+        query += clause
+        query += " ORDER BY t.ticket_id, tr.response_id" if include_responses else " ORDER BY t.ticket_id"
+        
+        cursor = conn.cursor(MySQLdb.cursors.SSDictCursor)
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            try:
+                cursor.close()
+            except MySQLdb.Error:
+                # Connection already discarded by the caller mid-stream
+                pass
+    
     @staticmethod
     def update_ticket(mysql, ticket_id, updates):
         cursor = mysql.connection.cursor()
@@ -229,6 +623,7 @@ class Ticket:
         values.append(ticket_id)
         
         query = f"UPDATE tickets SET {set_clause} WHERE ticket_id = %s"
+        identity_map('ticket').pop(ticket_id, None)
         
         try:
             cursor.execute(query, values)
@@ -240,19 +635,133 @@ class Ticket:
             cursor.close()
             raise e
     
+    STATUSES = ('open', 'in_progress', 'resolved', 'closed')
+    PRIORITIES = ('low', 'medium', 'high', 'urgent')
+    BULK_COLUMNS = ('status', 'priority', 'assigned_to', 'updated_at', 'resolved_at', 'closed_at')
+    
+    @staticmethod
+    def status_updates(new_status):
+        """Column updates for a status change; shared by the single and bulk paths"""
+        now = datetime.now()
+        updates = {'status': new_status, 'updated_at': now}
+        if new_status == 'resolved':
+            updates['resolved_at'] = now
+        if new_status == 'closed':
+            updates['closed_at'] = now
+        return updates
+    
+    @staticmethod
+    def find_ids(mysql, filters, limit):
+        cursor = mysql.connection.cursor()
+        query = "SELECT t.ticket_id FROM tickets t WHERE 1=1"
+        clause, params = Ticket._filter_clause(filters)
+        query += clause + f" ORDER BY t.ticket_id LIMIT {int(limit)}"
+        cursor.execute(query, params)
+        ids = [row['ticket_id'] for row in cursor.fetchall()]
+        cursor.close()
+        return ids
+    
+    @staticmethod
+    def bulk_update(mysql, ticket_ids, updates, chunk_size=500):
+        """Apply the same updates to many tickets, one transaction per chunk.
+        
+        Returns {ticket_id: 'updated' | 'not_found' | 'error'}. A failing
+        chunk is rolled back on its own; earlier chunks stay committed.
+        """
+        unknown = set(updates) - set(Ticket.BULK_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot bulk update {', '.join(sorted(unknown))}")
+        
+        set_clause = ", ".join([f"{key} = %s" for key in updates.keys()])
+        values = list(updates.values())
+        results = {}
+        tickets = identity_map('ticket')
+        cursor = mysql.connection.cursor()
+        
+        for start in range(0, len(ticket_ids), chunk_size):
+            chunk = ticket_ids[start:start + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            try:
+                cursor.execute(
+                    f"SELECT ticket_id FROM tickets WHERE ticket_id IN ({placeholders}) FOR UPDATE",
+                    chunk
+                )
+                found = [row['ticket_id'] for row in cursor.fetchall()]
+                if found:
+                    cursor.execute(
+                        f"UPDATE tickets SET {set_clause} WHERE ticket_id IN ({', '.join(['%s'] * len(found))})",
+                        values + found
+                    )
+                mysql.connection.commit()
+                found = set(found)
+                for ticket_id in chunk:
+                    results[ticket_id] = 'updated' if ticket_id in found else 'not_found'
+                    tickets.pop(ticket_id, None)
+            except Exception:
+                mysql.connection.rollback()
+                for ticket_id in chunk:
+                    results[ticket_id] = 'error'
+        
+        cursor.close()
+        return results
+    
+    SLA_COLUMNS = """ticket_id, status, first_response_due, resolution_due, first_responded_at,
+                     response_breached, resolution_breached"""
+    
+    @staticmethod
+    def get_sla_state(mysql, ticket_ids=None):
+        """SLA columns of every open ticket, or of just `ticket_ids` whatever their status"""
+        cursor = mysql.connection.cursor()
+        if ticket_ids is None:
+            cursor.execute(f"SELECT {Ticket.SLA_COLUMNS} FROM tickets WHERE status IN ('open', 'in_progress')")
+            rows = list(cursor.fetchall())
+        else:
+            rows = []
+            for start in range(0, len(ticket_ids), 500):
+                chunk = ticket_ids[start:start + 500]
+                cursor.execute(
+                    f"SELECT {Ticket.SLA_COLUMNS} FROM tickets WHERE ticket_id IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk
+                )
+                rows.extend(cursor.fetchall())
+        cursor.close()
+        return rows
+    
+    @staticmethod
+    def mark_breached(mysql, ticket_id, kind):
+        """Flag a missed deadline. Returns False if the ticket was already answered,
+        resolved or flagged, e.g. by another worker's scheduler."""
+        if kind == 'first_response':
+            query = """
+                UPDATE tickets SET response_breached = TRUE, updated_at = NOW()
+                WHERE ticket_id = %s AND response_breached = FALSE AND first_responded_at IS NULL
+                  AND status IN ('open', 'in_progress')
+            """
+        else:
+            query = """
+                UPDATE tickets SET resolution_breached = TRUE, updated_at = NOW()
+                WHERE ticket_id = %s AND resolution_breached = FALSE
+                  AND status IN ('open', 'in_progress')
+            """
+        cursor = mysql.connection.cursor()
+        try:
+            cursor.execute(query, (ticket_id,))
+            changed = cursor.rowcount == 1
+            mysql.connection.commit()
+            cursor.close()
+        except Exception as e:
+            mysql.connection.rollback()
+            cursor.close()
+            raise e
+        identity_map('ticket').pop(ticket_id, None)
+        return changed
+    
     @staticmethod
     def get_ticket_count(mysql, filters=None):
         cursor = mysql.connection.cursor()
         query = "SELECT COUNT(*) as count FROM tickets WHERE 1=1"
-        params = []
-        
-        if filters:
-            if filters.get('status'):
-                query += " AND status = %s"
-                params.append(filters['status'])
-            if filters.get('user_id'):
-                query += " AND user_id = %s"
-                params.append(filters['user_id'])
+        clause, params = Ticket._filter_clause(filters, alias='')
+        query += clause
         
         cursor.execute(query, params)
         result = cursor.fetchone()
@@ -260,11 +769,301 @@ class Ticket:
         return result['count']
 
 
+class TicketCounter:
+    """Materialized ticket counts maintained by the triggers on `tickets`"""
+    
+    STATUSES = ('open', 'in_progress', 'resolved', 'closed')
+    
+    @staticmethod
+    def get_overview(mysql):
+        """Global stats and open-ticket priority mix from one read of ticket_counters"""
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT status, priority, SUM(ticket_count) as count
+            FROM ticket_counters
+            GROUP BY status, priority
+        """)
+        rows = cursor.fetchall()
+        cursor.close()
+        
+        by_status = dict.fromkeys(TicketCounter.STATUSES, 0)
+        by_priority = {}
+        for row in rows:
+            count = int(row['count'])
+            by_status[row['status']] += count
+            if row['status'] in ('open', 'in_progress') and count:
+                by_priority[row['priority']] = by_priority.get(row['priority'], 0) + count
+        
+        stats = {
+            'total': sum(by_status.values()),
+            'open_count': by_status['open'],
+            'in_progress_count': by_status['in_progress'],
+            'resolved_count': by_status['resolved']
+        }
+        priority_stats = [{'priority': p, 'count': c} for p, c in by_priority.items()]
+        return stats, priority_stats
+    
+    @staticmethod
+    def get_user_overview(mysql, user_id):
+        cursor = mysql.connection.cursor()
+        cursor.execute(
+            "SELECT status, ticket_count FROM user_ticket_counters WHERE user_id = %s",
+            (user_id,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        
+        by_status = dict.fromkeys(TicketCounter.STATUSES, 0)
+        for row in rows:
+            by_status[row['status']] += row['ticket_count']
+        
+        return {
+            'total': sum(by_status.values()),
+            'open_count': by_status['open'],
+            'in_progress_count': by_status['in_progress'],
+            'resolved_count': by_status['resolved']
+        }
+    
+    @staticmethod
+    def reconcile(mysql, dry_run=False):
+        """Rebuild both counter tables from `tickets` and report the drift found.
+        
+        Returns a list of (table, key, expected, actual) tuples for every
+        bucket whose stored count was wrong. Unless dry_run is set, the
+        tables are replaced inside a single transaction.
+        """
+        cursor = mysql.connection.cursor()
+        drift = []
+        
+        try:
+            cursor.execute("""
+                SELECT status, priority, category_id, IFNULL(assigned_to, 0) as assignee_id,
+                       COUNT(*) as count
+                FROM tickets
+                GROUP BY status, priority, category_id, IFNULL(assigned_to, 0)
+            """)
+            expected = {(r['status'], r['priority'], r['category_id'], r['assignee_id']): r['count']
+                        for r in cursor.fetchall()}
+            cursor.execute("SELECT status, priority, category_id, assignee_id, ticket_count FROM ticket_counters")
+            actual = {(r['status'], r['priority'], r['category_id'], r['assignee_id']): r['ticket_count']
+                      for r in cursor.fetchall()}
+            drift.extend(TicketCounter._diff('ticket_counters', expected, actual))
+            
+            cursor.execute("SELECT user_id, status, COUNT(*) as count FROM tickets GROUP BY user_id, status")
+            expected = {(r['user_id'], r['status']): r['count'] for r in cursor.fetchall()}
+            cursor.execute("SELECT user_id, status, ticket_count FROM user_ticket_counters")
+            actual = {(r['user_id'], r['status']): r['ticket_count'] for r in cursor.fetchall()}
+            drift.extend(TicketCounter._diff('user_ticket_counters', expected, actual))
+            
+            if not dry_run:
+                cursor.execute("DELETE FROM ticket_counters")
+                cursor.execute("""
+                    INSERT INTO ticket_counters (status, priority, category_id, assignee_id, ticket_count)
+                    SELECT status, priority, category_id, IFNULL(assigned_to, 0), COUNT(*)
+                    FROM tickets
+                    GROUP BY status, priority, category_id, IFNULL(assigned_to, 0)
+                """)
+                cursor.execute("DELETE FROM user_ticket_counters")
+                cursor.execute("""
+                    INSERT INTO user_ticket_counters (user_id, status, ticket_count)
+                    SELECT user_id, status, COUNT(*) FROM tickets GROUP BY user_id, status
+                """)
+                mysql.connection.commit()
+            cursor.close()
+            return drift
+        except Exception as e:
+            mysql.connection.rollback()
+            cursor.close()
+            raise e
+    
+    @staticmethod
+    def _diff(table, expected, actual):
+        drift = []
+        for key in set(expected) | set(actual):
+            if expected.get(key, 0) != actual.get(key, 0):
+                drift.append((table, key, expected.get(key, 0), actual.get(key, 0)))
+        return sorted(drift, key=lambda d: str(d[1]))
+
+
+class AnalyticsRollup:
+    """Daily rollups behind admin.analytics.
+    
+    Rows are keyed by the day a ticket was created. refresh() recomputes
+    only the days that own a ticket touched since the last run (found via
+    idx_updated_at), so each run costs O(changed days), not O(tickets).
+    """
+    
+    # Re-scan a little before the last watermark so rows committed late are not missed
+    OVERLAP_MINUTES = 5
+    
+    @staticmethod
+    def refresh(mysql, full=False):
+        """Bring the rollup tables up to date. Returns the number of days rebuilt."""
+        cursor = mysql.connection.cursor()
+        
+        try:
+            cursor.execute("SELECT GET_LOCK('analytics_rollup', 0) as got_lock")
+            if not cursor.fetchone()['got_lock']:
+                # Another worker is already refreshing
+                cursor.close()
+                return 0
+            
+            cursor.execute("SELECT NOW() as now")
+            started_at = cursor.fetchone()['now']
+            
+            cursor.execute("SELECT refreshed_through FROM rollup_state WHERE rollup_name = 'analytics'")
+            state = cursor.fetchone()
+            
+            if full or not state:
+                cursor.execute("SELECT DISTINCT DATE(created_at) as day FROM tickets")
+            else:
+                cursor.execute("""
+                    SELECT DISTINCT DATE(created_at) as day FROM tickets
+                    WHERE updated_at >= %s - INTERVAL %s MINUTE
+                """, (state['refreshed_through'], AnalyticsRollup.OVERLAP_MINUTES))
+            days = [row['day'] for row in cursor.fetchall()]
+            
+            if full:
+                cursor.execute("DELETE FROM ticket_daily_rollups")
+                cursor.execute("DELETE FROM agent_daily_rollups")
+            
+            for day in days:
+                AnalyticsRollup._rebuild_day(cursor, day)
+                mysql.connection.commit()
+            
+            cursor.execute("""
+                INSERT INTO rollup_state (rollup_name, refreshed_through) VALUES ('analytics', %s)
+                ON DUPLICATE KEY UPDATE refreshed_through = VALUES(refreshed_through)
+            """, (started_at,))
+            mysql.connection.commit()
+            
+            cursor.execute("SELECT RELEASE_LOCK('analytics_rollup')")
+            cursor.close()
+            return len(days)
+        except Exception as e:
+            mysql.connection.rollback()
+            cursor.execute("SELECT RELEASE_LOCK('analytics_rollup')")
+            cursor.close()
+            raise e
+    
+    @staticmethod
+    def _rebuild_day(cursor, day):
+        # Range predicates on created_at so idx_created_at is used
+        cursor.execute("DELETE FROM ticket_daily_rollups WHERE stat_date = %s", (day,))
+        cursor.execute("""
+            INSERT INTO ticket_daily_rollups
+                (stat_date, category_id, priority, status, ticket_count,
+                 resolution_hours_sum, resolution_count)
+            SELECT %s, category_id, priority, status, COUNT(*),
+                   IFNULL(SUM(TIMESTAMPDIFF(HOUR, created_at, resolved_at)), 0),
+                   COUNT(resolved_at)
+            FROM tickets
+            WHERE created_at >= %s AND created_at < %s + INTERVAL 1 DAY
+            GROUP BY category_id, priority, status
+        """, (day, day, day))
+        
+        cursor.execute("DELETE FROM agent_daily_rollups WHERE stat_date = %s", (day,))
+        cursor.execute("""
+            INSERT INTO agent_daily_rollups
+                (stat_date, agent_id, assigned_count, resolved_count, closed_count,
+                 resolution_hours_sum, resolution_count)
+            SELECT %s, assigned_to, COUNT(*),
+                   SUM(CASE WHEN status = 'resolved' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN status = 'closed' THEN 1 ELSE 0 END),
+                   IFNULL(SUM(TIMESTAMPDIFF(HOUR, created_at, resolved_at)), 0),
+                   COUNT(resolved_at)
+            FROM tickets
+            WHERE created_at >= %s AND created_at < %s + INTERVAL 1 DAY
+              AND assigned_to IS NOT NULL
+            GROUP BY assigned_to
+        """, (day, day, day))
+    
+    # The analytics report as independent queries, each taking the window length
+    # in days, so they can run one after another or all at once (get_report_async)
+    REPORT_QUERIES = {
+        # Rollup rows only change when refresh() moves this watermark
+        'window': """
+            SELECT CURDATE() - INTERVAL %s DAY as since,
+                   (SELECT refreshed_through FROM rollup_state WHERE rollup_name = 'analytics') as refreshed_through
+        """,
+        'status_distribution': """
+            SELECT status, SUM(ticket_count) as count FROM ticket_daily_rollups
+            WHERE stat_date >= CURDATE() - INTERVAL %s DAY
+            GROUP BY status
+        """,
+        'category_stats': """
+            SELECT c.category_name, SUM(r.ticket_count) as count FROM ticket_daily_rollups r
+            JOIN categories c ON r.category_id = c.category_id
+            WHERE r.stat_date >= CURDATE() - INTERVAL %s DAY
+            GROUP BY c.category_id, c.category_name
+            ORDER BY count DESC
+        """,
+        'volume_trend': """
+            SELECT stat_date as date, SUM(ticket_count) as count FROM ticket_daily_rollups
+            WHERE stat_date >= CURDATE() - INTERVAL %s DAY
+            GROUP BY stat_date
+            ORDER BY stat_date ASC
+        """,
+        'resolution_times': """
+            SELECT priority, SUM(resolution_hours_sum) / NULLIF(SUM(resolution_count), 0) as avg_hours,
+                   SUM(ticket_count) as count
+            FROM ticket_daily_rollups
+            WHERE status = 'resolved' AND stat_date >= CURDATE() - INTERVAL %s DAY
+            GROUP BY priority
+        """,
+        'agent_performance': """
+            SELECT u.full_name, IFNULL(SUM(r.assigned_count), 0) as total_assigned,
+                   IFNULL(SUM(r.resolved_count), 0) as resolved,
+                   IFNULL(SUM(r.closed_count), 0) as closed,
+                   SUM(r.resolution_hours_sum) / NULLIF(SUM(r.resolution_count), 0) as avg_resolution_hours
+            FROM users u
+            LEFT JOIN agent_daily_rollups r ON r.agent_id = u.user_id
+                 AND r.stat_date >= CURDATE() - INTERVAL %s DAY
+            WHERE u.role IN ('agent', 'admin')
+            GROUP BY u.user_id, u.full_name
+        """
+    }
+    
+    @staticmethod
+    def get_report(mysql, days):
+        """Everything analytics.html needs for the last `days` days, summed from rollup rows"""
+        return AnalyticsRollup._build_report({
+            name: AnalyticsRollup._report_rows(mysql, name, days) for name in AnalyticsRollup.REPORT_QUERIES
+        })
+    
+    @staticmethod
+    async def get_report_async(mysql, days):
+        """get_report with its queries run concurrently through mysql.gather()"""
+        names = list(AnalyticsRollup.REPORT_QUERIES)
+        rows = await mysql.gather(*(functools.partial(AnalyticsRollup._report_rows, mysql, name, days)
+                                    for name in names))
+        return AnalyticsRollup._build_report(dict(zip(names, rows)))
+    
+    @staticmethod
+    def _report_rows(mysql, name, days):
+        cursor = mysql.connection.cursor()
+        cursor.execute(AnalyticsRollup.REPORT_QUERIES[name], (days,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    
+    @staticmethod
+    def _build_report(results):
+        window = results.pop('window')[0]
+        return {'since': window['since'], 'refreshed_through': window['refreshed_through'], **results}
+
+
 class Category:
     """Category model"""
     
+    cache = ReferenceCache('categories')
+    
     @staticmethod
     def get_all(mysql):
+        return Category.cache.get(mysql, 'all', lambda: Category._load_all(mysql))
+    
+    @staticmethod
+    def _load_all(mysql):
         cursor = mysql.connection.cursor()
         cursor.execute("SELECT * FROM categories ORDER BY category_name")
         categories = cursor.fetchall()
@@ -273,36 +1072,123 @@ class Category:
     
     @staticmethod
     def get_by_id(mysql, category_id):
+        categories = identity_map('category')
+        if category_id in categories:
+            return categories[category_id]
+        
+        category = next((c for c in Category.get_all(mysql)
+                         if str(c['category_id']) == str(category_id)), None)
+        categories[category_id] = category
+        return category
+    
+    @staticmethod
+    def invalidate_cache(mysql=None):
+        """Call after adding, renaming or removing a category"""
+        Category.cache.invalidate(mysql)
+
+
+class SlaPolicy:
+    """SLA targets per priority, optionally overridden per category"""
+    
+    cache = ReferenceCache('sla_policies')
+    
+    @staticmethod
+    def get_all(mysql):
+        return SlaPolicy.cache.get(mysql, 'all', lambda: SlaPolicy._load_all(mysql))
+    
+    @staticmethod
+    def _load_all(mysql):
         cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM categories WHERE category_id = %s", (category_id,))
-        category = cursor.fetchone()
+        cursor.execute("SELECT priority, category_id, first_response_minutes, resolution_minutes FROM sla_policies")
+        policies = {(row['priority'], row['category_id']): row for row in cursor.fetchall()}
         cursor.close()
-        return category
+        return policies
+    
+    @staticmethod
+    def deadlines(mysql, priority, category_id, start=None):
+        """(first_response_due, resolution_due) for a new ticket; (None, None) without a policy"""
+        policies = SlaPolicy.get_all(mysql)
+        policy = policies.get((priority, int(category_id))) or policies.get((priority, None))
+        if policy is None:
+            return None, None
+        start = start or datetime.now().replace(microsecond=0)
+        return (start + timedelta(minutes=policy['first_response_minutes']),
+                start + timedelta(minutes=policy['resolution_minutes']))
+    
+    @staticmethod
+    def invalidate_cache(mysql=None):
+        """Call after editing sla_policies"""
+        SlaPolicy.cache.invalidate(mysql)
 
 
 class TicketResponse:
     """Response model"""
     
+    # Optional batching.GroupCommitter; app.py sets it when REPLY_GROUP_COMMIT_MS > 0
+    group_commit = None
+    
     @staticmethod
-    def add_response(mysql, ticket_id, user_id, response_text, is_internal=False):
-        cursor = mysql.connection.cursor()
-        query = """
-            INSERT INTO ticket_responses (ticket_id, user_id, response_text, is_internal)
-            VALUES (%s, %s, %s, %s)
+    def add_response(mysql, ticket_id, user_id, response_text, is_internal=False, first_response=False):
+        """Store a reply and bump the ticket's updated_at in one transaction.
+        
+        Internal notes leave updated_at alone. `first_response` also records
+        first_responded_at for the SLA if the ticket has none yet.
         """
+        identity_map('ticket').pop(ticket_id, None)
+        row = (ticket_id, user_id, response_text, bool(is_internal), bool(first_response))
+        
+        committer = TicketResponse.group_commit
+        if committer is not None and committer.enabled:
+            return committer.submit(row)
+        return TicketResponse.write_responses(mysql.connection, [row])[0]
+    
+    @staticmethod
+    def write_responses(conn, rows):
+        """Write (ticket_id, user_id, text, is_internal, first_response) rows in one
+        transaction and return their response_ids in order."""
+        touched = sorted({row[0] for row in rows if not row[3]})
+        answered = sorted({row[0] for row in rows if row[4] and not row[3]})
+        cursor = conn.cursor()
         try:
-            cursor.execute(query, (ticket_id, user_id, response_text, is_internal))
-            mysql.connection.commit()
-            response_id = cursor.lastrowid
-            cursor.close()
-            return response_id
-        except Exception as e:
-            mysql.connection.rollback()
+            # Lock the ticket rows before the INSERT's foreign key check takes
+            # shared locks on them, so two replies to one ticket can't deadlock
+            if touched:
+                params = []
+                first_response = ""
+                if answered:
+                    first_response = (", first_responded_at = IF(ticket_id IN ({}), "
+                                      "IFNULL(first_responded_at, NOW()), first_responded_at)"
+                                      ).format(", ".join(["%s"] * len(answered)))
+                    params.extend(answered)
+                params.extend(touched)
+                cursor.execute(
+                    f"UPDATE tickets SET updated_at = NOW(){first_response} "
+                    f"WHERE ticket_id IN ({', '.join(['%s'] * len(touched))})",
+                    params
+                )
+            
+            cursor.execute(
+                "INSERT INTO ticket_responses (ticket_id, user_id, response_text, is_internal) VALUES "
+                + ", ".join(["(%s, %s, %s, %s)"] * len(rows)),
+                [value for row in rows for value in row[:4]]
+            )
+            # A multi-row VALUES insert gets consecutive ids under every innodb_autoinc_lock_mode
+            first_id = cursor.lastrowid
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             cursor.close()
-            raise e
+        return [first_id + i for i in range(len(rows))]
     
     @staticmethod
-    def get_ticket_responses(mysql, ticket_id, include_internal=False):
+    def get_thread_page(mysql, ticket_id, include_internal=False, limit=50, before=None):
+        """The `limit` newest responses older than the `before` (created_at, response_id) key.
+        
+        Returns (responses oldest first, has_more). Reads at most limit + 1
+        rows from idx_ticket_created however long the thread is.
+        """
         cursor = mysql.connection.cursor()
         query = """
             SELECT tr.*, u.full_name as responder_name, u.role as responder_role
@@ -310,12 +1196,68 @@ class TicketResponse:
             JOIN users u ON tr.user_id = u.user_id
             WHERE tr.ticket_id = %s
         """
+        params = [ticket_id]
         if not include_internal:
             query += " AND tr.is_internal = FALSE"
+        if before:
+            query += " AND (tr.created_at < %s OR (tr.created_at = %s AND tr.response_id < %s))"
+            params.extend([before[0], before[0], before[1]])
         
-        query += " ORDER BY tr.created_at ASC"
+        query += " ORDER BY tr.created_at DESC, tr.response_id DESC LIMIT %s"
+        params.append(limit + 1)
+        
+        cursor.execute(query, params)
+        responses = list(cursor.fetchall())
+        cursor.close()
         
+        has_more = len(responses) > limit
+        responses = responses[:limit]
+        responses.reverse()
+        return responses, has_more
+
+
+class TicketAttachment:
+    """Attachment model"""
+    
+    @staticmethod
+    def add_attachment(mysql, ticket_id, file_name, file_path, file_size, content_hash, content_type, uploaded_by):
+        cursor = mysql.connection.cursor()
+        query = """
+            INSERT INTO ticket_attachments
+                (ticket_id, file_name, file_path, file_size, content_hash, content_type, uploaded_by)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        try:
+            cursor.execute(query, (ticket_id, file_name, file_path, file_size, content_hash, content_type,
+                                   uploaded_by))
+            mysql.connection.commit()
+            attachment_id = cursor.lastrowid
+            cursor.close()
+            return attachment_id
+        except Exception as e:
+            mysql.connection.rollback()
+            cursor.close()
+            raise e
+    
+    @staticmethod
+    def get_by_id(mysql, attachment_id):
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT * FROM ticket_attachments WHERE attachment_id = %s", (attachment_id,))
+        attachment = cursor.fetchone()
+        cursor.close()
+        return attachment
+    
+    @staticmethod
+    def get_ticket_attachments(mysql, ticket_id):
+        cursor = mysql.connection.cursor()
+        query = """
+            SELECT ta.*, u.full_name as uploader_name
+            FROM ticket_attachments ta
+            JOIN users u ON ta.uploaded_by = u.user_id
+            WHERE ta.ticket_id = %s
+            ORDER BY ta.uploaded_at ASC
+        """
         cursor.execute(query, (ticket_id,))
-        responses = cursor.fetchall()
+        attachments = cursor.fetchall()
         cursor.close()
-        return responses
+        return attachments
@@ -0,0 +1,284 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from flask import g, request, Response
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SKIP_FILES = {os.path.abspath(__file__), os.path.join(BACKEND_DIR, 'db.py')}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST = re.compile(r'\bIN \(\?(?:, ?\?)*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'(\(\?(?:, ?\?)*\))(?:, ?\(\?(?:, ?\?)*\))+')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalise a statement so every execution of the same query shape groups together"""
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES_LIST.sub(r'\1, ...', sql)
+    return sql
+
+
+def call_site():
+    """'models.py:412 get_by_id < routes/admin.py:88 tickets': the first two app frames above the cursor"""
+    frame = sys._getframe(2)
+    sites = []
+    while frame is not None and len(sites) < 2:
+        filename = frame.f_code.co_filename
+        if filename.startswith(BACKEND_DIR) and filename not in SKIP_FILES:
+            sites.append(f"{os.path.relpath(filename, BACKEND_DIR)}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return ' < '.join(sites) or '?'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le=bound)} {bucket_count}')
+            lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{labels} {total:.6f}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = Counter()
+
+    def inc(self, *label_values, amount=1):
+        self._series[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {value:g}')
+        return lines
+
+
+def _labels(names, values, le=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class ProfiledCursor:
+    """Cursor proxy that times each statement and records it for the current request"""
+
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
+
+    def _timed(self, method, query, args):
+        started = time.perf_counter()
+        try:
+            result = method(query, args)
+        except Exception:
+            self._profiler.record(query, time.perf_counter() - started, 0, error=True)
+            raise
+        self._profiler.record(query, time.perf_counter() - started, self._cursor.rowcount)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class ProfiledConnection:
+    """Connection proxy whose cursors are ProfiledCursors; `raw` goes back to the pool"""
+
+    def __init__(self, raw, profiler):
+        self.raw = raw
+        self._profiler = profiler
+
+    def cursor(self, *args, **kwargs):
+        return ProfiledCursor(self.raw.cursor(*args, **kwargs), self._profiler)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class QueryProfiler:
+    """Per-request SQL profile plus process-wide Prometheus metrics.
+
+    Every statement run through `app.mysql.connection` is fingerprinted,
+    timed and tagged with its call site. At the end of the request the
+    profile becomes a Server-Timing header, slow statements and repeated
+    fingerprints (N+1 patterns) are logged, and route / DB timings feed the
+    histograms served at /metrics. Metrics are per worker process.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.server_timing = True
+        self.slow_query_ms = 200
+        self.n_plus_one_threshold = 10
+        self.mysql = None
+        self._lock = threading.Lock()
+
+        self.request_seconds = Histogram(
+            'http_request_duration_seconds', 'Time to produce a response, by endpoint',
+            ('endpoint', 'method'))
+        self.request_db_seconds = Histogram(
+            'http_request_db_seconds', 'Time spent in SQL per request, by endpoint',
+            ('endpoint',))
+        self.requests = CounterMetric(
+            'http_requests_total', 'Responses by endpoint and status', ('endpoint', 'method', 'status'))
+        self.request_queries = CounterMetric(
+            'db_queries_total', 'SQL statements run, by endpoint', ('endpoint',))
+        self.query_seconds = CounterMetric(
+            'db_query_seconds_total', 'Cumulative SQL time by query fingerprint', ('query',))
+        self.query_calls = CounterMetric(
+            'db_query_calls_total', 'Executions by query fingerprint', ('query',))
+        self.query_errors = CounterMetric(
+            'db_query_errors_total', 'Failed statements by query fingerprint', ('query',))
+        self.slow_queries = CounterMetric(
+            'db_slow_queries_total', 'Statements slower than the slow query threshold', ('query',))
+        self.n_plus_one = CounterMetric(
+            'db_n_plus_one_total', 'Requests that repeated one query shape past the threshold',
+            ('endpoint', 'query'))
+
+    def init_app(self, app, mysql):
+        self.enabled = app.config.get('PROFILING_ENABLED', True)
+        self.server_timing = app.config.get('PROFILING_SERVER_TIMING', True)
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', 200)
+        self.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+        self.mysql = mysql
+        if not self.enabled:
+            return
+
+        mysql.connection_wrapper = lambda conn: ProfiledConnection(conn, self)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def record(self, query, seconds, rows, error=False):
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        shape = fingerprint(query)
+        site = call_site()
+
+        profile = g.get('sql_profile')
+        if profile is not None:
+            profile.append((shape, seconds, rows, site))
+
+        with self._lock:
+            self.query_seconds.inc(shape, amount=seconds)
+            self.query_calls.inc(shape)
+            if error:
+                self.query_errors.inc(shape)
+            if seconds * 1000 >= self.slow_query_ms:
+                self.slow_queries.inc(shape)
+
+        if error:
+            logger.warning("Query failed at %s: %s", site, shape)
+        elif seconds * 1000 >= self.slow_query_ms:
+            logger.warning("Slow query (%.1f ms, %s rows) at %s: %s", seconds * 1000, rows, site, shape)
+
+    def _start(self):
+        g.sql_profile = []
+        g.request_started = time.perf_counter()
+
+    def _finish(self, response):
+        profile = g.pop('sql_profile', None)
+        started = g.pop('request_started', None)
+        if profile is None or started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        db_seconds = sum(entry[1] for entry in profile)
+        endpoint = request.endpoint or 'unmatched'
+
+        repeated = [(shape, count) for shape, count in Counter(entry[0] for entry in profile).items()
+                    if count >= self.n_plus_one_threshold]
+        for shape, count in repeated:
+            site = next(entry[3] for entry in profile if entry[0] == shape)
+            logger.warning("Possible N+1 in %s: %d x %s (first at %s)", endpoint, count, shape, site)
+
+        with self._lock:
+            self.request_seconds.observe(elapsed, endpoint, request.method)
+            self.request_db_seconds.observe(db_seconds, endpoint)
+            self.requests.inc(endpoint, request.method, response.status_code)
+            self.request_queries.inc(endpoint, amount=len(profile))
+            for shape, _ in repeated:
+                self.n_plus_one.inc(endpoint, shape)
+
+        if self.server_timing:
+            response.headers.add('Server-Timing', f'db;dur={db_seconds * 1000:.1f};desc="{len(profile)} queries"')
+            response.headers.add('Server-Timing', f'app;dur={(elapsed - db_seconds) * 1000:.1f}')
+        return response
+
+    def render(self):
+        """Prometheus text exposition of every metric, plus the connection pool gauges"""
+        with self._lock:
+            lines = []
+            for metric in (self.request_seconds, self.request_db_seconds, self.requests, self.request_queries,
+                           self.query_seconds, self.query_calls, self.query_errors, self.slow_queries,
+                           self.n_plus_one):
+                lines.extend(metric.render())
+
+        for key, value in self.mysql.pool.stats().items():
+            if isinstance(value, (int, float)):
+                lines.append(f'# TYPE db_pool_{key} gauge')
+                lines.append(f'db_pool_{key} {value:g}')
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+profiler = QueryProfiler()
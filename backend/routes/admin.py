@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, Response
 from flask_login import login_required, current_user
-from functools import wraps
-from models import Ticket, Category, User, TicketResponse
-from datetime import datetime, timedelta
+from functools import wraps, partial
+from models import Ticket, Category, User, TicketResponse, TicketCounter
+from datetime import datetime
+from utils.helpers import encode_cursor, decode_cursor, LazyView
+from events import broker, stream
+from assignment import assignment_engine
+from sla import sla_scheduler
+from fragments import fragment_cache
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -12,49 +17,21 @@ def agent_required(f):
         if not current_user.is_authenticated or not current_user.is_agent():
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('index'))
-        return f(*args, **kwargs)
+        # ensure_sync lets it wrap async views too
+        return current_app.ensure_sync(f)(*args, **kwargs)
     return decorated_function
 
 @admin_bp.route('/dashboard')
 @login_required
 @agent_required
-def dashboard():
+async def dashboard():
     mysql = current_app.mysql
     
     try:
-        cursor = mysql.connection.cursor()
-        
-        cursor.execute("SELECT COUNT(*) as total FROM tickets")
-        total = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as open_count FROM tickets WHERE status = 'open'")
-        open_count = cursor.fetchone()['open_count']
-        
-        cursor.execute("SELECT COUNT(*) as in_progress_count FROM tickets WHERE status = 'in_progress'")
-        in_progress_count = cursor.fetchone()['in_progress_count']
-        
-        cursor.execute("SELECT COUNT(*) as resolved_count FROM tickets WHERE status = 'resolved'")
-        resolved_count = cursor.fetchone()['resolved_count']
-        
-        cursor.close()
-        
-        stats = {
-            'total': total,
-            'open_count': open_count,
-            'in_progress_count': in_progress_count,
-            'resolved_count': resolved_count
-        }
-        
-        cursor = mysql.connection.cursor()
-        cursor.execute("""
-            SELECT priority, COUNT(*) as count FROM tickets 
-            WHERE status IN ('open', 'in_progress')
-            GROUP BY priority
-        """)
-        priority_stats = cursor.fetchall()
-        cursor.close()
-        
-        recent_tickets = Ticket.get_all_tickets(mysql, limit=5)
+        (stats, priority_stats), recent_tickets = await mysql.gather(
+            partial(TicketCounter.get_overview, mysql),
+            partial(Ticket.get_all_tickets, mysql, limit=5)
+        )
         
         return render_template('dashboard.html', stats=stats, priority_stats=priority_stats, recent_tickets=recent_tickets)
     
@@ -83,13 +60,41 @@ def tickets():
     if assigned:
         filters['assigned_to'] = assigned
     
-    per_page = 10
-    offset = (page - 1) * per_page
+    filter_args = {key: value for key, value in (('status', status), ('priority', priority),
+                                                 ('category', category_id), ('assigned', assigned)) if value}
+    
+    per_page = current_app.config.get('TICKETS_PER_PAGE', 10)
+    max_offset_pages = current_app.config.get('MAX_OFFSET_PAGES', 20)
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before'))
     
     try:
-        total_tickets = Ticket.get_ticket_count(mysql, filters)
-        total_pages = (total_tickets + per_page - 1) // per_page
-        tickets_list = Ticket.get_all_tickets(mysql, filters, limit=per_page, offset=offset)
+        next_cursor = None
+        prev_cursor = None
+        total_pages = None
+        
+        if after or before:
+            # Deep pages: seek on (created_at, ticket_id) instead of OFFSET
+            page = None
+            tickets_list, has_more = Ticket.get_tickets_page(mysql, filters, limit=per_page,
+                                                             after=after, before=before)
+            if tickets_list:
+                first, last = tickets_list[0], tickets_list[-1]
+                if before is None or has_more:
+                    prev_cursor = encode_cursor(first['created_at'], first['ticket_id'])
+                if after is None or has_more:
+                    next_cursor = encode_cursor(last['created_at'], last['ticket_id'])
+        else:
+            # Shallow pages keep the numbered UI; anything past the cap moves to cursors
+            page = max(1, min(page, max_offset_pages))
+            total_tickets = Ticket.get_ticket_count(mysql, filters)
+            total_pages = (total_tickets + per_page - 1) // per_page
+            offset = (page - 1) * per_page
+            tickets_list = Ticket.get_all_tickets(mysql, filters, limit=per_page, offset=offset)
+            if tickets_list and page < total_pages:
+                last = tickets_list[-1]
+                next_cursor = encode_cursor(last['created_at'], last['ticket_id'])
+        
         categories = Category.get_all(mysql)
         agents = User.get_all_agents(mysql)
         
@@ -99,11 +104,78 @@ def tickets():
                              agents=agents,
                              page=page, 
                              total_pages=total_pages,
-                             filters=filters)
+                             max_offset_pages=max_offset_pages,
+                             next_cursor=next_cursor,
+                             prev_cursor=prev_cursor,
+                             filters=filters,
+                             filter_args=filter_args)
     except Exception as e:
         flash('Error loading tickets.', 'danger')
         return redirect(url_for('admin.dashboard'))
 
+def _search_params():
+    query = request.args.get('q', '').strip()
+    filters = {}
+    for arg, key in (('status', 'status'), ('priority', 'priority'), ('assigned', 'assigned_to')):
+        if request.args.get(arg):
+            filters[key] = request.args.get(arg)
+    return query, filters
+
+@admin_bp.route('/search')
+@login_required
+@agent_required
+def search():
+    mysql = current_app.mysql
+    query, filters = _search_params()
+    results = []
+    
+    try:
+        if len(query) >= 3:
+            results = Ticket.search(mysql, query, filters,
+                                    candidate_limit=current_app.config.get('SEARCH_CANDIDATE_LIMIT', 1000))
+        agents = User.get_all_agents(mysql)
+        return render_template('admin/search.html', query=query, results=results,
+                               filters=filters, agents=agents)
+    except Exception as e:
+        flash('Error searching tickets.', 'danger')
+        return redirect(url_for('admin.tickets'))
+
+@admin_bp.route('/search.json')
+@login_required
+@agent_required
+def search_json():
+    query, filters = _search_params()
+    if len(query) < 3:
+        return jsonify({'error': 'Query must be at least 3 characters.'}), 400
+    
+    results = Ticket.search(current_app.mysql, query, filters,
+                            limit=min(request.args.get('limit', 20, type=int), 100),
+                            candidate_limit=current_app.config.get('SEARCH_CANDIDATE_LIMIT', 1000))
+    return jsonify({
+        'query': query,
+        'results': [{
+            'ticket_id': r['ticket_id'],
+            'ticket_number': r['ticket_number'],
+            'subject': r['subject'],
+            'status': r['status'],
+            'priority': r['priority'],
+            'category_name': r['category_name'],
+            'assigned_agent_name': r['assigned_agent_name'],
+            'score': float(r['score']),
+            'url': url_for('tickets.view_ticket', ticket_id=r['ticket_id'])
+        } for r in results]
+    })
+
+@admin_bp.route('/tickets/events')
+@login_required
+@agent_required
+def ticket_events():
+    """Server-Sent Events feed of every ticket change, for the agent queue"""
+    sub = broker.subscribe('queue')
+    return Response(stream(broker, sub, current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @admin_bp.route('/tickets/<int:ticket_id>/status', methods=['POST'])
 @login_required
 @agent_required
@@ -112,13 +184,14 @@ def update_status(ticket_id):
     new_status = request.form.get('status')
     
     try:
-        updates = {'status': new_status, 'updated_at': datetime.now()}
-        if new_status == 'resolved':
-            updates['resolved_at'] = datetime.now()
-        if new_status == 'closed':
-            updates['closed_at'] = datetime.now()
+        ticket = Ticket.get_by_id(mysql, ticket_id)
+        updates = Ticket.status_updates(new_status)
         
         Ticket.update_ticket(mysql, ticket_id, updates)
+        if ticket:
+            assignment_engine.track(ticket, updates)
+            sla_scheduler.track(ticket, updates)
+        broker.publish_ticket(ticket_id, 'status', status=new_status)
         flash('Ticket status updated successfully!', 'success')
     except Exception as e:
         flash('Error updating ticket status.', 'danger')
@@ -133,7 +206,12 @@ def update_priority(ticket_id):
     new_priority = request.form.get('priority')
     
     try:
-        Ticket.update_ticket(mysql, ticket_id, {'priority': new_priority, 'updated_at': datetime.now()})
+        ticket = Ticket.get_by_id(mysql, ticket_id)
+        updates = {'priority': new_priority, 'updated_at': datetime.now()}
+        Ticket.update_ticket(mysql, ticket_id, updates)
+        if ticket:
+            assignment_engine.track(ticket, updates)
+        broker.publish_ticket(ticket_id, 'priority', priority=new_priority)
         flash('Ticket priority updated successfully!', 'success')
     except Exception as e:
         flash('Error updating ticket priority.', 'danger')
@@ -148,13 +226,88 @@ def assign_ticket(ticket_id):
     agent_id = request.form.get('agent_id')
     
     try:
-        Ticket.update_ticket(mysql, ticket_id, {'assigned_to': agent_id, 'updated_at': datetime.now()})
+        ticket = Ticket.get_by_id(mysql, ticket_id)
+        updates = {'assigned_to': agent_id, 'updated_at': datetime.now()}
+        Ticket.update_ticket(mysql, ticket_id, updates)
+        if ticket:
+            assignment_engine.track(ticket, updates)
+        agent = next((a for a in User.get_all_agents(mysql) if str(a['user_id']) == str(agent_id)), None)
+        broker.publish_ticket(ticket_id, 'assignment', assigned_to=agent_id,
+                              assigned_agent_name=agent['full_name'] if agent else None)
         flash('Ticket assigned successfully!', 'success')
     except Exception as e:
         flash('Error assigning ticket.', 'danger')
     
     return redirect(url_for('admin.tickets'))
 
+@admin_bp.route('/tickets/bulk', methods=['POST'])
+@login_required
+@agent_required
+def bulk_update():
+    """Apply one status/priority/assignment change to many tickets.
+    
+    JSON body: {"action": "status"|"priority"|"assign", "value": ...,
+    plus either "ticket_ids": [...] or "filters": {status, priority, category, assigned}}
+    """
+    mysql = current_app.mysql
+    payload = request.get_json(silent=True) or {}
+    action = payload.get('action')
+    value = payload.get('value')
+    max_tickets = current_app.config.get('BULK_MAX_TICKETS', 10000)
+    
+    if action == 'status' and value in Ticket.STATUSES:
+        updates = Ticket.status_updates(value)
+        event = ('status', {'status': value})
+    elif action == 'priority' and value in Ticket.PRIORITIES:
+        updates = {'priority': value, 'updated_at': datetime.now()}
+        event = ('priority', {'priority': value})
+    elif action == 'assign':
+        agent = next((a for a in User.get_all_agents(mysql) if str(a['user_id']) == str(value)), None)
+        if value not in (None, '', 'unassigned') and agent is None:
+            return jsonify({'error': 'Unknown agent.'}), 400
+        updates = {'assigned_to': agent['user_id'] if agent else None, 'updated_at': datetime.now()}
+        event = ('assignment', {'assigned_to': updates['assigned_to'],
+                                'assigned_agent_name': agent['full_name'] if agent else None})
+    else:
+        return jsonify({'error': 'Unsupported action or value.'}), 400
+    
+    if 'ticket_ids' in payload:
+        try:
+            ticket_ids = list(dict.fromkeys(int(i) for i in payload['ticket_ids']))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'ticket_ids must be a list of integers.'}), 400
+    elif isinstance(payload.get('filters'), dict):
+        raw = payload['filters']
+        filters = {key: raw[arg] for arg, key in (('status', 'status'), ('priority', 'priority'),
+                                                  ('category', 'category_id'), ('assigned', 'assigned_to'))
+                   if raw.get(arg)}
+        if not filters:
+            return jsonify({'error': 'Refusing to bulk update every ticket; add a filter.'}), 400
+        ticket_ids = Ticket.find_ids(mysql, filters, max_tickets + 1)
+    else:
+        return jsonify({'error': 'Provide ticket_ids or filters.'}), 400
+    
+    if len(ticket_ids) > max_tickets:
+        return jsonify({'error': f'At most {max_tickets} tickets per request.'}), 400
+    
+    results = Ticket.bulk_update(mysql, ticket_ids, updates,
+                                 chunk_size=current_app.config.get('BULK_CHUNK_SIZE', 500))
+    
+    for ticket_id, result in results.items():
+        if result == 'updated':
+            broker.publish_ticket(ticket_id, event[0], **event[1])
+    
+    # Re-reading the counters is one small query, cheaper than fetching every old row
+    if assignment_engine.enabled and 'updated' in results.values():
+        assignment_engine.refresh(mysql)
+    if action == 'status' and sla_scheduler.enabled:
+        sla_scheduler.reload(mysql, [ticket_id for ticket_id, result in results.items() if result == 'updated'])
+    
+    return jsonify({
+        'updated': sum(1 for r in results.values() if r == 'updated'),
+        'results': [{'ticket_id': ticket_id, 'result': result} for ticket_id, result in results.items()]
+    })
+
 @admin_bp.route('/tickets/<int:ticket_id>/internal-note', methods=['POST'])
 @login_required
 @agent_required
@@ -167,77 +320,52 @@ def add_internal_note(ticket_id):
         return redirect(url_for('tickets.view_ticket', ticket_id=ticket_id))
     
     try:
-        TicketResponse.add_response(mysql, ticket_id, current_user.user_id, note_text, is_internal=True)
+        response_id = TicketResponse.add_response(mysql, ticket_id, current_user.user_id, note_text, is_internal=True)
+        broker.publish_ticket(ticket_id, 'reply', response_id=response_id,
+                              responder_name=current_user.full_name, responder_role=current_user.role,
+                              response_text=note_text, is_internal=True, created_at=datetime.now())
         flash('Internal note added successfully!', 'success')
     except Exception as e:
         flash('Error adding internal note.', 'danger')
     
     return redirect(url_for('tickets.view_ticket', ticket_id=ticket_id))
 
-@admin_bp.route('/analytics')
+@admin_bp.route('/users/<int:user_id>/deactivate', methods=['POST'])
 @login_required
 @agent_required
-def analytics():
-    mysql = current_app.mysql
-    days = request.args.get('days', 30, type=int)
+def deactivate_user(user_id):
+    if not current_user.is_admin():
+        flash('Only administrators can deactivate accounts.', 'danger')
+        return redirect(url_for('admin.dashboard'))
     
     try:
-        cursor = mysql.connection.cursor()
-        
-        cursor.execute("""
-            SELECT status, COUNT(*) as count FROM tickets 
-            WHERE created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            GROUP BY status
-        """, (days,))
-        status_distribution = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT category_name, COUNT(*) as count FROM tickets t
-            JOIN categories c ON t.category_id = c.category_id
-            WHERE t.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            GROUP BY c.category_id, c.category_name
-            ORDER BY count DESC
-        """, (days,))
-        category_stats = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT DATE(created_at) as date, COUNT(*) as count FROM tickets
-            WHERE created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            GROUP BY DATE(created_at)
-            ORDER BY date ASC
-        """, (days,))
-        volume_trend = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT priority, AVG(HOUR(TIMEDIFF(resolved_at, created_at))) as avg_hours, COUNT(*) as count 
-            FROM tickets
-            WHERE status = 'resolved' AND created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            GROUP BY priority
-        """, (days,))
-        resolution_times = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT u.full_name, COUNT(t.ticket_id) as total_assigned,
-                   SUM(CASE WHEN t.status = 'resolved' THEN 1 ELSE 0 END) as resolved,
-                   SUM(CASE WHEN t.status = 'closed' THEN 1 ELSE 0 END) as closed,
-                   AVG(HOUR(TIMEDIFF(t.resolved_at, t.created_at))) as avg_resolution_hours
-            FROM users u
-            LEFT JOIN tickets t ON u.user_id = t.assigned_to
-            WHERE u.role IN ('agent', 'admin')
-            GROUP BY u.user_id, u.full_name
-        """)
-        agent_performance = cursor.fetchall()
-        
-        cursor.close()
-        
-        return render_template('analytics.html', 
-                             status_distribution=status_distribution,
-                             category_stats=category_stats,
-                             volume_trend=volume_trend,
-                             resolution_times=resolution_times,
-                             agent_performance=agent_performance,
-                             days=days)
-    
+        User.deactivate(current_app.mysql, user_id)
+        assignment_engine.remove_agent(user_id)
+        revoked = current_app.revoke_user_sessions(user_id)
+        flash(f'Account deactivated and {revoked} session(s) revoked.', 'success')
     except Exception as e:
-        flash('Error loading analytics.', 'danger')
-        return redirect(url_for('admin.dashboard'))
+        flash('Error deactivating account.', 'danger')
+    
+    return redirect(url_for('admin.dashboard'))
+
+@admin_bp.route('/system-stats')
+@login_required
+@agent_required
+def system_stats():
+    return jsonify({
+        'db_pool': current_app.mysql.pool.stats(),
+        'user_cache': User.cache.stats(),
+        'reference_cache': {
+            'categories': Category.cache.stats(),
+            'agents': User.agents_cache.stats()
+        },
+        'assignment': assignment_engine.stats(),
+        'sla': sla_scheduler.stats(),
+        'fragment_cache': fragment_cache.stats(),
+        'reply_group_commit': TicketResponse.group_commit.stats() if TicketResponse.group_commit else None
+    })
+
+# Reports are opened rarely, so routes/reports.py is only imported by the
+# first request that needs it instead of by every worker at startup
+admin_bp.add_url_rule('/tickets/export', 'export_tickets', LazyView('routes.reports.export_tickets'))
+admin_bp.add_url_rule('/analytics', 'analytics', LazyView('routes.reports.analytics'))
@@ -0,0 +1,183 @@
+from flask import Blueprint, request, current_app, jsonify, Response
+from flask_login import current_user
+from functools import wraps
+from models import Ticket, Category, TicketResponse, TicketCounter
+from utils.helpers import encode_cursor, decode_cursor
+from datetime import datetime
+from decimal import Decimal
+import hashlib
+import json
+
+api_bp = Blueprint('api', __name__)
+
+TICKET_FIELDS = (
+    'ticket_id', 'ticket_number', 'subject', 'description', 'status', 'priority',
+    'category_id', 'category_name', 'user_id', 'customer_name', 'assigned_to', 'assigned_agent_name',
+    'created_at', 'updated_at', 'resolved_at', 'closed_at',
+    'first_response_due', 'resolution_due', 'response_breached', 'resolution_breached'
+)
+AGENT_ONLY_FIELDS = {'first_response_due', 'resolution_due', 'response_breached', 'resolution_breached'}
+CATEGORY_FIELDS = ('category_id', 'category_name', 'description')
+RESPONSE_FIELDS = ('response_id', 'responder_name', 'responder_role', 'response_text', 'is_internal', 'created_at')
+
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Authentication required.'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def _fields(allowed):
+    """Fields picked with ?fields=a,b,c, limited to `allowed`; all of them by default"""
+    if not current_user.is_agent():
+        allowed = tuple(f for f in allowed if f not in AGENT_ONLY_FIELDS)
+    requested = request.args.get('fields')
+    if not requested:
+        return allowed
+    return tuple(f for f in allowed if f in set(requested.split(',')))
+
+def _pick(row, fields):
+    item = {}
+    for field in fields:
+        if field in row:
+            value = row[field]
+            item[field] = bool(value) if field.endswith('breached') or field == 'is_internal' else value
+    return item
+
+def _etag(*parts):
+    # Representations vary with the query string (fields, filters), so it is part of the tag
+    raw = repr((parts, request.query_string, current_user.is_agent()))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _not_modified(etag):
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return None
+
+def _json(payload, etag):
+    """Compact JSON carrying a weak ETag; clients revalidate every time with If-None-Match"""
+    response = Response(json.dumps(payload, default=_json_default, separators=(',', ':')),
+                        mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def _can_see(ticket):
+    return ticket and (current_user.is_agent() or ticket['user_id'] == current_user.user_id)
+
+@api_bp.route('/tickets')
+@api_login_required
+def list_tickets():
+    """Agents page the whole queue, customers their own tickets; newest first, keyset paged"""
+    mysql = current_app.mysql
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    after = decode_cursor(request.args.get('cursor'))
+
+    filters = {}
+    for arg, key in (('status', 'status'), ('priority', 'priority'), ('category', 'category_id')):
+        if request.args.get(arg):
+            filters[key] = request.args[arg]
+
+    if current_user.is_agent():
+        if request.args.get('assigned'):
+            filters['assigned_to'] = request.args['assigned']
+        tickets, has_more = Ticket.get_tickets_page(mysql, filters, limit=limit, after=after)
+    else:
+        tickets = Ticket.get_user_tickets(mysql, current_user.user_id, filters, limit=limit + 1, after=after)
+        has_more = len(tickets) > limit
+        tickets = tickets[:limit]
+
+    etag = _etag([(t['ticket_id'], t['updated_at'], t['status'], t['priority'], t['assigned_to'])
+                  for t in tickets])
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    fields = _fields(TICKET_FIELDS)
+    next_cursor = encode_cursor(tickets[-1]['created_at'], tickets[-1]['ticket_id']) if has_more else None
+    return _json({'tickets': [_pick(t, fields) for t in tickets], 'next_cursor': next_cursor}, etag)
+
+@api_bp.route('/tickets/<int:ticket_id>')
+@api_login_required
+def get_ticket(ticket_id):
+    """One ticket. Revalidation costs a single primary-key lookup when nothing changed."""
+    mysql = current_app.mysql
+    version = Ticket.get_version(mysql, ticket_id)
+    if not _can_see(version):
+        return jsonify({'error': 'Ticket not found.'}), 404
+
+    etag = _etag(*version.values())
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    ticket = Ticket.get_by_id(mysql, ticket_id)
+    return _json(_pick(ticket, _fields(TICKET_FIELDS)), etag)
+
+@api_bp.route('/tickets/<int:ticket_id>/responses')
+@api_login_required
+def get_responses(ticket_id):
+    """Newest replies first page; follow `older_cursor` for earlier ones"""
+    mysql = current_app.mysql
+    if not _can_see(Ticket.get_version(mysql, ticket_id)):
+        return jsonify({'error': 'Ticket not found.'}), 404
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    responses, has_older = TicketResponse.get_thread_page(
+        mysql, ticket_id, include_internal=current_user.is_agent(), limit=limit,
+        before=decode_cursor(request.args.get('before'))
+    )
+
+    etag = _etag([r['response_id'] for r in responses], has_older)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    older_cursor = None
+    if has_older:
+        older_cursor = encode_cursor(responses[0]['created_at'], responses[0]['response_id'])
+    fields = _fields(RESPONSE_FIELDS)
+    return _json({'responses': [_pick(r, fields) for r in responses], 'older_cursor': older_cursor}, etag)
+
+@api_bp.route('/categories')
+@api_login_required
+def list_categories():
+    categories = [_pick(c, CATEGORY_FIELDS) for c in Category.get_all(current_app.mysql)]
+    # Tagged on every field returned, so an edited description is not served as 304
+    etag = _etag(categories)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    return _json({'categories': categories}, etag)
+
+@api_bp.route('/stats')
+@api_login_required
+def stats():
+    """Ticket counts from the counter tables: the whole queue for agents, own tickets otherwise"""
+    mysql = current_app.mysql
+    if current_user.is_agent():
+        counts, priority_counts = TicketCounter.get_overview(mysql)
+        payload = {'counts': counts, 'open_by_priority': priority_counts}
+    else:
+        payload = {'counts': TicketCounter.get_user_overview(mysql, current_user.user_id)}
+
+    etag = _etag(payload)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    return _json(payload, etag)
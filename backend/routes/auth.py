@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from flask_login import login_user, logout_user, current_user, login_required
-from werkzeug.security import check_password_hash
 from models import User
+from security import password_hasher, account_limiter, ip_limiter, HasherBusy
 from flask import current_app
 
 auth_bp = Blueprint('auth', __name__)
@@ -19,12 +19,26 @@ def login():
             flash('Email and password are required.', 'danger')
             return redirect(url_for('auth.login'))
         
+        if not ip_limiter.allow(request.remote_addr) or not account_limiter.allow(email.lower()):
+            flash('Too many login attempts. Please wait a moment and try again.', 'danger')
+            return render_template('login.html'), 429
+        
         user = User.get_by_email(current_app.mysql, email)
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HasherBusy:
+            flash('The server is busy. Please try again in a few seconds.', 'warning')
+            return render_template('login.html'), 503
+        
+        if valid:
+            account_limiter.reset(email.lower())
+            if user.needs_rehash():
+                User.upgrade_password_hash(current_app.mysql, user.user_id, password)
             login_user(user)
             session['user_id'] = user.user_id
             session['user_name'] = user.full_name
+            session['user'] = user.session_profile()
             flash(f'Welcome back, {user.full_name}!', 'success')
             
             if user.is_agent():
@@ -100,7 +114,9 @@ def profile():
             cursor = mysql.connection.cursor()
             
             if new_password:
-                if not current_user.check_password(current_password):
+                # The session-cached user has no password hash
+                stored_user = User.get_by_id(mysql, current_user.user_id)
+                if not stored_user or not stored_user.check_password(current_password):
                     flash('Current password is incorrect.', 'danger')
                     return redirect(url_for('auth.profile'))
                 
@@ -112,7 +128,7 @@ def profile():
                     flash('Passwords do not match.', 'danger')
                     return redirect(url_for('auth.profile'))
                 
-                new_hash = generate_password_hash(new_password)
+                new_hash = password_hasher.hash(new_password)
                 cursor.execute(
                     "UPDATE users SET full_name = %s, phone = %s, password_hash = %s WHERE user_id = %s",
                     (full_name, phone, new_hash, current_user.user_id)
@@ -125,6 +141,10 @@ def profile():
             
             mysql.connection.commit()
             cursor.close()
+            User.invalidate(current_user.user_id)
+            session['user'] = dict(session.get('user') or current_user.session_profile(),
+                                   full_name=full_name, phone=phone)
+            session['user_name'] = full_name
             
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('auth.profile'))
@@ -133,7 +153,7 @@ def profile():
             flash('Error updating profile.', 'danger')
             return redirect(url_for('auth.profile'))
     
-    return render_template('profile.html', user=current_user)
+    return render_template('profile.html', user=User.get_by_id(mysql, current_user.user_id) or current_user)
 
 @auth_bp.route('/logout')
 @login_required
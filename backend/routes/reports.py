@@ -0,0 +1,119 @@
+from flask import render_template, request, redirect, url_for, flash, current_app, Response
+from flask_login import login_required
+from models import Ticket, AnalyticsRollup
+from routes.admin import agent_required
+from datetime import datetime
+from decimal import Decimal
+import csv
+import io
+import json
+
+# Views mounted on admin_bp through LazyView; see the end of routes/admin.py
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+# A spreadsheet runs a cell that starts with one of these as a formula
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _csv_value(value):
+    """_export_value, with user text that a spreadsheet would run as a formula quoted by a leading '"""
+    value = _export_value(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(row[col]) for col in columns])
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_chunks(rows, include_responses):
+    ticket = None
+    lines = []
+    for row in rows:
+        if ticket is None or ticket['ticket_id'] != row['ticket_id']:
+            if ticket is not None:
+                lines.append(json.dumps(ticket, separators=(',', ':')))
+            ticket = {col: _export_value(row[col]) for col in Ticket.EXPORT_COLUMNS}
+            if include_responses:
+                ticket['responses'] = []
+        if include_responses and row['response_id'] is not None:
+            ticket['responses'].append({col: _export_value(row[col]) for col in Ticket.EXPORT_RESPONSE_COLUMNS})
+        if len(lines) >= 500:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if ticket is not None:
+        lines.append(json.dumps(ticket, separators=(',', ':')))
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+@login_required
+@agent_required
+def export_tickets():
+    """Stream every ticket matching the queue filters as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    include_responses = request.args.get('responses') == '1'
+    
+    if export_format not in ('csv', 'ndjson'):
+        flash('Unsupported export format.', 'danger')
+        return redirect(url_for('admin.tickets'))
+    
+    filters = {}
+    for arg, key in (('status', 'status'), ('priority', 'priority'),
+                     ('category', 'category_id'), ('assigned', 'assigned_to')):
+        if request.args.get(arg):
+            filters[key] = request.args.get(arg)
+    
+    # A server-side cursor ties up its connection until the last row is read,
+    # so the export takes its own connection instead of the request one
+    pool = current_app.mysql.pool
+    
+    def generate():
+        conn = pool.acquire()
+        rows = Ticket.iter_export(conn, filters, include_responses)
+        completed = False
+        try:
+            if export_format == 'csv':
+                columns = Ticket.EXPORT_COLUMNS
+                if include_responses:
+                    columns += Ticket.EXPORT_RESPONSE_COLUMNS
+                yield from _csv_chunks(rows, columns)
+            else:
+                yield from _ndjson_chunks(rows, include_responses)
+            completed = True
+        finally:
+            pool.release(conn, discard=not completed)
+            rows.close()
+    
+    filename = f"tickets-{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'X-Accel-Buffering': 'no'})
+
+@login_required
+@agent_required
+async def analytics():
+    mysql = current_app.mysql
+    days = request.args.get('days', 30, type=int)
+    
+    try:
+        report = await AnalyticsRollup.get_report_async(mysql, days)
+        
+        return render_template('analytics.html', days=days, **report)
+    
+    except Exception as e:
+        flash('Error loading analytics.', 'danger')
+        return redirect(url_for('admin.dashboard'))
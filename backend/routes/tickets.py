@@ -1,50 +1,30 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response, abort, \
+    jsonify, send_file
 from flask_login import login_required, current_user
-from models import Ticket, Category, TicketResponse
+from models import Ticket, Category, TicketResponse, TicketCounter, SlaPolicy, TicketAttachment
+from utils.helpers import encode_cursor, decode_cursor, sign_ticket_access, check_ticket_access
+from events import broker, stream
+from assignment import assignment_engine
+from sla import sla_scheduler
+from storage import UploadTooLarge
+from werkzeug.utils import secure_filename
+from urllib.parse import unquote
+from datetime import datetime
+from functools import partial
+import mimetypes
 
 tickets_bp = Blueprint('tickets', __name__)
 
 @tickets_bp.route('/dashboard')
 @login_required
-def user_dashboard():
+async def user_dashboard():
     mysql = current_app.mysql
     
     try:
-        cursor = mysql.connection.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*) as total FROM tickets WHERE user_id = %s
-        """, (current_user.user_id,))
-        total = cursor.fetchone()['total']
-        
-        cursor.execute("""
-            SELECT COUNT(*) as open_count FROM tickets 
-            WHERE user_id = %s AND status = 'open'
-        """, (current_user.user_id,))
-        open_count = cursor.fetchone()['open_count']
-        
-        cursor.execute("""
-            SELECT COUNT(*) as in_progress_count FROM tickets 
-            WHERE user_id = %s AND status = 'in_progress'
-        """, (current_user.user_id,))
-        in_progress_count = cursor.fetchone()['in_progress_count']
-        
-        cursor.execute("""
-            SELECT COUNT(*) as resolved_count FROM tickets 
-            WHERE user_id = %s AND status = 'resolved'
-        """, (current_user.user_id,))
-        resolved_count = cursor.fetchone()['resolved_count']
-        
-        cursor.close()
-        
-        stats = {
-            'total': total,
-            'open_count': open_count,
-            'in_progress_count': in_progress_count,
-            'resolved_count': resolved_count
-        }
-        
-        tickets = Ticket.get_user_tickets(mysql, current_user.user_id, limit=5)
+        stats, tickets = await mysql.gather(
+            partial(TicketCounter.get_user_overview, mysql, current_user.user_id),
+            partial(Ticket.get_user_tickets, mysql, current_user.user_id, limit=5)
+        )
         
         return render_template('dashboard.html', stats=stats, tickets=tickets)
     
@@ -76,13 +56,24 @@ def create_ticket():
             flash('Description must be between 20 and 2000 characters.', 'danger')
             return redirect(url_for('tickets.create_ticket'))
         
+        agent_id = None
         try:
+            agent_id = assignment_engine.route(mysql, int(category_id), priority)
+            first_response_due, resolution_due = SlaPolicy.deadlines(mysql, priority, category_id)
             ticket_id, ticket_number = Ticket.create_ticket(
-                mysql, current_user.user_id, category_id, subject, description, priority
+                mysql, current_user.user_id, category_id, subject, description, priority, assigned_to=agent_id,
+                first_response_due=first_response_due, resolution_due=resolution_due
             )
+            sla_scheduler.track({'ticket_id': ticket_id, 'status': 'open',
+                                 'first_response_due': first_response_due, 'resolution_due': resolution_due})
+            broker.publish(('queue',), {'type': 'created', 'ticket_id': ticket_id,
+                                        'fields': {'ticket_number': ticket_number, 'priority': priority,
+                                                   'assigned_to': agent_id}})
             flash(f'Ticket {ticket_number} created successfully!', 'success')
             return redirect(url_for('tickets.view_ticket', ticket_id=ticket_id))
         except Exception as e:
+            if agent_id is not None:
+                assignment_engine.release(agent_id, priority)
             flash('Error creating ticket.', 'danger')
             return redirect(url_for('tickets.create_ticket'))
     
@@ -94,22 +85,44 @@ def ticket_history():
     mysql = current_app.mysql
     status = request.args.get('status', '')
     priority = request.args.get('priority', '')
+    category_id = request.args.get('category', '')
     
     filters = {}
     if status:
         filters['status'] = status
     if priority:
         filters['priority'] = priority
+    if category_id:
+        filters['category_id'] = category_id
     
-    tickets = Ticket.get_user_tickets(mysql, current_user.user_id)
+    filter_args = {key: value for key, value in (('status', status), ('priority', priority),
+                                                 ('category', category_id)) if value}
     
-    if filters:
-        if 'status' in filters:
-            tickets = [t for t in tickets if t['status'] == filters['status']]
-        if 'priority' in filters:
-            tickets = [t for t in tickets if t['priority'] == filters['priority']]
+    per_page = current_app.config.get('TICKETS_PER_PAGE', 10)
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before'))
     
-    return render_template('ticket_history.html', tickets=tickets)
+    # One extra row tells us whether another page exists in that direction
+    tickets = Ticket.get_user_tickets(mysql, current_user.user_id, filters,
+                                      limit=per_page + 1, after=after, before=before)
+    has_more = len(tickets) > per_page
+    if has_more:
+        tickets = tickets[1:] if before else tickets[:per_page]
+    
+    next_cursor = None
+    prev_cursor = None
+    if tickets:
+        first, last = tickets[0], tickets[-1]
+        if (after or before) and (before is None or has_more):
+            prev_cursor = encode_cursor(first['created_at'], first['ticket_id'])
+        if before or has_more:
+            next_cursor = encode_cursor(last['created_at'], last['ticket_id'])
+    
+    categories = Category.get_all(mysql)
+    
+    return render_template('ticket_history.html', tickets=tickets, categories=categories,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor,
+                           filter_args=filter_args)
 
 @tickets_bp.route('/<int:ticket_id>')
 @login_required
@@ -125,9 +138,78 @@ def view_ticket(ticket_id):
         flash('You do not have permission to view this ticket.', 'danger')
         return redirect(url_for('tickets.ticket_history'))
     
-    responses = TicketResponse.get_ticket_responses(mysql, ticket_id, include_internal=current_user.is_agent())
+    responses, has_older = TicketResponse.get_thread_page(
+        mysql, ticket_id, include_internal=current_user.is_agent(),
+        limit=current_app.config.get('THREAD_PAGE_SIZE', 50)
+    )
+    older_url = None
+    if has_older:
+        older_url = url_for('tickets.thread_responses', ticket_id=ticket_id,
+                            before=encode_cursor(responses[0]['created_at'], responses[0]['response_id']))
+    attachments = [_attachment_view(a) for a in TicketAttachment.get_ticket_attachments(mysql, ticket_id)]
+    events_url = url_for('tickets.ticket_events', ticket_id=ticket_id,
+                         access=sign_ticket_access(ticket_id, current_user.user_id))
     
-    return render_template('view_ticket.html', ticket=ticket, responses=responses)
+    return render_template('view_ticket.html', ticket=ticket, responses=responses, older_url=older_url,
+                           attachments=attachments, events_url=events_url)
+
+@tickets_bp.route('/<int:ticket_id>/responses')
+@login_required
+def thread_responses(ticket_id):
+    """JSON page of older replies for the "Load older" button"""
+    mysql = current_app.mysql
+    ticket = Ticket.get_by_id(mysql, ticket_id)
+    
+    if not ticket or (not current_user.is_agent() and ticket['user_id'] != current_user.user_id):
+        abort(404)
+    
+    before = decode_cursor(request.args.get('before'))
+    if request.args.get('before') and before is None:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+    
+    limit = min(max(request.args.get('limit', current_app.config.get('THREAD_PAGE_SIZE', 50), type=int), 1), 200)
+    responses, has_older = TicketResponse.get_thread_page(
+        mysql, ticket_id, include_internal=current_user.is_agent(), limit=limit, before=before
+    )
+    
+    older_url = None
+    if has_older:
+        older_url = url_for('tickets.thread_responses', ticket_id=ticket_id, limit=limit,
+                            before=encode_cursor(responses[0]['created_at'], responses[0]['response_id']))
+    
+    return jsonify({
+        'responses': [{
+            'response_id': r['response_id'],
+            'responder_name': r['responder_name'],
+            'responder_role': r['responder_role'],
+            'response_text': r['response_text'],
+            'is_internal': bool(r['is_internal']),
+            'created_at': r['created_at'].isoformat() if r['created_at'] else None
+        } for r in responses],
+        'older_url': older_url
+    })
+
+@tickets_bp.route('/<int:ticket_id>/events')
+@login_required
+def ticket_events(ticket_id):
+    """Server-Sent Events feed of changes to one ticket.
+
+    Served by the gevent events server, where a blocking MySQL query would
+    stall every stream in the worker. Agents may follow any ticket (their role
+    comes from the session profile); customers need the `access` token that
+    view_ticket signed for them after checking they own the ticket.
+    """
+    if not current_user.is_agent() and \
+            not check_ticket_access(request.args.get('access'), ticket_id, current_user.user_id):
+        abort(404)
+    
+    # Customers never see internal notes, live or rendered
+    visible = None if current_user.is_agent() else \
+        (lambda event: event['type'] != 'sla_breach' and not event['fields'].get('is_internal'))
+    sub = broker.subscribe(f'ticket:{ticket_id}')
+    return Response(stream(broker, sub, current_app.config.get('SSE_HEARTBEAT_SECONDS', 15), visible),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @tickets_bp.route('/<int:ticket_id>/reply', methods=['POST'])
 @login_required
@@ -150,18 +232,135 @@ def add_reply(ticket_id):
         return redirect(url_for('tickets.view_ticket', ticket_id=ticket_id))
     
     try:
-        TicketResponse.add_response(mysql, ticket_id, current_user.user_id, response_text)
-        
-        cursor = mysql.connection.cursor()
-        cursor.execute(
-            "UPDATE tickets SET updated_at = NOW() WHERE ticket_id = %s",
-            (ticket_id,)
-        )
-        mysql.connection.commit()
-        cursor.close()
+        response_id = TicketResponse.add_response(mysql, ticket_id, current_user.user_id, response_text,
+                                                  first_response=current_user.is_agent())
+        if current_user.is_agent():
+            sla_scheduler.cancel(ticket_id, 'first_response')
         
+        broker.publish_ticket(ticket_id, 'reply', response_id=response_id,
+                              responder_name=current_user.full_name, responder_role=current_user.role,
+                              response_text=response_text, is_internal=False, created_at=datetime.now())
         flash('Reply added successfully!', 'success')
     except Exception as e:
         flash('Error adding reply.', 'danger')
     
     return redirect(url_for('tickets.view_ticket', ticket_id=ticket_id))
+
+def _attachment_view(attachment, uploader_name=None):
+    """Template / event payload for one attachment"""
+    store = current_app.attachment_store
+    return {
+        'attachment_id': attachment['attachment_id'],
+        'file_name': attachment['file_name'],
+        'file_size': attachment['file_size'],
+        'uploader_name': uploader_name or attachment.get('uploader_name'),
+        'url': url_for('tickets.download_attachment', attachment_id=attachment['attachment_id']),
+        'thumbnail_url': url_for('tickets.attachment_thumbnail', attachment_id=attachment['attachment_id'])
+                         if store.can_thumbnail(attachment['file_name']) else None
+    }
+
+def _load_attachment(attachment_id):
+    mysql = current_app.mysql
+    attachment = TicketAttachment.get_by_id(mysql, attachment_id)
+    ticket = Ticket.get_by_id(mysql, attachment['ticket_id']) if attachment else None
+    
+    if not ticket or (not current_user.is_agent() and ticket['user_id'] != current_user.user_id):
+        abort(404)
+    return attachment
+
+@tickets_bp.route('/<int:ticket_id>/attachments', methods=['POST'])
+@login_required
+def upload_attachment(ticket_id):
+    """Store one file on a ticket.
+    
+    The page script sends the file as the raw request body (name in an
+    X-File-Name header), which is streamed to disk in chunks and answered
+    with JSON. A plain multipart form post still works without JavaScript.
+    """
+    mysql = current_app.mysql
+    ticket = Ticket.get_by_id(mysql, ticket_id)
+    form_post = request.mimetype == 'multipart/form-data'
+    
+    def fail(message, status=400):
+        if form_post:
+            flash(message, 'danger')
+            return redirect(url_for('tickets.view_ticket', ticket_id=ticket_id))
+        return jsonify({'error': message}), status
+    
+    if not ticket or (not current_user.is_agent() and ticket['user_id'] != current_user.user_id):
+        return fail('You do not have permission to add files to this ticket.', 403)
+    
+    if form_post:
+        upload = request.files.get('file')
+        if upload is None:
+            return fail('Choose a file to upload.')
+        file_name, stream = upload.filename, upload.stream
+    else:
+        file_name, stream = unquote(request.headers.get('X-File-Name', '')), request.stream
+    
+    file_name = secure_filename(file_name)
+    extension = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+    if extension not in current_app.config['ALLOWED_EXTENSIONS']:
+        return fail('That file type is not allowed.')
+    
+    try:
+        content_hash, size, file_path = current_app.attachment_store.save_stream(
+            stream, current_app.config['MAX_CONTENT_LENGTH'])
+    except UploadTooLarge as e:
+        return fail(str(e), 413)
+    
+    if size == 0:
+        return fail('The file is empty.')
+    
+    try:
+        attachment_id = TicketAttachment.add_attachment(
+            mysql, ticket_id, file_name, file_path, size, content_hash,
+            mimetypes.guess_type(file_name)[0] or 'application/octet-stream', current_user.user_id
+        )
+    except Exception as e:
+        return fail('Error saving attachment.', 500)
+    
+    view = _attachment_view({'attachment_id': attachment_id, 'file_name': file_name, 'file_size': size},
+                            uploader_name=current_user.full_name)
+    broker.publish_ticket(ticket_id, 'attachment', **view)
+    
+    if form_post:
+        flash('File uploaded successfully!', 'success')
+        return redirect(url_for('tickets.view_ticket', ticket_id=ticket_id))
+    return jsonify(view), 201
+
+@tickets_bp.route('/attachments/<int:attachment_id>')
+@login_required
+def download_attachment(attachment_id):
+    """Serve a stored file; send_file handles Range, If-None-Match and zero-copy sendfile"""
+    attachment = _load_attachment(attachment_id)
+    store = current_app.attachment_store
+    
+    response = send_file(
+        store.path(attachment['file_path']),
+        mimetype=attachment['content_type'] or 'application/octet-stream',
+        as_attachment=not store.can_thumbnail(attachment['file_name']),
+        download_name=attachment['file_name'],
+        etag=attachment['content_hash'],
+        conditional=True,
+        max_age=86400
+    )
+    response.cache_control.private = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+@tickets_bp.route('/attachments/<int:attachment_id>/thumbnail')
+@login_required
+def attachment_thumbnail(attachment_id):
+    attachment = _load_attachment(attachment_id)
+    path = current_app.attachment_store.thumbnail(
+        attachment['content_hash'], attachment['file_path'], attachment['file_name'],
+        current_app.config['ATTACHMENT_THUMBNAIL_SIZE']
+    )
+    if path is None:
+        abort(404)
+    
+    response = send_file(path, mimetype='image/jpeg', etag=attachment['content_hash'] + '-thumb',
+                         conditional=True, max_age=86400)
+    response.cache_control.private = True
+    return response
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool already has `max_pending` jobs queued"""
+
+
+def _hash_password(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify_password(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+class PasswordHasher:
+    """Runs password hashing in a small process pool.
+
+    Key derivation is deliberately CPU-heavy; doing it in worker processes
+    keeps a burst of logins from holding the GIL that ticket requests in the
+    same worker need. At most `max_pending` jobs may be queued; beyond that
+    callers wait up to `queue_timeout` seconds and then get HasherBusy.
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000', workers=2, max_pending=32, queue_timeout=2.0):
+        self.configure(method, workers, max_pending, queue_timeout)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, method, workers, max_pending, queue_timeout):
+        self.method = method
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def hash(self, password):
+        return self.hash_async(password).result()
+
+    def hash_async(self, password):
+        return self.submit(_hash_password, password, self.method)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self.submit(_verify_password, password_hash, password).result()
+
+    def needs_rehash(self, password_hash):
+        """True when the stored hash was made with a different method or cost"""
+        return bool(password_hash) and password_hash.split('$', 1)[0] != self.method
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusy('Password hashing queue is full')
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _pool(self):
+        # Executors do not survive fork, so each worker process gets its own
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    # Imported here: multiprocessing is slow to load and unused until the first login
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    # Not fork: this process runs pool, SLA and job threads, and a forked
+                    # child could inherit one of their locks held and block on it forever
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver'))
+                    self._pid = os.getpid()
+        return self._executor
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by an arbitrary string (account, IP, ...).
+
+    Each key holds up to `capacity` tokens and regains `refill_rate` tokens
+    per second. Only the `max_keys` most recently used keys are kept.
+    """
+
+    def __init__(self, capacity, refill_rate, max_keys=100000):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+password_hasher = PasswordHasher()
+
+# Defaults: 5 attempts per account then one every 30s; 20 per IP then one every 3s
+account_limiter = TokenBucketLimiter(capacity=5, refill_rate=1 / 30)
+ip_limiter = TokenBucketLimiter(capacity=20, refill_rate=1 / 3)
@@ -0,0 +1,179 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session whose data lives in a SessionStore; the cookie only carries its id"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # Flask-Login's user id when the session was loaded; see save_session
+        self.loaded_user_id = self.get('_user_id')
+
+
+class LRUSessionStore:
+    """In-process session store. Fine for a single worker; use Redis across workers."""
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            expires, data, _ = entry
+            if expires < time.time():
+                self._remove(sid)
+                return None
+            self._data.move_to_end(sid)
+            return dict(data)
+
+    def set(self, sid, data, ttl, user_id=None):
+        with self._lock:
+            self._remove(sid)
+            self._data[sid] = (time.time() + ttl, dict(data), user_id)
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(sid)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, sid):
+        with self._lock:
+            self._remove(sid)
+
+    def revoke_user(self, user_id):
+        """Drop every session belonging to user_id. Returns how many were removed."""
+        with self._lock:
+            sids = self._by_user.pop(user_id, set())
+            for sid in sids:
+                self._data.pop(sid, None)
+            return len(sids)
+
+    def _remove(self, sid):
+        entry = self._data.pop(sid, None)
+        if entry is not None and entry[2] is not None:
+            sids = self._by_user.get(entry[2])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._by_user[entry[2]]
+
+
+class RedisSessionStore:
+    """Session store on any Redis-protocol server, shared by every worker"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, url, prefix='session:'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        raw = self.redis.get(self.prefix + sid)
+        return self.serializer.loads(raw) if raw else None
+
+    def set(self, sid, data, ttl, user_id=None):
+        pipe = self.redis.pipeline()
+        pipe.setex(self.prefix + sid, int(ttl), self.serializer.dumps(dict(data)))
+        if user_id is not None:
+            user_key = f"{self.prefix}user:{user_id}"
+            pipe.sadd(user_key, sid)
+            pipe.expire(user_key, int(ttl))
+        pipe.execute()
+
+    def delete(self, sid):
+        self.redis.delete(self.prefix + sid)
+
+    def revoke_user(self, user_id):
+        user_key = f"{self.prefix}user:{user_id}"
+        sids = [sid.decode() for sid in self.redis.smembers(user_key)]
+        if sids:
+            self.redis.delete(*[self.prefix + sid for sid in sids])
+        self.redis.delete(user_key)
+        return len(sids)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in `store` and puts only a signed session id in the cookie"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='session-id')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.new and session.get('_user_id') != session.loaded_user_id:
+            # Signed in (or switched user) on an existing session: move it to a fresh id,
+            # so an id planted in the browser before login is worthless afterwards
+            self.store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        ttl = app.permanent_session_lifetime.total_seconds()
+        user_id = session.get('_user_id')
+        self.store.set(session.sid, session, ttl, int(user_id) if user_id else None)
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        response.vary.add('Cookie')
+
+
+def create_session_interface(app):
+    backend = app.config.get('SESSION_BACKEND', 'lru')
+    if backend == 'redis':
+        return ServerSideSessionInterface(RedisSessionStore(app.config['SESSION_REDIS_URL']))
+    if backend == 'lru':
+        return ServerSideSessionInterface(LRUSessionStore(app.config.get('SESSION_LRU_SIZE', 50000)))
+    return None
@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+from datetime import datetime
+
+from events import broker
+from models import Ticket
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('open', 'in_progress')
+
+# kind -> (deadline column, columns that mean the timer no longer applies)
+TIMERS = {
+    'first_response': ('first_response_due', ('first_responded_at', 'response_breached')),
+    'resolution': ('resolution_due', ('resolution_breached',)),
+}
+
+
+class SlaScheduler:
+    """Fires SLA breaches at their deadlines from a single timer thread.
+
+    Pending deadlines sit in a heap; the thread sleeps on a Condition until
+    the earliest one is due, and scheduling anything earlier wakes it to
+    re-arm. Cancelling or rescheduling only bumps the ticket's stamp, so
+    superseded heap entries are skipped when they surface.
+
+    Breaches are written with a conditional UPDATE (Ticket.mark_breached),
+    so when several workers hold the same timer only one records it and
+    publishes the event; a stale timer for a ticket that was answered or
+    resolved elsewhere is a no-op. On start the heap is rebuilt from the
+    open tickets in one query.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.app = None
+        self.mysql = None
+        self._heap = []
+        self._stamp = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pid = None
+        self._stop = False
+        self.fired = 0
+        self.breached = 0
+
+    def init_app(self, app, mysql):
+        self.app = app
+        self.mysql = mysql
+
+    def ensure_started(self):
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            # Heap contents inherited across a fork are rebuilt by recover()
+            self._pid = os.getpid()
+            self._stop = False
+            self._heap = []
+            self._stamp = {}
+            thread = threading.Thread(target=self._run, name='sla-scheduler', daemon=True)
+            thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def schedule(self, ticket_id, kind, due):
+        with self._cond:
+            seq = next(self._seq)
+            self._stamp[(ticket_id, kind)] = seq
+            heapq.heappush(self._heap, (due, seq, ticket_id, kind))
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+
+    def cancel(self, ticket_id, kind):
+        with self._cond:
+            self._stamp.pop((ticket_id, kind), None)
+
+    def track(self, ticket, updates=None):
+        """(Re)arm or cancel both timers from a ticket row plus any pending updates"""
+        state = {**ticket, **(updates or {})}
+        active = state.get('status', 'open') in OPEN_STATUSES
+        for kind, (due_column, done_columns) in TIMERS.items():
+            due = state.get(due_column)
+            if active and due and not any(state.get(column) for column in done_columns):
+                self.schedule(state['ticket_id'], kind, due)
+            else:
+                self.cancel(state['ticket_id'], kind)
+
+    def recover(self, mysql):
+        """Rebuild the heap from every open ticket: one query and a heapify"""
+        rows = Ticket.get_sla_state(mysql)
+        heap, stamps = [], {}
+        for row in rows:
+            active = row['status'] in OPEN_STATUSES
+            for kind, (due_column, done_columns) in TIMERS.items():
+                due = row[due_column]
+                if active and due and not any(row[column] for column in done_columns):
+                    seq = next(self._seq)
+                    stamps[(row['ticket_id'], kind)] = seq
+                    heap.append((due, seq, row['ticket_id'], kind))
+        with self._cond:
+            # Keep timers armed by requests that ran while the query did
+            for entry in self._heap:
+                key = (entry[2], entry[3])
+                if key not in stamps and self._stamp.get(key) == entry[1]:
+                    stamps[key] = entry[1]
+                    heap.append(entry)
+            heapq.heapify(heap)
+            self._heap = heap
+            self._stamp = stamps
+            self._cond.notify()
+        return len(heap)
+
+    def reload(self, mysql, ticket_ids):
+        """Re-read and re-arm the timers of specific tickets, e.g. after a bulk update"""
+        for row in Ticket.get_sla_state(mysql, ticket_ids):
+            self.track(row)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._stamp),
+                'heap_entries': len(self._heap),
+                'next_due': self._heap[0][0].isoformat() if self._heap else None,
+                'fired': self.fired,
+                'breached': self.breached
+            }
+
+    def _next_due(self):
+        """Block until a live entry is due; returns it, or None when stopped"""
+        with self._cond:
+            while not self._stop:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, seq, ticket_id, kind = self._heap[0]
+                if self._stamp.get((ticket_id, kind)) != seq:
+                    heapq.heappop(self._heap)
+                    continue
+                wait = (due - datetime.now()).total_seconds()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                del self._stamp[(ticket_id, kind)]
+                return ticket_id, kind
+            return None
+
+    def _run(self):
+        try:
+            with self.app.app_context():
+                logger.info("SLA scheduler recovered %d timers", self.recover(self.mysql))
+        except Exception:
+            logger.exception("SLA timer recovery failed")
+
+        while True:
+            due = self._next_due()
+            if due is None:
+                return
+            try:
+                with self.app.app_context():
+                    self._breach(*due)
+            except Exception:
+                logger.exception("Recording SLA breach for ticket %s failed", due[0])
+
+    def _breach(self, ticket_id, kind):
+        self.fired += 1
+        if Ticket.mark_breached(self.mysql, ticket_id, kind):
+            self.breached += 1
+            broker.publish_ticket(ticket_id, 'sla_breach', kind=kind)
+
+
+sla_scheduler = SlaScheduler()
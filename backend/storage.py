@@ -0,0 +1,97 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails are optional; Pillow is only imported when the first one is rendered
+HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload stream runs past the size limit"""
+
+
+class AttachmentStore:
+    """Content-addressed file store for ticket attachments.
+
+    Blobs live at objects/<aa>/<bb>/<sha256> under `root`, so the same file
+    uploaded twice is stored once. Uploads are copied from the request
+    stream into a temp file in fixed-size chunks while being hashed, then
+    renamed into place; nothing holds a whole upload in memory. Image
+    thumbnails are rendered on first request and kept under thumbs/.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    THUMBNAIL_TYPES = {'png', 'jpg', 'jpeg', 'gif'}
+
+    def __init__(self, root):
+        self.root = root
+
+    def save_stream(self, stream, max_bytes):
+        """Store everything readable from `stream`. Returns (sha256, size, relative path)."""
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f'Attachments are limited to {max_bytes} bytes')
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            content_hash = digest.hexdigest()
+            relpath = os.path.join('objects', content_hash[:2], content_hash[2:4], content_hash)
+            target = self.path(relpath)
+            if os.path.exists(target):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+            return content_hash, size, relpath
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def path(self, relpath):
+        return os.path.join(self.root, relpath)
+
+    def can_thumbnail(self, file_name):
+        extension = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+        return HAS_PILLOW and extension in self.THUMBNAIL_TYPES
+
+    def thumbnail(self, content_hash, relpath, file_name, size=256):
+        """Path of a JPEG thumbnail, rendering it on first use. None if not an image or Pillow is missing."""
+        if not self.can_thumbnail(file_name):
+            return None
+
+        target = os.path.join(self.root, 'thumbs', f'{content_hash}_{size}.jpg')
+        if os.path.exists(target):
+            return target
+
+        from PIL import Image
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.jpg')
+        os.close(fd)
+        try:
+            with Image.open(self.path(relpath)) as image:
+                image.thumbnail((size, size))
+                image.convert('RGB').save(tmp_path, 'JPEG', quality=80)
+            os.replace(tmp_path, target)
+        except Exception:
+            logger.exception("Could not render thumbnail for %s", content_hash)
+            os.unlink(tmp_path)
+            return None
+        return target
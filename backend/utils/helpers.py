@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import BadSignature, Signer
+from werkzeug.utils import import_string
+
+
+def encode_cursor(created_at, ticket_id):
+    """Pack a (created_at, ticket_id) pagination key into an opaque URL-safe token"""
+    payload = json.dumps([created_at.strftime('%Y-%m-%d %H:%M:%S'), int(ticket_id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Reverse of encode_cursor. Returns None for anything malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S'), int(ticket_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _ticket_signer():
+    return Signer(current_app.secret_key, salt='ticket-events')
+
+
+def sign_ticket_access(ticket_id, user_id):
+    """Token proving user_id was shown ticket_id, so its event stream can skip the database"""
+    return _ticket_signer().get_signature(f'{int(ticket_id)}:{int(user_id)}').decode()
+
+
+def check_ticket_access(token, ticket_id, user_id):
+    """True when token came from sign_ticket_access for this ticket and user"""
+    if not token:
+        return False
+    try:
+        return _ticket_signer().verify_signature(f'{int(ticket_id)}:{int(user_id)}', token)
+    except BadSignature:
+        return False
+
+
+class LazyView:
+    """View function imported from `import_name` ('package.module.func') on its first call"""
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+        self._view = None
+
+    def __call__(self, *args, **kwargs):
+        if self._view is None:
+            self._view = import_string(self.import_name)
+        return self._view(*args, **kwargs)
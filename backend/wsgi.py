@@ -0,0 +1,7 @@
+"""WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app (from backend/).
+
+FLASK_CONFIG picks the config class (development, production, testing).
+"""
+from app import create_app
+
+app = create_app()
@@ -0,0 +1,96 @@
+"""Simulate an hour of automatic assignment without a database.
+
+    python benchmarks/assignment_sim.py --agents 500 --tickets 100000
+
+Tickets arrive evenly over the simulated hour with a realistic priority mix,
+each agent is skilled in a few categories (some are generalists), and every
+ticket is resolved after an exponentially distributed handling time, which
+releases its load. Reports routing latency percentiles and how evenly the
+load ended up spread.
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from assignment import AssignmentEngine  # noqa: E402
+
+PRIORITIES = (('low', 0.3), ('medium', 0.45), ('high', 0.2), ('urgent', 0.05))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--agents', type=int, default=500)
+    parser.add_argument('--tickets', type=int, default=100000, help='tickets per simulated hour')
+    parser.add_argument('--categories', type=int, default=7)
+    parser.add_argument('--generalists', type=float, default=0.2, help='share of agents with no skills')
+    parser.add_argument('--handle-minutes', type=float, default=20.0, help='mean time to resolve')
+    parser.add_argument('--max-load', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    agents = list(range(1, args.agents + 1))
+    skills = {}
+    for agent in agents:
+        if rng.random() >= args.generalists:
+            skills[agent] = rng.sample(range(1, args.categories + 1), rng.randint(1, 3))
+
+    engine = AssignmentEngine(max_load=args.max_load)
+    engine.reset(agents, skills)
+
+    names = [name for name, _ in PRIORITIES]
+    weights = [share for _, share in PRIORITIES]
+    interval = 3600.0 / args.tickets
+    resolutions = []
+    latencies = []
+    unassigned = 0
+
+    started = time.perf_counter()
+    for n in range(args.tickets):
+        now = n * interval
+        while resolutions and resolutions[0][0] <= now:
+            _, agent, priority = heapq.heappop(resolutions)
+            engine.track({'assigned_to': agent, 'status': 'open', 'priority': priority}, {'status': 'resolved'})
+
+        priority = rng.choices(names, weights)[0]
+        category = rng.randint(1, args.categories)
+        t0 = time.perf_counter()
+        agent = engine.pick(category, priority)
+        latencies.append(time.perf_counter() - t0)
+
+        if agent is None:
+            unassigned += 1
+            continue
+        done_at = now + rng.expovariate(1 / (args.handle_minutes * 60))
+        heapq.heappush(resolutions, (done_at, agent, priority))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    loads = list(engine._load.values())
+    stats = engine.stats()
+    print(f"agents={args.agents} tickets={args.tickets} categories={args.categories} "
+          f"generalists={sum(1 for a in agents if a not in skills)}")
+    print(f"wall time {elapsed:.2f}s ({args.tickets / elapsed:,.0f} tickets/s simulated, "
+          f"{args.tickets / 3600:,.1f}/s needed)")
+    print("pick latency us: p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f}".format(
+        *(percentile(latencies, p) * 1e6 for p in (50, 95, 99, 100))))
+    print(f"unassigned {unassigned}, heap entries {stats['heap_entries']}")
+    print(f"end load: min={min(loads)} max={max(loads)} mean={statistics.mean(loads):.1f} "
+          f"stdev={statistics.pstdev(loads):.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compare two loadtest.py result files and flag regressions.
+
+    python benchmarks/compare.py results/base.json results/head.json --threshold 10
+
+Prints each operation's latency percentiles and throughput side by side.
+Exits with status 1 when the candidate is slower than the baseline by more
+than --threshold percent on any percentile (and by at least --min-ms, so
+sub-millisecond jitter is ignored), has lower throughput by more than the
+threshold, or fails requests the baseline did not. Operations with fewer
+than --min-samples requests in either run are listed but not judged.
+"""
+import argparse
+import json
+import sys
+
+PERCENTILES = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def change(base, head):
+    return (head - base) / base * 100 if base else 0.0
+
+
+def compare(base, head, threshold, min_ms, min_samples):
+    """Rows for the report plus the list of regressions"""
+    rows, regressions = [], []
+    for name, base_op in base['summary']['operations'].items():
+        head_op = head['summary']['operations'].get(name)
+        if head_op is None or not base_op['requests'] or not head_op['requests']:
+            continue
+        judged = min(base_op['requests'], head_op['requests']) >= min_samples
+
+        for key in PERCENTILES:
+            delta = change(base_op[key], head_op[key])
+            slower = judged and delta > threshold and head_op[key] - base_op[key] >= min_ms
+            rows.append((name, key[:-3], base_op[key], head_op[key], delta, slower))
+            if slower:
+                regressions.append(f"{name} {key[:-3]} {base_op[key]:.1f} -> {head_op[key]:.1f} ms ({delta:+.1f}%)")
+
+        # Logins happen once per user or on the burst schedule, so their rate says nothing about the build
+        if not name.startswith('login'):
+            delta = change(base_op['throughput'], head_op['throughput'])
+            slower = judged and -delta > threshold
+            rows.append((name, 'req/s', base_op['throughput'], head_op['throughput'], delta, slower))
+            if slower:
+                regressions.append(f"{name} throughput {base_op['throughput']:.1f} -> "
+                                   f"{head_op['throughput']:.1f} req/s ({delta:+.1f}%)")
+
+        base_rate = base_op['errors'] / (base_op['requests'] + base_op['errors'])
+        head_rate = head_op['errors'] / (head_op['requests'] + head_op['errors'])
+        if head_rate > base_rate:
+            regressions.append(f"{name} error rate {base_rate:.2%} -> {head_rate:.2%}")
+    return rows, regressions
+
+
+def describe(result):
+    env = result.get('environment', {})
+    commit = (env.get('commit') or '?')[:10] + (' (dirty)' if env.get('dirty') else '')
+    label = f" {result['label']}" if result.get('label') else ''
+    return f"{commit}{label} at {env.get('timestamp', '?')}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed slowdown in percent')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='ignore latency changes smaller than this')
+    parser.add_argument('--min-samples', type=int, default=50, help='skip operations with fewer requests')
+    args = parser.parse_args()
+
+    base, head = load(args.baseline), load(args.candidate)
+    print(f"baseline:  {describe(base)}")
+    print(f"candidate: {describe(head)}")
+
+    ignored = ('label',)
+    differing = sorted(key for key in set(base.get('params', {})) | set(head.get('params', {}))
+                       if key not in ignored and base.get('params', {}).get(key) != head.get('params', {}).get(key))
+    if differing:
+        print(f"warning: runs used different parameters ({', '.join(differing)}); results may not be comparable")
+
+    rows, regressions = compare(base, head, args.threshold, args.min_ms, args.min_samples)
+    print(f"\n{'operation':<16}{'metric':<8}{'baseline':>10}{'candidate':>11}{'change':>9}")
+    for name, metric, before, after, delta, flagged in rows:
+        print(f"{name:<16}{metric:<8}{before:>10.1f}{after:>11.1f}{delta:>+8.1f}%{'  <<' if flagged else ''}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:g}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nno regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Time deep pages of the admin queue with OFFSET and with keyset seeks.
+
+    python benchmarks/seed.py --tickets 5000000 --batch 5000
+    python benchmarks/deep_pages.py --pages 1 10 100 1000 10000 --repeat 20
+
+For each page number, reads the same page of the newest-first queue twice:
+with Ticket.get_all_tickets (LIMIT / OFFSET, what the numbered pages use)
+and with Ticket.get_tickets_page seeking after the last key of the previous
+page (what the cursor links use). OFFSET latency grows with the page
+number; seek latency should stay flat. The effect only shows on a large
+table, so seed at least 5M tickets. --status limits both to one status,
+like the queue's filter.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import create_app  # noqa: E402
+from models import Ticket  # noqa: E402
+
+app = create_app()
+mysql = app.mysql
+
+RECOMMENDED_TICKETS = 5000000
+
+
+def page_key(filters, offset):
+    """(created_at, ticket_id) of the row just before `offset`, i.e. the previous page's cursor"""
+    if offset == 0:
+        return None
+    clause, params = Ticket._filter_clause(filters)
+    cursor = mysql.connection.cursor()
+    cursor.execute(f"""
+        SELECT t.created_at, t.ticket_id FROM tickets t WHERE 1=1 {clause}
+        ORDER BY t.created_at DESC, t.ticket_id DESC LIMIT 1 OFFSET {int(offset) - 1}
+    """, params)
+    row = cursor.fetchone()
+    cursor.close()
+    return (row['created_at'], row['ticket_id']) if row else None
+
+
+def timed(repeat, fn):
+    fn()  # warm the buffer pool for this range
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--per-page', type=int, default=app.config['TICKETS_PER_PAGE'])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--status', help='only page through tickets with this status')
+    args = parser.parse_args()
+    filters = {'status': args.status} if args.status else {}
+
+    with app.app_context():
+        total = Ticket.get_ticket_count(mysql, filters)
+        print(f"{total} tickets{' with status ' + args.status if args.status else ''}, "
+              f"{args.per_page} per page")
+        if total < RECOMMENDED_TICKETS:
+            print(f"warning: fewer than {RECOMMENDED_TICKETS} tickets; OFFSET will look cheaper than it is")
+
+        print(f"\n{'page':>8}{'offset p50':>12}{'max':>9}{'seek p50':>11}{'max':>9}  (ms)")
+        for page in args.pages:
+            offset = (page - 1) * args.per_page
+            if offset >= total:
+                print(f"{page:>8}  past the last page")
+                continue
+            after = page_key(filters, offset)
+            offset_p50, offset_max = timed(args.repeat, lambda: Ticket.get_all_tickets(
+                mysql, filters, limit=args.per_page, offset=offset))
+            seek_p50, seek_max = timed(args.repeat, lambda: Ticket.get_tickets_page(
+                mysql, filters, limit=args.per_page, after=after))
+            print(f"{page:>8}{offset_p50:>12.2f}{offset_max:>9.2f}{seek_p50:>11.2f}{seek_max:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
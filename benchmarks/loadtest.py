@@ -0,0 +1,359 @@
+"""Drive a running instance with concurrent virtual users and report latency percentiles.
+
+    python benchmarks/seed.py --tickets 100000
+    cd backend && python app.py   # or gunicorn, however the build under test is served
+    python benchmarks/loadtest.py --url http://localhost:5000 --users 50 --duration 60 --output results/head.json
+    python benchmarks/compare.py results/base.json results/head.json
+
+Each virtual user keeps its own cookie session, logs in once with an account
+created by seed.py, then loops over a weighted mix of operations with a
+small think time. Customers create and view their own tickets; agents page
+the admin queue, open tickets and load the analytics report. Each agent
+also walks the queue with the "next" cursor links, one page per step and
+deeper over the run (up to --walk-pages before starting again), so seek
+latency at depth shows up as admin.cursor_walk. Agents also run ranked
+searches for one to three words, some with a status filter, reported as
+admin.search; the search target is p95 under 50 ms on 5M seeded tickets.
+Requests made during --warmup are not counted.
+
+Redirects are not followed, so every sample is one request. An operation
+fails when the status is not what the route returns on success (a view
+that flashes an error redirects instead of rendering). Login is throttled
+per IP by LOGIN_IP_RATE_LIMIT; virtual users back off on 429 and those
+responses are reported separately rather than as failures.
+
+With --login-burst N, N fresh sessions log in at once every --burst-every
+seconds during the whole run. Their samples are login_burst, so view_ticket
+shows what password hashing under a login storm does to everyone else.
+Start the server with LOGIN_IP_BURST raised (e.g. 100000), since every
+burst comes from this one address; 503s are logins the hasher shed.
+
+Use the same seed, --seed and arguments for runs that are compared.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+OPERATIONS = ('login', 'login_burst', 'create_ticket', 'view_ticket', 'admin.tickets', 'admin.cursor_walk',
+              'admin.search', 'admin.analytics')
+CUSTOMER_MIX = (('view_ticket', 0.75), ('create_ticket', 0.25))
+AGENT_MIX = (('admin.tickets', 0.35), ('admin.cursor_walk', 0.1), ('admin.search', 0.1), ('view_ticket', 0.35),
+             ('admin.analytics', 0.1))
+STATUSES = ('', '', 'open', 'in_progress', 'resolved', 'closed')
+PRIORITIES = ('low', 'medium', 'high', 'urgent')
+# Words seed.py writes into subjects, descriptions and replies
+SEARCH_WORDS = ('refund', 'delivery', 'payment', 'password', 'invoice', 'damaged', 'missing', 'subscription',
+                'warranty', 'courier', 'coupon', 'wallet', 'tracking', 'replacement', 'billing')
+TICKET_PATH = re.compile(r'/tickets/(\d+)$')
+DASHBOARD_PATH = re.compile(r'/dashboard$')
+NEXT_CURSOR = re.compile(rb'href="[^"]*[?&]after=([\w-]+)')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    """Latency samples per operation, shared by every virtual user"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recording = False
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.started = None
+        self.stopped = None
+
+    def start(self, keep=()):
+        """Start the measured window, dropping earlier samples except for `keep`"""
+        with self.lock:
+            for samples in (self.samples, self.errors, self.throttled):
+                for operation in list(samples):
+                    if operation not in keep:
+                        del samples[operation]
+            self.recording = True
+            self.started = time.perf_counter()
+
+    def stop(self):
+        with self.lock:
+            self.recording = False
+            self.stopped = time.perf_counter()
+
+    def add(self, operation, seconds, ok, throttled=False):
+        with self.lock:
+            if not self.recording:
+                return
+            if throttled:
+                self.throttled[operation] += 1
+            elif ok:
+                self.samples[operation].append(seconds)
+            else:
+                self.errors[operation] += 1
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, args, recorder, role, number, stop_event):
+        super().__init__(daemon=True)
+        self.args = args
+        self.recorder = recorder
+        self.role = role
+        self.email = f'{role}{number}@bench.example.com'
+        self.stop_event = stop_event
+        self.rng = random.Random(f'{args.seed}-{role}-{number}')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+        self.ticket_ids = []
+        self.categories = []
+        self.walk_cursor = None
+        self.walk_depth = 0
+
+    def request(self, path, data=None):
+        """(status, headers, body) of one request; redirects come back as their 3xx status"""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.args.url + path, body, timeout=self.args.timeout) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def timed(self, operation, path, data=None, redirect=None):
+        """One measured request. Succeeds on 200, or on a redirect matching `redirect` when given."""
+        started = time.perf_counter()
+        try:
+            status, headers, body = self.request(path, data)
+        except OSError:
+            self.recorder.add(operation, time.perf_counter() - started, False)
+            return None, None, None
+        elapsed = time.perf_counter() - started
+        if redirect is None:
+            ok = status == 200
+        else:
+            ok = status == 302 and redirect.search(headers.get('Location', '')) is not None
+        self.recorder.add(operation, elapsed, ok, throttled=status == 429)
+        return status, headers, body
+
+    def run(self):
+        while not self.stop_event.is_set():
+            status, _, _ = self.timed('login', '/auth/login',
+                                      {'email': self.email, 'password': self.args.password},
+                                      redirect=DASHBOARD_PATH)
+            if status == 302:
+                break
+            # Throttled or the server is not up yet
+            self.stop_event.wait(self.rng.uniform(1, 3))
+        self.load_tickets()
+
+        mix = AGENT_MIX if self.role == 'agent' else CUSTOMER_MIX
+        operations = [name for name, _ in mix]
+        weights = [share for _, share in mix]
+        while not self.stop_event.is_set():
+            getattr(self, 'do_' + self.rng.choices(operations, weights)[0].replace('admin.', 'admin_'))()
+            if self.args.think_ms:
+                self.stop_event.wait(self.rng.expovariate(1000 / self.args.think_ms))
+
+    def load_tickets(self):
+        """Ticket ids to open: the customer's own, or the newest of the whole queue for agents"""
+        try:
+            status, _, body = self.request('/api/v1/tickets?fields=ticket_id&limit=100')
+            if status == 200:
+                self.ticket_ids = [t['ticket_id'] for t in json.loads(body)['tickets']]
+            status, _, body = self.request('/api/v1/categories?fields=category_id')
+            if status == 200:
+                self.categories = [c['category_id'] for c in json.loads(body)['categories']]
+        except (OSError, ValueError):
+            pass
+
+    def do_view_ticket(self):
+        if not self.ticket_ids:
+            return self.do_create_ticket() if self.role == 'customer' else self.do_admin_tickets()
+        self.timed('view_ticket', f'/tickets/{self.rng.choice(self.ticket_ids)}')
+
+    def do_create_ticket(self):
+        if not self.categories:
+            return
+        words = ('order', 'refund', 'delivery', 'payment', 'account', 'invoice', 'damaged', 'missing')
+        status, headers, _ = self.timed('create_ticket', '/tickets/create', {
+            'category_id': self.rng.choice(self.categories),
+            'subject': 'Load test ' + ' '.join(self.rng.choices(words, k=4)),
+            'description': ' '.join(self.rng.choices(words, k=self.rng.randint(10, 80))),
+            'priority': self.rng.choice(PRIORITIES),
+        }, redirect=TICKET_PATH)
+        match = TICKET_PATH.search(headers.get('Location', '')) if status == 302 else None
+        if match:
+            self.ticket_ids.append(int(match.group(1)))
+
+    def do_admin_tickets(self):
+        params = {'page': self.rng.randint(1, 5)}
+        status = self.rng.choice(STATUSES)
+        if status:
+            params['status'] = status
+        self.timed('admin.tickets', '/admin/tickets?' + urllib.parse.urlencode(params))
+
+    def do_admin_cursor_walk(self):
+        if self.walk_cursor is None or self.walk_depth >= self.args.walk_pages:
+            self.walk_cursor, self.walk_depth = None, 0
+            # The first page only hands out the cursor; it is measured as admin.tickets
+            status, _, body = self.timed('admin.tickets', '/admin/tickets')
+        else:
+            status, _, body = self.timed('admin.cursor_walk', '/admin/tickets?after=' + self.walk_cursor)
+        match = NEXT_CURSOR.search(body) if status == 200 else None
+        self.walk_cursor = match.group(1).decode() if match else None
+        self.walk_depth += 1
+
+    def do_admin_search(self):
+        params = {'q': ' '.join(self.rng.sample(SEARCH_WORDS, self.rng.randint(1, 3)))}
+        status = self.rng.choice(STATUSES)
+        if status:
+            params['status'] = status
+        self.timed('admin.search', '/admin/search?' + urllib.parse.urlencode(params))
+
+    def do_admin_analytics(self):
+        self.timed('admin.analytics', '/admin/analytics?days=' + str(self.rng.choice((7, 30, 90))))
+
+
+class LoginBurster(threading.Thread):
+    """Every --burst-every seconds, --login-burst new sessions sign in at the same moment"""
+
+    def __init__(self, args, recorder, stop_event):
+        super().__init__(daemon=True)
+        self.args = args
+        self.recorder = recorder
+        self.stop_event = stop_event
+
+    def run(self):
+        burst = 0
+        while not self.stop_event.wait(self.args.burst_every):
+            # Rotate through accounts so the per-account limiter never kicks in
+            numbers = [(burst * self.args.login_burst + i) % self.args.burst_accounts + 1
+                       for i in range(self.args.login_burst)]
+            threads = [threading.Thread(target=self.login, args=(number,), daemon=True) for number in numbers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(self.args.timeout)
+            burst += 1
+
+    def login(self, number):
+        user = VirtualUser(self.args, self.recorder, 'customer', number, self.stop_event)
+        user.timed('login_burst', '/auth/login', {'email': user.email, 'password': self.args.password},
+                   redirect=DASHBOARD_PATH)
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(recorder):
+    elapsed = recorder.stopped - recorder.started
+    operations = {}
+    for name in OPERATIONS:
+        samples = sorted(recorder.samples.get(name, ()))
+        result = {'requests': len(samples), 'errors': recorder.errors.get(name, 0),
+                  'throttled': recorder.throttled.get(name, 0), 'throughput': len(samples) / elapsed}
+        if samples:
+            result.update({f'p{pct}_ms': percentile(samples, pct) * 1000 for pct in (50, 90, 95, 99)})
+            result['max_ms'] = samples[-1] * 1000
+            result['mean_ms'] = sum(samples) / len(samples) * 1000
+        operations[name] = result
+    total = sum(op['requests'] for op in operations.values())
+    return {'elapsed_s': elapsed, 'requests': total, 'throughput': total / elapsed,
+            'errors': sum(op['errors'] for op in operations.values()), 'operations': operations}
+
+
+def environment():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+    def git(*args):
+        try:
+            return subprocess.run(('git',) + args, cwd=root, capture_output=True, text=True,
+                                  timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+            'timestamp': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def print_report(summary):
+    print(f"\n{'operation':<16}{'ok':>8}{'err':>6}{'429':>6}{'req/s':>9}"
+          f"{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, op in summary['operations'].items():
+        if not op['requests'] and not op['errors']:
+            continue
+        latencies = ''.join(f"{op.get(key, 0):>9.1f}" for key in ('p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+        print(f"{name:<16}{op['requests']:>8}{op['errors']:>6}{op['throttled']:>6}{op['throughput']:>9.1f}{latencies}")
+    print(f"\n{summary['requests']} requests in {summary['elapsed_s']:.1f}s: "
+          f"{summary['throughput']:.1f} req/s, {summary['errors']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--users', type=int, default=20, help='concurrent virtual users')
+    parser.add_argument('--agent-share', type=float, default=0.2, help='fraction of users that are agents')
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=10, help='unmeasured seconds before that')
+    parser.add_argument('--think-ms', type=float, default=100, help='mean pause between requests per user')
+    parser.add_argument('--walk-pages', type=int, default=2000, help='cursor pages an agent follows before restarting')
+    parser.add_argument('--login-burst', type=int, default=0, help='logins fired together in each burst')
+    parser.add_argument('--burst-every', type=float, default=5, help='seconds between login bursts')
+    parser.add_argument('--burst-accounts', type=int, default=100, help='seeded customers the bursts log in as')
+    parser.add_argument('--password', default='benchpass123')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--label', help='free text stored with the results')
+    parser.add_argument('--output', help='write the results as JSON for compare.py')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    agents = round(args.users * args.agent_share)
+    recorder = Recorder()
+    stop_event = threading.Event()
+    users = ([VirtualUser(args, recorder, 'agent', n, stop_event) for n in range(1, agents + 1)] +
+             [VirtualUser(args, recorder, 'customer', n, stop_event) for n in range(1, args.users - agents + 1)])
+
+    print(f"{len(users)} virtual users ({agents} agents) against {args.url}: "
+          f"{args.warmup:g}s warmup, {args.duration:g}s measured")
+    # Users sign in during the warmup, so those logins are the ones kept
+    recorder.start()
+    for user in users:
+        user.start()
+    if args.login_burst:
+        LoginBurster(args, recorder, stop_event).start()
+    time.sleep(args.warmup)
+    recorder.start(keep=('login',))
+    time.sleep(args.duration)
+    recorder.stop()
+    stop_event.set()
+    for user in users:
+        user.join(args.timeout)
+
+    summary = summarize(recorder)
+    print_report(summary)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'label': args.label,
+                       'params': {key: value for key, value in vars(args).items() if key not in ('password', 'output')},
+                       'summary': summary}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
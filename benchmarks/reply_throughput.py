@@ -0,0 +1,93 @@
+"""Measure reply write throughput with and without group commit.
+
+    python benchmarks/reply_throughput.py --ticket 1 --user 2 --threads 32 --replies 2000 --window-ms 0 2 5
+
+Runs against the database configured in backend/config.py (point MYSQL_DB at
+a scratch copy) and inserts real rows into ticket_responses, which are
+deleted again afterwards unless --keep is given. Each --window-ms value is
+one run; 0 is the plain one-transaction-per-reply path.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import create_app  # noqa: E402
+from models import TicketResponse  # noqa: E402
+
+app = create_app()
+mysql = app.mysql
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(args, window_ms):
+    TicketResponse.group_commit.window_ms = window_ms
+    latencies = []
+    response_ids = []
+    lock = threading.Lock()
+    per_thread = args.replies // args.threads
+
+    def worker(n):
+        local_latencies, local_ids = [], []
+        with app.app_context():
+            for i in range(per_thread):
+                t0 = time.perf_counter()
+                local_ids.append(TicketResponse.add_response(
+                    mysql, args.ticket, args.user, f"benchmark reply {n}-{i} " + "x" * args.size))
+                local_latencies.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local_latencies)
+            response_ids.extend(local_ids)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    stats = TicketResponse.group_commit.stats()
+    print(f"window_ms={window_ms:<3} replies={len(latencies)} {len(latencies) / elapsed:8.1f}/s  "
+          f"latency ms p50={percentile(latencies, 50) * 1000:.2f} p95={percentile(latencies, 95) * 1000:.2f} "
+          f"p99={percentile(latencies, 99) * 1000:.2f} mean={statistics.mean(latencies) * 1000:.2f}  "
+          f"avg batch={stats['avg_batch'] if window_ms else 1}")
+    return response_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ticket', type=int, required=True, help='ticket_id to reply to')
+    parser.add_argument('--user', type=int, required=True, help='user_id of the replier')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--replies', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=200, help='reply length in bytes')
+    parser.add_argument('--window-ms', type=int, nargs='+', default=[0, 2, 5])
+    parser.add_argument('--keep', action='store_true', help='leave the inserted replies in place')
+    args = parser.parse_args()
+
+    app.config['MYSQL_POOL_MAX_OVERFLOW'] = max(app.config['MYSQL_POOL_MAX_OVERFLOW'], args.threads)
+    for window_ms in args.window_ms:
+        response_ids = run(args, window_ms)
+        if not args.keep and response_ids:
+            with app.app_context():
+                cursor = mysql.connection.cursor()
+                for start in range(0, len(response_ids), 1000):
+                    chunk = response_ids[start:start + 1000]
+                    cursor.execute(f"DELETE FROM ticket_responses WHERE response_id IN "
+                                   f"({', '.join(['%s'] * len(chunk))})", chunk)
+                mysql.connection.commit()
+                cursor.close()
+
+
+if __name__ == '__main__':
+    main()
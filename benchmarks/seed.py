@@ -0,0 +1,243 @@
+"""Fill a database created from database/schema.sql with realistic synthetic data.
+
+    python benchmarks/seed.py --tickets 100000
+    python benchmarks/seed.py --tickets 10000000 --batch 5000 --rollups
+
+Generates customers, agents (with a few category skills each), tickets
+spread over --days with an age-dependent status mix, SLA deadlines, and
+conversation threads with internal notes. The same --seed always produces
+the same data, so benchmark runs on different commits see identical
+tables. Uses the MYSQL_* settings from backend/config.py (or the
+environment); point MYSQL_DB at a scratch database.
+
+Every seeded account's password is --password. Customers are
+customer<n>@bench.example.com and agents agent<n>@bench.example.com,
+numbered from 1, which is what loadtest.py logs in with.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import MySQLdb  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from config import config  # noqa: E402
+
+PRIORITIES = (('low', 0.3), ('medium', 0.45), ('high', 0.2), ('urgent', 0.05))
+# Mirrors the default rows in sla_policies: (first response, resolution) minutes
+SLA_MINUTES = {'urgent': (30, 240), 'high': (120, 1440), 'medium': (480, 4320), 'low': (1440, 10080)}
+WORDS = ("order refund delivery payment account password login invoice charge card shipment "
+         "package damaged missing late cancel upgrade plan app crash error screen update address "
+         "warranty replacement product size colour billing subscription email verify otp tracking "
+         "courier return pickup seller coupon discount wallet balance").split()
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + '.'
+
+
+def status_for_age(rng, age_days):
+    """Old tickets are mostly closed, today's mostly open"""
+    if age_days < 1:
+        weights = (0.7, 0.25, 0.04, 0.01)
+    elif age_days < 7:
+        weights = (0.3, 0.3, 0.3, 0.1)
+    elif age_days < 30:
+        weights = (0.08, 0.12, 0.4, 0.4)
+    else:
+        weights = (0.02, 0.03, 0.25, 0.7)
+    return rng.choices(('open', 'in_progress', 'resolved', 'closed'), weights)[0]
+
+
+class Seeder:
+    def __init__(self, conn, args):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = datetime.now().replace(microsecond=0)
+
+    def insert_many(self, table, columns, rows):
+        if not rows:
+            return
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        self.cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ', '.join([placeholders] * len(rows)),
+            [value for row in rows for value in row]
+        )
+
+    def run(self):
+        started = time.monotonic()
+        self.cursor.execute("SET unique_checks = 0, foreign_key_checks = 0")
+
+        self.cursor.execute("SELECT category_id FROM categories ORDER BY category_id")
+        self.categories = [row[0] for row in self.cursor.fetchall()]
+        customers = self.seed_users('customer', self.args.customers)
+        agents = self.seed_users('agent', self.args.agents)
+        self.seed_skills(agents)
+        self.conn.commit()
+        print(f"users: {len(customers)} customers, {len(agents)} agents")
+
+        self.seed_tickets(customers, agents)
+        self.cursor.execute("SET unique_checks = 1, foreign_key_checks = 1")
+        print(f"done in {time.monotonic() - started:.1f}s")
+
+    def seed_users(self, role, count):
+        password_hash = generate_password_hash(self.args.password, method=self.args.hash_method)
+        rows = [(f'{role.title()} {n}', f'{role}{n}@bench.example.com', password_hash, role,
+                 self.now - timedelta(days=self.args.days + 30))
+                for n in range(1, count + 1)]
+        for start in range(0, len(rows), self.args.batch):
+            self.insert_many('users', ('full_name', 'email', 'password_hash', 'role', 'created_at'),
+                             rows[start:start + self.args.batch])
+        self.cursor.execute(
+            "SELECT user_id FROM users WHERE role = %s AND email LIKE %s ORDER BY user_id",
+            (role, f'{role}%@bench.example.com')
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def seed_skills(self, agents):
+        rows = []
+        for agent in agents:
+            # A fifth of agents stay generalists (no skill rows)
+            if self.rng.random() < 0.8:
+                for category in self.rng.sample(self.categories, min(len(self.categories), self.rng.randint(1, 3))):
+                    rows.append((agent, category))
+        self.insert_many('agent_skills', ('agent_id', 'category_id'), rows)
+
+    def seed_tickets(self, customers, agents):
+        args, rng = self.args, self.rng
+        self.cursor.execute("SELECT COALESCE(MAX(ticket_id), 0) FROM tickets")
+        next_ticket_id = self.cursor.fetchone()[0] + 1
+        sequences = {}
+        names = [name for name, _ in PRIORITIES]
+        weights = [share for _, share in PRIORITIES]
+        ticket_columns = ('ticket_id', 'ticket_number', 'user_id', 'category_id', 'subject', 'description',
+                          'priority', 'status', 'assigned_to', 'created_at', 'updated_at', 'resolved_at',
+                          'closed_at', 'first_response_due', 'resolution_due', 'first_responded_at',
+                          'response_breached', 'resolution_breached')
+        response_columns = ('ticket_id', 'user_id', 'response_text', 'is_internal', 'created_at')
+        tickets, responses = [], []
+        window = args.days * 86400
+        started = time.monotonic()
+
+        for n in range(args.tickets):
+            # Ticket volume grows towards the present; ids increase with created_at
+            created_at = self.now - timedelta(seconds=int(window * (1 - (n + rng.random()) / args.tickets) ** 1.5))
+            age_days = (self.now - created_at).total_seconds() / 86400
+            status = status_for_age(rng, age_days)
+            priority = rng.choices(names, weights)[0]
+            customer = rng.choice(customers)
+            agent = rng.choice(agents) if status != 'open' or rng.random() < 0.5 else None
+
+            year = created_at.year
+            if year not in sequences:
+                sequences[year] = self.existing_sequence(year)
+            sequences[year] += 1
+            ticket_number = f'TKT{year}{sequences[year]:06d}'
+
+            response_minutes, resolution_minutes = SLA_MINUTES[priority]
+            first_response_due = created_at + timedelta(minutes=response_minutes)
+            resolution_due = created_at + timedelta(minutes=resolution_minutes)
+
+            # Conversation: alternate customer / agent, a minute to a day apart
+            thread = []
+            at = created_at
+            first_responded_at = None
+            for i in range(min(args.max_responses, int(rng.expovariate(1 / args.responses)))):
+                at = min(self.now, at + timedelta(seconds=rng.randint(60, 86400)))
+                from_agent = agent is not None and i % 2 == 0
+                if from_agent and first_responded_at is None:
+                    first_responded_at = at
+                thread.append((next_ticket_id, agent if from_agent else customer, sentence(rng, 8, 60),
+                               from_agent and rng.random() < 0.1, at))
+
+            resolved_at = closed_at = None
+            if status in ('resolved', 'closed'):
+                resolved_at = min(self.now, at + timedelta(minutes=rng.randint(5, 600)))
+            if status == 'closed':
+                closed_at = min(self.now, resolved_at + timedelta(hours=rng.randint(1, 72)))
+            updated_at = closed_at or resolved_at or at
+
+            tickets.append((
+                next_ticket_id, ticket_number, customer, rng.choice(self.categories),
+                sentence(rng, 3, 10)[:200], sentence(rng, 20, 120)[:2000], priority, status, agent,
+                created_at, updated_at, resolved_at, closed_at, first_response_due, resolution_due,
+                first_responded_at,
+                (first_responded_at or self.now) > first_response_due,
+                (resolved_at or self.now) > resolution_due
+            ))
+            responses.extend(thread)
+            next_ticket_id += 1
+
+            if len(tickets) >= args.batch:
+                self.flush(ticket_columns, tickets, response_columns, responses)
+                tickets, responses = [], []
+                done = n + 1
+                rate = done / (time.monotonic() - started)
+                print(f"tickets: {done}/{args.tickets} ({rate:,.0f}/s)", end='\r', flush=True)
+
+        self.flush(ticket_columns, tickets, response_columns, responses)
+        for year, value in sequences.items():
+            self.cursor.execute("""
+                INSERT INTO ticket_sequences (seq_year, next_value) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE next_value = GREATEST(next_value, VALUES(next_value))
+            """, (year, value + 1))
+        self.conn.commit()
+        print(f"tickets: {args.tickets} inserted" + ' ' * 20)
+
+    def existing_sequence(self, year):
+        self.cursor.execute("SELECT next_value FROM ticket_sequences WHERE seq_year = %s", (year,))
+        row = self.cursor.fetchone()
+        return row[0] - 1 if row else 0
+
+    def flush(self, ticket_columns, tickets, response_columns, responses):
+        self.insert_many('tickets', ticket_columns, tickets)
+        for start in range(0, len(responses), self.args.batch):
+            self.insert_many('ticket_responses', response_columns, responses[start:start + self.args.batch])
+        self.conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=10000)
+    parser.add_argument('--customers', type=int, help='default: tickets / 10, at least 100')
+    parser.add_argument('--agents', type=int, help='default: tickets / 2000, at least 10')
+    parser.add_argument('--responses', type=float, default=4.0, help='mean replies per ticket')
+    parser.add_argument('--max-responses', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365, help='spread tickets over this many days')
+    parser.add_argument('--batch', type=int, default=2000, help='rows per INSERT / commit')
+    parser.add_argument('--password', default='benchpass123')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--config', default=os.environ.get('FLASK_CONFIG', 'development'))
+    parser.add_argument('--rollups', action='store_true', help='rebuild the analytics rollups afterwards')
+    args = parser.parse_args()
+    args.customers = args.customers or max(100, args.tickets // 10)
+    args.agents = args.agents or max(10, args.tickets // 2000)
+
+    cfg = config[args.config]
+    args.hash_method = cfg.PASSWORD_HASH_METHOD
+    conn = MySQLdb.connect(host=cfg.MYSQL_HOST, port=cfg.MYSQL_PORT, user=cfg.MYSQL_USER,
+                           passwd=cfg.MYSQL_PASSWORD, db=cfg.MYSQL_DB, charset='utf8mb4')
+    print(f"seeding {cfg.MYSQL_DB} on {cfg.MYSQL_HOST}: {args.tickets} tickets, seed {args.seed}")
+    try:
+        Seeder(conn, args).run()
+    finally:
+        conn.close()
+
+    if args.rollups:
+        from app import create_app
+        from models import AnalyticsRollup
+        app = create_app(args.config)
+        with app.app_context():
+            AnalyticsRollup.refresh(app.mysql, full=True)
+        print("analytics rollups rebuilt")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Compare requests/sec per CPU core across server modes.
+
+    python benchmarks/seed.py --tickets 100000 --rollups
+    python benchmarks/server_modes.py --workers 2 --users 40 --agent-share 0.5 --duration 60
+
+Starts the app once per mode on --port, drives it with loadtest.py and
+reads the CPU time of the server's whole process tree (master, workers and
+their threads) over the measured window, so a mode that answers faster by
+burning more CPU does not look better than it is:
+
+    sync    gunicorn threads, queries run one after another (MYSQL_FANOUT_ENABLED=false)
+    fanout  gunicorn threads, async views gather independent queries
+    asgi    uvicorn serving asgi.py on a2wsgi threads, async views gather independent queries
+
+Every mode gets the same number of worker processes and of request threads
+per process (GUNICORN_THREADS, which asgi.py also reads). Sessions are kept
+in the cookie, so any worker can serve any virtual user. Of loadtest.py's
+operations, the agents' analytics report is the one served by an async
+view; raise --agent-share to weigh it more.
+Needs gunicorn, uvicorn and a2wsgi installed and Linux (/proc) for the CPU numbers.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(BENCHMARKS, '..', 'backend')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+# The in-process 'lru' session store is per worker: gunicorn refuses it with several
+# workers and under uvicorn users would be logged out whenever another worker answers
+SESSIONS = {'SESSION_BACKEND': 'cookie'}
+
+MODES = {
+    'sync': (['gunicorn', '-c', 'gunicorn.conf.py'], dict(SESSIONS, MYSQL_FANOUT_ENABLED='false')),
+    'fanout': (['gunicorn', '-c', 'gunicorn.conf.py'], dict(SESSIONS, MYSQL_FANOUT_ENABLED='true')),
+    'asgi': (['uvicorn', 'asgi:app', '--no-access-log'], dict(SESSIONS, MYSQL_FANOUT_ENABLED='true')),
+}
+
+
+def process_tree(root):
+    """root and every process descended from it"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces; fields resume after its ')'
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree, frontier = {root}, [root]
+    while frontier:
+        pid = frontier.pop()
+        children = [child for child, parent in parents.items() if parent == pid]
+        tree.update(children)
+        frontier.extend(children)
+    return tree
+
+
+def cpu_seconds(root):
+    total = 0
+    for pid in process_tree(root):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+        except (OSError, IndexError, ValueError):
+            pass
+    return total / CLOCK_TICKS
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + '/', timeout=2):
+                return True
+        except urllib.error.HTTPError:
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_mode(name, args, url):
+    command, extra_env = MODES[name]
+    env = dict(os.environ, **extra_env, GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_BIND=f'127.0.0.1:{args.port}')
+    if command[0] == 'uvicorn':
+        command = command + ['--host', '127.0.0.1', '--port', str(args.port), '--workers', str(args.workers)]
+    # Server output goes to a file: an unread pipe would stall the server once full
+    log = tempfile.TemporaryFile()
+    server = subprocess.Popen(command, cwd=BACKEND, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not wait_until_up(url):
+            server.kill()
+            server.wait()
+            log.seek(0)
+            sys.exit(f"{name}: server did not come up\n{log.read().decode(errors='replace')[-4000:]}")
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            loadtest = subprocess.Popen([
+                sys.executable, os.path.join(BENCHMARKS, 'loadtest.py'), '--url', url,
+                '--users', str(args.users), '--agent-share', str(args.agent_share),
+                '--warmup', str(args.warmup), '--duration', str(args.duration),
+                '--think-ms', str(args.think_ms), '--label', name, '--output', output.name
+            ], stdout=subprocess.DEVNULL)
+            # loadtest.py measures from the end of its warmup to the end of --duration
+            time.sleep(args.warmup)
+            cpu_before = cpu_seconds(server.pid)
+            time.sleep(args.duration)
+            cpu_used = cpu_seconds(server.pid) - cpu_before
+            if loadtest.wait() != 0:
+                sys.exit(f"{name}: loadtest.py failed")
+            with open(output.name) as f:
+                summary = json.load(f)['summary']
+    finally:
+        server.terminate()
+        server.wait(30)
+        log.close()
+
+    return {'mode': name, 'throughput': summary['throughput'], 'errors': summary['errors'],
+            'cores': cpu_used / summary['elapsed_s'],
+            'per_core': summary['requests'] / cpu_used if cpu_used else 0.0,
+            'operations': summary['operations']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['sync', 'fanout', 'asgi'])
+    parser.add_argument('--workers', type=int, default=2, help='server processes in every mode')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--agent-share', type=float, default=0.5)
+    parser.add_argument('--think-ms', type=float, default=50)
+    parser.add_argument('--warmup', type=float, default=10)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--output', help='write every mode\'s results as JSON')
+    args = parser.parse_args()
+    url = f'http://127.0.0.1:{args.port}'
+
+    results = []
+    for name in args.modes:
+        print(f"{name}: {args.workers} worker(s), {args.users} users, {args.duration:g}s ...", flush=True)
+        results.append(run_mode(name, args, url))
+
+    print(f"\n{'mode':<8}{'req/s':>9}{'cores':>8}{'req/s/core':>12}{'errors':>8}"
+          f"{'analytics p50':>15}{'p95':>8}  (ms)")
+    for result in results:
+        analytics = result['operations'].get('admin.analytics', {})
+        print(f"{result['mode']:<8}{result['throughput']:>9.1f}{result['cores']:>8.2f}{result['per_core']:>12.1f}"
+              f"{result['errors']:>8}{analytics.get('p50_ms', 0):>15.1f}{analytics.get('p95_ms', 0):>8.1f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Measure how long a new worker takes to serve its first request.
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --config production --runs 10 --fork
+
+Each run is a fresh interpreter that imports app, calls create_app() and
+sends one request to --path through the test client, timing each phase.
+The first run compiles templates into an empty TEMPLATE_CACHE_DIR (a cold
+deploy); the rest reuse it (a worker replaced on a running host). With
+--fork the parent creates the app once and every run is a forked child
+serving its first request, which is what a worker costs under
+gunicorn --preload. No database is needed for the default path, '/'.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[2])
+created = time.perf_counter()
+status = app.test_client().get(sys.argv[3]).status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created, 'status': status,
+                  'modules': len(sys.modules)}))
+'''
+
+
+def spawn(args, env):
+    """One fresh interpreter; seconds per phase, plus the process start itself"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, BACKEND, args.config, args.path],
+                            env=env, capture_output=True, text=True, cwd=BACKEND)
+    total = time.perf_counter() - started
+    if result.returncode:
+        sys.exit(f"startup failed:\n{result.stderr}")
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    phases['total'] = total
+    return phases
+
+
+def forked(args, runs):
+    """Create the app here once, then time the first request in forked children"""
+    sys.path.insert(0, BACKEND)
+    from app import create_app
+    app = create_app(args.config)
+    samples = []
+    for _ in range(runs):
+        read_fd, write_fd = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            status = app.test_client().get(args.path).status_code
+            os.write(write_fd, json.dumps({'status': status}).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            phases = json.loads(pipe.read() or '{}')
+        os.waitpid(pid, 0)
+        phases['first_request'] = phases['total'] = time.perf_counter() - started
+        samples.append(phases)
+    return samples
+
+
+def report(title, samples):
+    print(f"\n{title} ({len(samples)} run(s), status {samples[0]['status']})")
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        values = [sample[phase] * 1000 for sample in samples if phase in sample]
+        if values:
+            print(f"  {phase:<14}{statistics.median(values):>8.1f} ms median{max(values):>10.1f} ms max")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', default=os.environ.get('FLASK_CONFIG', 'development'))
+    parser.add_argument('--path', default='/', help='first request to send')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--fork', action='store_true', help='also time workers forked from a preloaded app')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='template-cache-') as cache_dir:
+        env = dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir, SECRET_KEY=os.environ.get('SECRET_KEY', 'startup-bench'))
+        os.environ.update(env)
+        report('cold template cache', [spawn(args, env)])
+        report('warm template cache', [spawn(args, env) for _ in range(args.runs)])
+        if args.fork:
+            report('forked from a preloaded app', forked(args, args.runs))
+
+
+if __name__ == '__main__':
+    main()
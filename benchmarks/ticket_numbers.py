@@ -0,0 +1,118 @@
+"""Create tickets from many threads and processes at once and check every ticket number is unique.
+
+    python benchmarks/ticket_numbers.py --user 2 --category 1 --processes 4 --threads 16 --tickets 5000
+
+Runs against the database configured in backend/config.py (point MYSQL_DB
+at a scratch copy). Each process is forked from one preloaded app, like
+gunicorn --preload workers, so every process reserves its own blocks from
+ticket_sequences while its threads draw from them concurrently. Afterwards
+the created rows are read back. The run fails (exit status 1) on any
+duplicate ticket number or failed create. The rows are deleted again
+unless --keep is given. --block-size overrides TICKET_NUMBER_BLOCK_SIZE;
+small blocks make reservations, and so races on them, more frequent.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import create_app  # noqa: E402
+from models import Ticket, TicketSequence  # noqa: E402
+
+app = create_app()
+mysql = app.mysql
+
+
+def create_many(args, count, results):
+    """One thread's share: (ticket_id, ticket_number) pairs plus the number of failures"""
+    created, failed = [], 0
+    with app.app_context():
+        for i in range(count):
+            try:
+                created.append(Ticket.create_ticket(
+                    mysql, args.user, args.category, f"Ticket number stress {os.getpid()}-{i}",
+                    "Created by benchmarks/ticket_numbers.py to check numbering under concurrency.",
+                    'low'))
+            except Exception:
+                failed += 1
+    results.append((created, failed))
+
+
+def worker(args, per_process, queue):
+    results = []
+    per_thread = per_process // args.threads
+    threads = [threading.Thread(target=create_many, args=(args, per_thread, results)) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put(([pair for created, _ in results for pair in created], sum(failed for _, failed in results)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--user', type=int, required=True, help='user_id the tickets belong to')
+    parser.add_argument('--category', type=int, required=True, help='category_id of the tickets')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=16, help='threads per process')
+    parser.add_argument('--tickets', type=int, default=5000, help='tickets in total')
+    parser.add_argument('--block-size', type=int, help='numbers reserved per round trip')
+    parser.add_argument('--keep', action='store_true', help='leave the created tickets in place')
+    args = parser.parse_args()
+
+    if args.block_size:
+        TicketSequence.BLOCK_SIZE = args.block_size
+    app.config['MYSQL_POOL_MAX_OVERFLOW'] = max(app.config['MYSQL_POOL_MAX_OVERFLOW'], args.threads)
+    per_process = args.tickets // args.processes
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [context.Process(target=worker, args=(args, per_process, queue)) for _ in range(args.processes)]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    created = [pair for pairs, _ in outcomes for pair in pairs]
+    failed = sum(failed for _, failed in outcomes)
+    numbers = Counter(number for _, number in created)
+    duplicates = {number: count for number, count in numbers.items() if count > 1}
+    print(f"{len(created)} tickets created by {args.processes} x {args.threads} threads in {elapsed:.1f}s "
+          f"({len(created) / elapsed:.0f}/s), {failed} failed")
+
+    with app.app_context():
+        ids = [ticket_id for ticket_id, _ in created]
+        cursor = mysql.connection.cursor()
+        stored = Counter()
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start:start + 1000]
+            cursor.execute(f"SELECT ticket_number FROM tickets WHERE ticket_id IN "
+                           f"({', '.join(['%s'] * len(chunk))})", chunk)
+            stored.update(row['ticket_number'] for row in cursor.fetchall())
+        duplicates.update({number: count for number, count in stored.items() if count > 1})
+        missing = len(ids) - sum(stored.values())
+
+        if not args.keep:
+            for start in range(0, len(ids), 1000):
+                chunk = ids[start:start + 1000]
+                cursor.execute(f"DELETE FROM tickets WHERE ticket_id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            mysql.connection.commit()
+        cursor.close()
+
+    print(f"{len(numbers)} distinct numbers, {len(duplicates)} duplicated, {missing} rows not found")
+    for number, count in sorted(duplicates.items())[:20]:
+        print(f"  {number} issued {count} times")
+    if duplicates or failed or missing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -50,15 +50,127 @@ CREATE TABLE tickets (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     resolved_at TIMESTAMP NULL,
     closed_at TIMESTAMP NULL,
+    -- SLA deadlines, fixed from sla_policies when the ticket is created
+    first_response_due TIMESTAMP NULL,
+    resolution_due TIMESTAMP NULL,
+    first_responded_at TIMESTAMP NULL,
+    response_breached BOOLEAN NOT NULL DEFAULT FALSE,
+    resolution_breached BOOLEAN NOT NULL DEFAULT FALSE,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (category_id) REFERENCES categories(category_id),
     FOREIGN KEY (assigned_to) REFERENCES users(user_id) ON DELETE SET NULL,
     INDEX idx_ticket_number (ticket_number),
-    INDEX idx_user_id (user_id),
-    INDEX idx_status (status),
-    INDEX idx_priority (priority),
-    INDEX idx_assigned_to (assigned_to),
-    INDEX idx_created_at (created_at)
+    -- Customer ticket history: equality on user_id (+ status), newest first
+    INDEX idx_user_status_created (user_id, status, created_at),
+    INDEX idx_user_created (user_id, created_at),
+    -- (filter column, created_at) + the implicit ticket_id suffix lets the
+    -- admin queue seek on (created_at, ticket_id) for every filter it offers
+    INDEX idx_status_created (status, created_at),
+    INDEX idx_priority_created (priority, created_at),
+    INDEX idx_assigned_created (assigned_to, created_at),
+    INDEX idx_category_created (category_id, created_at),
+    INDEX idx_created_at (created_at),
+    INDEX idx_updated_at (updated_at),
+    FULLTEXT INDEX ft_ticket_text (subject, description)
+);
+
+
+-- First-response and resolution targets. A row with category_id NULL is the
+-- default for its priority; a row for a specific category overrides it.
+CREATE TABLE sla_policies (
+    policy_id INT AUTO_INCREMENT PRIMARY KEY,
+    priority ENUM('low', 'medium', 'high', 'urgent') NOT NULL,
+    category_id INT NULL,
+    first_response_minutes INT NOT NULL,
+    resolution_minutes INT NOT NULL,
+    UNIQUE KEY uq_priority_category (priority, category_id),
+    FOREIGN KEY (category_id) REFERENCES categories(category_id) ON DELETE CASCADE
+);
+
+INSERT INTO sla_policies (priority, category_id, first_response_minutes, resolution_minutes) VALUES
+('urgent', NULL, 30, 240),
+('high', NULL, 120, 1440),
+('medium', NULL, 480, 4320),
+('low', NULL, 1440, 10080);
+
+
+-- Categories each agent takes in automatic assignment. An agent with no
+-- rows here is a generalist and is routed tickets from every category.
+CREATE TABLE agent_skills (
+    agent_id INT NOT NULL,
+    category_id INT NOT NULL,
+    PRIMARY KEY (agent_id, category_id),
+    FOREIGN KEY (agent_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(category_id) ON DELETE CASCADE
+);
+
+
+-- Next unissued ticket number per year. Writers reserve ranges with
+-- UPDATE ... LAST_INSERT_ID(next_value + n) instead of counting tickets.
+CREATE TABLE ticket_sequences (
+    seq_year SMALLINT PRIMARY KEY,
+    next_value INT NOT NULL
+);
+
+
+-- Version stamps for the in-process reference data caches (categories,
+-- agent list). Bumping a row makes every worker reload that cache.
+CREATE TABLE cache_versions (
+    cache_name VARCHAR(50) PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0
+);
+
+
+-- Materialized ticket counts so the dashboards never COUNT(*) over tickets.
+-- assignee_id uses 0 for unassigned tickets because it is part of the key.
+CREATE TABLE ticket_counters (
+    status ENUM('open', 'in_progress', 'resolved', 'closed') NOT NULL,
+    priority ENUM('low', 'medium', 'high', 'urgent') NOT NULL,
+    category_id INT NOT NULL,
+    assignee_id INT NOT NULL DEFAULT 0,
+    ticket_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (status, priority, category_id, assignee_id)
+);
+
+
+CREATE TABLE user_ticket_counters (
+    user_id INT NOT NULL,
+    status ENUM('open', 'in_progress', 'resolved', 'closed') NOT NULL,
+    ticket_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, status)
+);
+
+
+-- Daily analytics rollups, keyed by the day each ticket was created.
+-- Maintained by AnalyticsRollup.refresh(); see rollup_state for the watermark.
+CREATE TABLE ticket_daily_rollups (
+    stat_date DATE NOT NULL,
+    category_id INT NOT NULL,
+    priority ENUM('low', 'medium', 'high', 'urgent') NOT NULL,
+    status ENUM('open', 'in_progress', 'resolved', 'closed') NOT NULL,
+    ticket_count INT NOT NULL DEFAULT 0,
+    resolution_hours_sum BIGINT NOT NULL DEFAULT 0,
+    resolution_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, category_id, priority, status)
+);
+
+
+CREATE TABLE agent_daily_rollups (
+    stat_date DATE NOT NULL,
+    agent_id INT NOT NULL,
+    assigned_count INT NOT NULL DEFAULT 0,
+    resolved_count INT NOT NULL DEFAULT 0,
+    closed_count INT NOT NULL DEFAULT 0,
+    resolution_hours_sum BIGINT NOT NULL DEFAULT 0,
+    resolution_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, agent_id),
+    INDEX idx_agent_date (agent_id, stat_date)
+);
+
+
+CREATE TABLE rollup_state (
+    rollup_name VARCHAR(50) PRIMARY KEY,
+    refreshed_through TIMESTAMP NULL
 );
 
 
@@ -71,8 +183,10 @@ CREATE TABLE ticket_responses (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (ticket_id) REFERENCES tickets(ticket_id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-    INDEX idx_ticket_id (ticket_id),
-    INDEX idx_created_at (created_at)
+    -- Thread pages seek on (created_at, response_id) within one ticket
+    INDEX idx_ticket_created (ticket_id, created_at),
+    INDEX idx_created_at (created_at),
+    FULLTEXT INDEX ft_response_text (response_text)
 );
 
 
@@ -80,12 +194,17 @@ CREATE TABLE ticket_attachments (
     attachment_id INT AUTO_INCREMENT PRIMARY KEY,
     ticket_id INT NOT NULL,
     file_name VARCHAR(255) NOT NULL,
+    -- Relative to UPLOAD_FOLDER; content-addressed, so rows may share a file
     file_path VARCHAR(500) NOT NULL,
     file_size INT,
+    content_hash CHAR(64) NOT NULL,
+    content_type VARCHAR(100),
     uploaded_by INT NOT NULL,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (ticket_id) REFERENCES tickets(ticket_id) ON DELETE CASCADE,
-    FOREIGN KEY (uploaded_by) REFERENCES users(user_id) ON DELETE CASCADE
+    FOREIGN KEY (uploaded_by) REFERENCES users(user_id) ON DELETE CASCADE,
+    INDEX idx_ticket_uploaded (ticket_id, uploaded_at),
+    INDEX idx_content_hash (content_hash)
 );
 
 
@@ -138,9 +257,21 @@ GROUP BY u.user_id, u.full_name;
 DELIMITER //
 CREATE PROCEDURE generate_ticket_number(OUT new_ticket_number VARCHAR(20))
 BEGIN
-    DECLARE ticket_count INT;
-    SELECT COUNT(*) INTO ticket_count FROM tickets;
-    SET new_ticket_number = CONCAT('TKT', YEAR(NOW()), LPAD(ticket_count + 1, 6, '0'));
+    DECLARE seq_value INT;
+    DECLARE cur_year INT DEFAULT YEAR(NOW());
+    
+    UPDATE ticket_sequences SET next_value = LAST_INSERT_ID(next_value + 1)
+    WHERE seq_year = cur_year;
+    IF ROW_COUNT() = 0 THEN
+        INSERT IGNORE INTO ticket_sequences (seq_year, next_value)
+        SELECT cur_year, IFNULL(MAX(CAST(SUBSTRING(ticket_number, 8) AS UNSIGNED)), 0) + 1
+        FROM tickets WHERE ticket_number LIKE CONCAT('TKT', cur_year, '%');
+        UPDATE ticket_sequences SET next_value = LAST_INSERT_ID(next_value + 1)
+        WHERE seq_year = cur_year;
+    END IF;
+    
+    SET seq_value = LAST_INSERT_ID() - 1;
+    SET new_ticket_number = CONCAT('TKT', cur_year, LPAD(seq_value, 6, '0'));
 END //
 DELIMITER ;
 
@@ -169,6 +300,52 @@ BEGIN
     IF NEW.status = 'closed' AND OLD.status != 'closed' THEN
         SET NEW.closed_at = NOW();
     END IF;
+    
+    -- Move the ticket between counter buckets. NEW is final at this point
+    -- and a failed UPDATE rolls these writes back with the statement.
+    IF NOT (NEW.status <=> OLD.status AND NEW.priority <=> OLD.priority
+            AND NEW.category_id <=> OLD.category_id AND NEW.assigned_to <=> OLD.assigned_to) THEN
+        UPDATE ticket_counters SET ticket_count = ticket_count - 1
+        WHERE status = OLD.status AND priority = OLD.priority
+          AND category_id = OLD.category_id AND assignee_id = IFNULL(OLD.assigned_to, 0);
+        INSERT INTO ticket_counters (status, priority, category_id, assignee_id, ticket_count)
+        VALUES (NEW.status, NEW.priority, NEW.category_id, IFNULL(NEW.assigned_to, 0), 1)
+        ON DUPLICATE KEY UPDATE ticket_count = ticket_count + 1;
+    END IF;
+    
+    IF NOT (NEW.status <=> OLD.status AND NEW.user_id <=> OLD.user_id) THEN
+        UPDATE user_ticket_counters SET ticket_count = ticket_count - 1
+        WHERE user_id = OLD.user_id AND status = OLD.status;
+        INSERT INTO user_ticket_counters (user_id, status, ticket_count)
+        VALUES (NEW.user_id, NEW.status, 1)
+        ON DUPLICATE KEY UPDATE ticket_count = ticket_count + 1;
+    END IF;
 END //
 DELIMITER ;
 
+DELIMITER //
+CREATE TRIGGER count_inserted_ticket
+AFTER INSERT ON tickets
+FOR EACH ROW
+BEGIN
+    INSERT INTO ticket_counters (status, priority, category_id, assignee_id, ticket_count)
+    VALUES (NEW.status, NEW.priority, NEW.category_id, IFNULL(NEW.assigned_to, 0), 1)
+    ON DUPLICATE KEY UPDATE ticket_count = ticket_count + 1;
+    INSERT INTO user_ticket_counters (user_id, status, ticket_count)
+    VALUES (NEW.user_id, NEW.status, 1)
+    ON DUPLICATE KEY UPDATE ticket_count = ticket_count + 1;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER count_deleted_ticket
+AFTER DELETE ON tickets
+FOR EACH ROW
+BEGIN
+    UPDATE ticket_counters SET ticket_count = ticket_count - 1
+    WHERE status = OLD.status AND priority = OLD.priority
+      AND category_id = OLD.category_id AND assignee_id = IFNULL(OLD.assigned_to, 0);
+    UPDATE user_ticket_counters SET ticket_count = ticket_count - 1
+    WHERE user_id = OLD.user_id AND status = OLD.status;
+END //
+DELIMITER ;
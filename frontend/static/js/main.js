@@ -109,6 +109,75 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Live ticket updates over Server-Sent Events
+    const liveRoot = document.querySelector('[data-live-events]');
+    if (liveRoot && window.EventSource) {
+        const source = new EventSource(liveRoot.getAttribute('data-live-events'));
+        ['status', 'priority', 'assignment', 'reply', 'created', 'sla_breach', 'attachment'].forEach(type => {
+            source.addEventListener(type, e => applyTicketEvent(JSON.parse(e.data)));
+        });
+        // We fell behind the server; the page is stale, so start over
+        source.addEventListener('resync', () => window.location.reload());
+    }
+
+    // Send attachments as the raw request body so the server can stream them to disk
+    document.querySelectorAll('form[data-stream-upload]').forEach(form => {
+        form.addEventListener('submit', function (e) {
+            const input = form.querySelector('input[type="file"]');
+            if (!window.fetch || !input.files.length) {
+                return;
+            }
+            e.preventDefault();
+            const file = input.files[0];
+            const button = form.querySelector('button[type="submit"]');
+            button.disabled = true;
+            fetch(form.action, {
+                method: 'POST',
+                body: file,
+                headers: {
+                    'Content-Type': file.type || 'application/octet-stream',
+                    'X-File-Name': encodeURIComponent(file.name)
+                }
+            })
+                .then(response => response.json().then(data => {
+                    if (!response.ok) {
+                        throw new Error(data.error || 'Upload failed');
+                    }
+                    form.reset();
+                    if (!liveRoot) {
+                        window.location.reload();
+                    }
+                }))
+                .catch(err => alert(err.message))
+                .finally(() => { button.disabled = false; });
+        });
+    });
+
+    // Older replies of long threads, one page per click
+    document.querySelectorAll('[data-load-older]').forEach(button => {
+        button.addEventListener('click', function () {
+            const timeline = document.querySelector('[data-field="timeline"]');
+            button.disabled = true;
+            fetch(button.getAttribute('data-load-older'), { headers: { 'Accept': 'application/json' } })
+                .then(response => response.json())
+                .then(data => {
+                    const first = timeline.firstElementChild;
+                    data.responses.forEach(reply => {
+                        if (!timeline.querySelector(`[data-response-id="${reply.response_id}"]`)) {
+                            timeline.insertBefore(buildTimelineItem(reply), first);
+                        }
+                    });
+                    if (data.older_url) {
+                        button.setAttribute('data-load-older', data.older_url);
+                        button.disabled = false;
+                    } else {
+                        button.remove();
+                    }
+                })
+                .catch(() => { button.disabled = false; });
+        });
+    });
+
     // Smooth scroll to anchors
     document.querySelectorAll('a[href^="#"]').forEach(anchor => {
         anchor.addEventListener('click', function (e) {
@@ -185,3 +254,146 @@ function hideLoading() {
         spinner.remove();
     }
 }
+
+// Badge classes, kept in sync with utility_processor in app.py
+const PRIORITY_CLASSES = { low: 'bg-info', medium: 'bg-warning', high: 'bg-danger', urgent: 'bg-dark' };
+const STATUS_CLASSES = { open: 'bg-primary', in_progress: 'bg-warning', resolved: 'bg-success', closed: 'bg-secondary' };
+
+function setBadge(badge, value, classes) {
+    Object.values(classes).forEach(cls => badge.classList.remove(cls));
+    badge.classList.remove('bg-secondary');
+    badge.classList.add(classes[value] || 'bg-secondary');
+}
+
+function titleCase(value) {
+    return value.replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase());
+}
+
+// Patch every element bound to the changed ticket in place
+function applyTicketEvent(event) {
+    const fields = event.fields || {};
+
+    if (event.type === 'created') {
+        const banner = document.querySelector('[data-field="new-tickets"]');
+        const counter = document.querySelector('[data-field="new-ticket-count"]');
+        if (banner && counter) {
+            counter.textContent = parseInt(counter.textContent, 10) + 1;
+            banner.classList.remove('d-none');
+        }
+        return;
+    }
+
+    document.querySelectorAll(`[data-ticket-id="${event.ticket_id}"]`).forEach(scope => {
+        if (event.type === 'status') {
+            scope.querySelectorAll('[data-field="status"]').forEach(badge => {
+                badge.textContent = titleCase(fields.status);
+                setBadge(badge, fields.status, STATUS_CLASSES);
+            });
+        } else if (event.type === 'priority') {
+            scope.querySelectorAll('[data-field="priority"]').forEach(badge => {
+                badge.textContent = fields.priority.toUpperCase();
+                setBadge(badge, fields.priority, PRIORITY_CLASSES);
+            });
+        } else if (event.type === 'assignment') {
+            scope.querySelectorAll('[data-field="assigned_agent_name"]').forEach(cell => {
+                cell.textContent = fields.assigned_agent_name || 'Unassigned';
+            });
+        } else if (event.type === 'sla_breach') {
+            scope.querySelectorAll(`[data-field="sla-${fields.kind}"]`).forEach(badge => {
+                badge.classList.remove('d-none');
+            });
+        } else if (event.type === 'attachment') {
+            const list = scope.querySelector('[data-field="attachments"]');
+            if (list && !list.querySelector(`[data-attachment-id="${fields.attachment_id}"]`)) {
+                list.appendChild(buildAttachmentItem(fields));
+                const empty = scope.querySelector('[data-field="empty-attachments"]');
+                if (empty) {
+                    empty.classList.add('d-none');
+                }
+            }
+        } else if (event.type === 'reply') {
+            const timeline = scope.querySelector('[data-field="timeline"]');
+            if (timeline && !timeline.querySelector(`[data-response-id="${fields.response_id}"]`)) {
+                timeline.appendChild(buildTimelineItem(fields));
+                const empty = scope.querySelector('[data-field="empty-timeline"]');
+                if (empty) {
+                    empty.classList.add('d-none');
+                }
+            }
+        }
+    });
+}
+
+function buildAttachmentItem(attachment) {
+    const item = document.createElement('li');
+    item.className = 'd-flex align-items-center mb-2';
+    item.setAttribute('data-attachment-id', attachment.attachment_id);
+
+    if (attachment.thumbnail_url) {
+        const thumb = document.createElement('img');
+        thumb.src = attachment.thumbnail_url;
+        thumb.alt = '';
+        thumb.width = 48;
+        thumb.height = 48;
+        thumb.className = 'rounded me-2';
+        thumb.style.objectFit = 'cover';
+        item.appendChild(thumb);
+    } else {
+        const icon = document.createElement('i');
+        icon.className = 'fas fa-paperclip me-2';
+        item.appendChild(icon);
+    }
+
+    const link = document.createElement('a');
+    link.href = attachment.url;
+    link.textContent = attachment.file_name;
+    item.appendChild(link);
+
+    const meta = document.createElement('small');
+    meta.className = 'text-muted ms-2';
+    meta.textContent = `${(attachment.file_size / 1024).toFixed(1)} KB \u00b7 ${attachment.uploader_name}`;
+    item.appendChild(meta);
+    return item;
+}
+
+function buildTimelineItem(reply) {
+    const item = document.createElement('div');
+    item.className = 'timeline-item';
+    item.setAttribute('data-response-id', reply.response_id);
+
+    const icon = document.createElement('div');
+    icon.className = 'timeline-icon';
+    icon.innerHTML = `<i class="fas fa-${reply.responder_role === 'customer' ? 'user' : 'user-tie'}"></i>`;
+
+    const content = document.createElement('div');
+    content.className = 'timeline-content' + (reply.is_internal ? ' internal-note' : '');
+
+    const header = document.createElement('div');
+    header.className = 'd-flex justify-content-between mb-2';
+    const who = document.createElement('strong');
+    who.textContent = reply.responder_name + ' ';
+    if (reply.responder_role !== 'customer') {
+        const role = document.createElement('span');
+        role.className = 'badge bg-primary';
+        role.textContent = titleCase(reply.responder_role);
+        who.appendChild(role);
+    }
+    if (reply.is_internal) {
+        const note = document.createElement('span');
+        note.className = 'badge bg-warning text-dark';
+        note.textContent = 'Internal Note';
+        who.appendChild(note);
+    }
+    const when = document.createElement('small');
+    when.className = 'text-muted';
+    when.textContent = formatDateTime(reply.created_at);
+    header.append(who, when);
+
+    const text = document.createElement('p');
+    text.className = 'mb-0';
+    text.textContent = reply.response_text;
+
+    content.append(header, text);
+    item.append(icon, content);
+    return item;
+}